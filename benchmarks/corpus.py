@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+合成圖庫產生器 - 基準測試用的目錄樹和圖片檔案
+
+功能：
+- generate_images()：依檔案數、目錄深度、每層子目錄數、檔案大小範圍產生圖片
+  - cjk_ratio：已命名（中文檔名）檔案的比例，其餘為 ASCII 檔名
+  - duplicate_ratio：內容與另一個檔案相同的比例（去重測試用）
+- generate_records()：為圖片產生分析記錄，collision_rate 控制新名稱重複的比例
+- 檔案帶有有效的 PNG / JPEG 檔頭（寬高可被解析），內容為隨機位元組
+
+設計原理：
+- 固定種子，相同參數產生相同的圖庫
+- 檔案平均分散到各層目錄，模擬實際圖庫的目錄結構
+"""
+
+import random
+import struct
+import sys
+import zlib
+from pathlib import Path
+from typing import List
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from records import AnalysisRecord  # noqa: E402
+
+# 中文檔名和分析結果使用的詞彙
+CJK_WORDS = ("財經", "技術", "設計", "報告", "會議", "投資", "系統", "架構", "營收", "時程", "介面", "趨勢")
+
+
+def png_header(width: int, height: int) -> bytes:
+    """PNG 簽章和 IHDR 區塊"""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + ihdr \
+        + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+
+
+def jpeg_header(width: int, height: int) -> bytes:
+    """JPEG SOI、APP0 和 SOF0 區段"""
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 17, 8, height, width, 3) + b"\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+    return b"\xff\xd8" + app0 + sof0
+
+
+def random_bytes(rng: random.Random, size: int) -> bytes:
+    """以指定的亂數產生器產生 size 個位元組（可重現）"""
+    if size <= 0:
+        return b""
+    return rng.getrandbits(8 * size).to_bytes(size, "little")
+
+
+def directory_tree(root: Path, depth: int, fanout: int) -> List[Path]:
+    """產生 depth 層、每層 fanout 個子目錄的目錄列表（含 root）"""
+    directories = [root]
+    level = [root]
+    for d in range(depth):
+        level = [parent / f"d{d}_{i}" for parent in level for i in range(fanout)]
+        directories.extend(level)
+    return directories
+
+
+def generate_images(root: Path, count: int, depth: int = 2, fanout: int = 3,
+                    min_bytes: int = 2048, max_bytes: int = 65536, seed: int = 0,
+                    cjk_ratio: float = 0.0, duplicate_ratio: float = 0.0) -> List[Path]:
+    """
+    產生合成圖片
+
+    Args:
+        root: 輸出目錄
+        count: 圖片數量
+        depth: 子目錄層數
+        fanout: 每層的子目錄數
+        min_bytes / max_bytes: 檔案大小範圍
+        seed: 隨機種子
+        cjk_ratio: 中文檔名（視為已命名）的比例
+        duplicate_ratio: 內容複製自先前某個檔案的比例
+
+    Returns:
+        產生的檔案路徑列表
+    """
+    rng = random.Random(seed)
+    directories = directory_tree(Path(root), depth, fanout)
+    for directory in directories:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for i in range(count):
+        directory = directories[i % len(directories)]
+        width, height = rng.choice(((800, 600), (1280, 720), (1920, 1080), (3024, 4032), (512, 512)))
+        if rng.random() < cjk_ratio:
+            stem = "_".join(rng.sample(CJK_WORDS, 3)) + f"_{i:06d}"
+        else:
+            stem = f"IMG_{i:06d}"
+        if rng.random() < 0.5:
+            path = directory / f"{stem}.png"
+            header = png_header(width, height)
+        else:
+            path = directory / f"{stem}.jpg"
+            header = jpeg_header(width, height)
+        if paths and rng.random() < duplicate_ratio:
+            path.write_bytes(rng.choice(paths).read_bytes())
+        else:
+            path.write_bytes(header + random_bytes(rng, rng.randint(min_bytes, max_bytes) - len(header)))
+        paths.append(path)
+    return paths
+
+
+def generate_records(paths: List[Path], root: Path, collision_rate: float = 0.1,
+                     seed: int = 0) -> List[AnalysisRecord]:
+    """
+    為圖片產生成功的分析記錄
+
+    Args:
+        paths: 圖片路徑
+        root: 目標目錄（記錄使用相對路徑）
+        collision_rate: 新名稱與同目錄中另一張圖片相同的比例
+        seed: 隨機種子
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    records = []
+    titles_by_directory = {}
+    for i, path in enumerate(paths):
+        relative = path.relative_to(root).as_posix()
+        titles = titles_by_directory.setdefault(relative.rpartition("/")[0], [])
+        if titles and rng.random() < collision_rate:
+            title = rng.choice(titles)
+        else:
+            title = "".join(rng.sample(CJK_WORDS, 2)) + f"圖表{i}"
+            titles.append(title)
+        main, sub = rng.sample(CJK_WORDS, 2)
+        records.append(AnalysisRecord(relative, "success", analysis={
+            "image_title": title,
+            "main_theme": main,
+            "sub_theme": sub,
+            "core_content": f"{main}{sub}",
+            "recommended_name": f"{main}_{sub}_{title}",
+        }))
+    return records
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+端到端吞吐量基準測試 - 以模擬伺服器執行完整命名流程
+
+流程：
+1. 產生合成圖庫（corpus.generate_images）
+2. 在本行程啟動模擬視覺模型伺服器（mock_vision_server.py）
+3. 以子行程執行 `rename_cli.py run`（等同 full_batch_rename_execute.py），
+   組態指向模擬伺服器、請求間延遲設為 0，進度事件寫入 JSON Lines
+4. 從進度事件計算吞吐量（張/秒）和單張耗時 p50 / p99，並記錄子行程的峰值 RSS
+5. 結果輸出為 JSON（默認：benchmarks/results/e2e_<時間>.json）
+
+使用方式：
+    python benchmarks/e2e_benchmark.py --images 500 --latency lognormal:0.05,0.3
+    python benchmarks/e2e_benchmark.py --images 2000 --stream --error-rate 0.02
+
+設計原理：
+- 量測的是本機管線（讀取、編碼、HTTP、解析、規劃、複製），模型延遲由模擬伺服器控制
+- 子行程執行，峰值 RSS 只包含命名流程本身
+- 每次執行使用獨立的暫存目錄和 session 目錄，不影響 data/session
+"""
+
+import argparse
+import json
+import math
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+
+from corpus import generate_images
+from mock_vision_server import add_server_arguments, server_from_args
+
+PROJECT_ROOT = Path(__file__).parent.parent
+RESULTS_DIR = PROJECT_ROOT / "benchmarks" / "results"
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(values, fraction: float) -> float:
+    """最近秩百分位數"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def peak_child_rss_mb() -> float:
+    """已結束子行程的峰值 RSS（MB）；平台不支援時返回 0"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux 以 KB 為單位，macOS 以位元組為單位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def write_config(path: Path, api_port: int, request_timeout: float):
+    """複製專案組態，改為連線模擬伺服器且不做請求間延遲"""
+    with open(PROJECT_ROOT / "config" / "config.yaml", "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    config.setdefault("lm_studio", {}).update({"host": "127.0.0.1", "port": api_port})
+    config.setdefault("analysis", {}).update({
+        "request_delay": 0,
+        "retry_delay": 0.1,
+        "request_timeout": request_timeout,
+    })
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+
+
+def summarize_events(events_path: Path) -> dict:
+    """從進度事件計算分析和重命名階段的統計"""
+    latencies = []
+    started = {}
+    stages = {}
+    failed = 0
+    with open(events_path, "r", encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            if event["type"] == "item" and event["stage"] == "analysis" and not event.get("cached"):
+                latencies.append(event["latency"])
+                failed += 0 if event["ok"] else 1
+            elif event["type"] == "stage_start":
+                started[event["stage"]] = event["timestamp"]
+            elif event["type"] == "stage_complete" and event["stage"] in started:
+                stages[event["stage"]] = round(event["timestamp"] - started[event["stage"]], 3)
+    analysis_seconds = stages.get("analysis") or 0
+    return {
+        "analyzed": len(latencies),
+        "failed": failed,
+        "analysis_seconds": analysis_seconds,
+        "analysis_images_per_second": round(len(latencies) / analysis_seconds, 2) if analysis_seconds else 0,
+        "latency_p50": round(percentile(latencies, 0.50), 4),
+        "latency_p99": round(percentile(latencies, 0.99), 4),
+        "latency_max": round(max(latencies), 4) if latencies else 0,
+        "stage_seconds": stages,
+    }
+
+
+def run_benchmark(args) -> dict:
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="rename-bench-"))
+    tree = workdir / "images"
+    session_dir = workdir / "session"
+    events_path = workdir / "events.jsonl"
+    config_path = workdir / "config.yaml"
+    log_path = workdir / "run.log"
+
+    print(f"🧪 產生合成圖庫：{args.images} 張 → {tree}")
+    generate_images(tree, args.images, depth=args.depth, fanout=args.fanout,
+                    min_bytes=args.min_kb * 1024, max_bytes=args.max_kb * 1024, seed=args.seed)
+
+    server = server_from_args(args).start()
+    write_config(config_path, server.server_address[1], args.request_timeout)
+    command = [
+        sys.executable, str(PROJECT_ROOT / "src" / "rename_cli.py"),
+        "--session-dir", str(session_dir),
+        "run", "--target-dir", str(tree), "--config", str(config_path),
+        "--events", str(events_path),
+    ]
+    if args.stream:
+        command += ["--stream", "--sink", args.sink]
+    if args.delete_original:
+        command.append("--delete-original")
+
+    print(f"🚀 執行：{' '.join(command[1:])}")
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        returncode = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT)
+    wall_seconds = time.perf_counter() - started
+    server.stop()
+
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "parameters": {
+            "images": args.images, "depth": args.depth, "fanout": args.fanout,
+            "min_kb": args.min_kb, "max_kb": args.max_kb,
+            "mode": "stream" if args.stream else "run",
+            "delete_original": args.delete_original,
+            "latency": args.latency, "error_rate": args.error_rate,
+            "timeout_rate": args.timeout_rate, "slots": args.slots, "seed": args.seed,
+        },
+        "returncode": returncode,
+        "wall_seconds": round(wall_seconds, 3),
+        "images_per_second": round(args.images / wall_seconds, 2) if wall_seconds else 0,
+        "peak_rss_mb": round(peak_child_rss_mb(), 1),
+        "server": server.stats,
+        **summarize_events(events_path),
+    }
+
+    if args.workdir is None and not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    else:
+        print(f"📁 保留工作目錄：{workdir}（執行日誌：{log_path}）")
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="以模擬伺服器量測完整命名流程的吞吐量")
+    parser.add_argument("--images", type=int, default=200, help="合成圖片數量（默認：200）")
+    parser.add_argument("--depth", type=int, default=2, help="子目錄層數")
+    parser.add_argument("--fanout", type=int, default=3, help="每層的子目錄數")
+    parser.add_argument("--min-kb", type=int, default=8, help="最小檔案大小（KB）")
+    parser.add_argument("--max-kb", type=int, default=256, help="最大檔案大小（KB）")
+    parser.add_argument("--stream", action="store_true", help="以串流模式執行")
+    parser.add_argument("--sink", choices=["jsonl", "sqlite"], default="jsonl", help="串流模式的輸出槽")
+    parser.add_argument("--delete-original", action="store_true", help="以移動取代複製")
+    parser.add_argument("--request-timeout", type=float, default=2.0,
+                        help="客戶端請求逾時（秒，應小於 --hang-seconds）")
+    add_server_arguments(parser)
+    parser.add_argument("--workdir", default=None, help="工作目錄（默認：暫存目錄，結束後刪除）")
+    parser.add_argument("--keep", action="store_true", help="保留暫存工作目錄")
+    parser.add_argument("--output", default=None, help="結果 JSON 路徑（默認：benchmarks/results/e2e_<時間>.json）")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args)
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"e2e_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print()
+    print(f"📊 端到端：{result['images_per_second']} 張/秒（{result['wall_seconds']} 秒）")
+    print(f"   分析階段：{result['analysis_images_per_second']} 張/秒，"
+          f"p50 {result['latency_p50'] * 1000:.1f} 毫秒，p99 {result['latency_p99'] * 1000:.1f} 毫秒")
+    print(f"   失敗：{result['failed']} 張 | 峰值 RSS：{result['peak_rss_mb']} MB")
+    print(f"💾 結果：{output}")
+    return 0 if result["returncode"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
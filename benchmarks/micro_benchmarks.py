@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+微基準測試 - 分別量測掃描、判斷已命名、雜湊、規劃、重命名各階段的成本
+
+量測項目（每個圖庫大小各跑一次）：
+- scan_rglob：RenameEngine.scan()（rglob 走訪 + 排序 + 已命名過濾）
+- scan_walk：count_images()（串流模式使用的 os.walk 走訪）
+- classify_regex：rename_engine.is_already_renamed()（中文字元判斷）
+- tracker_lookup：file_tracker.is_already_renamed()（每次查詢都讀取全域追蹤檔，
+  只抽樣 --tracker-sample 個 ASCII 檔名）
+- md5_duplicates：deduplicate_and_cleanup.find_duplicates()（全部檔案的 MD5 + 分組）
+- plan_memory：IncrementalPlanner.plan()（記憶體內的 SQLite，每次從空的名稱配置開始）
+- plan_incremental：IncrementalPlanner.plan()（SQLite 名稱配置，首次規劃）
+- replan_incremental：同一批記錄再規劃一次（已配置的名稱沿用）
+- rename_copy：RenameEngine.apply()（複製迴圈，含日誌和進度事件）
+
+使用方式：
+    python benchmarks/micro_benchmarks.py --sizes 1000,10000
+    python benchmarks/micro_benchmarks.py --sizes 100000 --collision-rate 0.3 --cjk-ratio 0.5
+    python benchmarks/micro_benchmarks.py --sizes 1000 --compare benchmarks/results/micro_20260101_120000.json
+
+設計原理：
+- 只讀取的項目重複 --repeat 次取最短時間，降低檔案系統快取和背景負載的影響
+- 圖庫、session 目錄和追蹤檔都在暫存目錄，不影響 data/
+- --compare 以單件耗時比較前次結果，變慢超過 --threshold 時返回非零結束碼（可用於 CI）
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from corpus import generate_images, generate_records
+
+PROJECT_ROOT = Path(__file__).parent.parent
+RESULTS_DIR = PROJECT_ROOT / "benchmarks" / "results"
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+import file_tracker  # noqa: E402
+from deduplicate_and_cleanup import find_duplicates  # noqa: E402
+from rename_engine import RenameEngine, count_images, is_already_renamed  # noqa: E402
+from rename_planner import (  # noqa: E402
+    IncrementalPlanner, NamingRules, load_config, plan_filename,
+)
+
+# 比較時忽略低於此秒數的項目（計時誤差大於實際差異）
+MIN_COMPARE_SECONDS = 0.005
+
+
+def best_of(repeat: int, fn):
+    """執行 fn repeat 次，返回（最短秒數, 最後一次的返回值）"""
+    best = None
+    value = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        value = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+
+def measurement(seconds: float, items: int) -> dict:
+    return {
+        "seconds": round(seconds, 6),
+        "items": items,
+        "items_per_second": round(items / seconds, 1) if seconds else 0,
+        "us_per_item": round(seconds / items * 1e6, 3) if items else 0,
+    }
+
+
+def write_tracker(path: Path, paths, root: Path, fraction: float = 0.5):
+    """產生全域追蹤檔：前 fraction 比例的檔案記錄為已重命名"""
+    directories = {}
+    for image_path in paths[:int(len(paths) * fraction)]:
+        files = directories.setdefault(str(image_path.parent), {"files": {}, "summary": {}})["files"]
+        files[image_path.name] = {"new_name": f"已命名_{image_path.name}", "status": "success"}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"directories": directories}, f, ensure_ascii=False, indent=2)
+
+
+def run_size(size: int, args, workdir: Path) -> dict:
+    """以 size 張圖片的圖庫執行全部項目"""
+    tree = workdir / f"images_{size}"
+    session_dir = workdir / f"session_{size}"
+    print(f"🧪 產生合成圖庫：{size} 張 → {tree}")
+    paths = generate_images(tree, size, depth=args.depth, fanout=args.fanout,
+                            min_bytes=args.min_bytes, max_bytes=args.max_bytes, seed=args.seed,
+                            cjk_ratio=args.cjk_ratio, duplicate_ratio=args.duplicate_ratio)
+    records = generate_records(paths, tree, collision_rate=args.collision_rate, seed=args.seed)
+    config = load_config(Path(args.config) if args.config else None)
+    rules = NamingRules.from_config(config)
+    results = {}
+
+    def record(name: str, seconds: float, items: int):
+        results[name] = measurement(seconds, items)
+        print(f"   {name:<20} {seconds:9.4f} 秒  {results[name]['us_per_item']:10.2f} 微秒/件")
+
+    engine = RenameEngine(tree, session_dir=session_dir, config=config,
+                          on_log=lambda text: None, progress_lines=False)
+    try:
+        # 引擎的 ProgressTracker 會把日誌同時印到終端，量測時收起來
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds, _ = best_of(args.repeat, engine.scan)
+        record("scan_rglob", seconds, size)
+
+        seconds, _ = best_of(args.repeat, lambda: count_images(tree))
+        record("scan_walk", seconds, size)
+
+        stems = [path.stem for path in paths]
+        seconds, _ = best_of(args.repeat, lambda: [is_already_renamed(stem) for stem in stems])
+        record("classify_regex", seconds, size)
+
+        tracker_path = workdir / f"tracking_{size}" / ".renamed_tracker.json"
+        write_tracker(tracker_path, paths, tree)
+        file_tracker.TRACKING_DIR = tracker_path.parent
+        file_tracker.GLOBAL_TRACKER = tracker_path
+        # 只抽樣 ASCII 檔名（中文檔名在讀取追蹤檔之前就返回），且取後半段（不在追蹤檔中，須掃完全部目錄）
+        sample = [path.name for path in paths[len(paths) // 2:] if not file_tracker.contains_chinese(path.name)]
+        sample = sample[:args.tracker_sample]
+        seconds, _ = best_of(1, lambda: [file_tracker.is_already_renamed(name) for name in sample])
+        record("tracker_lookup", seconds, len(sample))
+
+        seconds, (duplicates, _) = best_of(args.repeat, lambda: find_duplicates(paths))
+        record("md5_duplicates", seconds, size)
+        results["md5_duplicates"]["duplicates"] = len(duplicates)
+
+        def plan_in_memory():
+            memory_planner = IncrementalPlanner(rules, Path(":memory:"), tree)
+            try:
+                return memory_planner.plan(records)
+            finally:
+                memory_planner.close()
+
+        seconds, plan = best_of(args.repeat, plan_in_memory)
+        record("plan_memory", seconds, len(records))
+        results["plan_memory"]["suffixed"] = sum(
+            1 for entry in plan if entry.new_name != plan_filename(entry.record, rules)
+        )
+
+        planner = IncrementalPlanner(rules, workdir / f"allocations_{size}.sqlite", tree)
+        try:
+            seconds, _ = best_of(1, lambda: planner.plan(records))
+            record("plan_incremental", seconds, len(records))
+            seconds, _ = best_of(1, lambda: planner.plan(records))
+            record("replan_incremental", seconds, len(records))
+        finally:
+            planner.close()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            rename_plan = engine.build_plan(records)
+            seconds, report = best_of(1, lambda: engine.apply(rename_plan))
+        record("rename_copy", seconds, len(rename_plan))
+        results["rename_copy"]["errors"] = len(report["errors"])
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.close()
+
+    if not args.keep:
+        shutil.rmtree(tree, ignore_errors=True)
+        shutil.rmtree(session_dir, ignore_errors=True)
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """
+    以單件耗時比較兩次結果
+
+    Returns:
+        變慢超過 threshold 的項目列表 [(大小, 項目, 比例), ...]
+    """
+    regressions = []
+    print()
+    print(f"📈 與基準比較（變慢超過 {threshold:.0%} 視為退化）")
+    for size, stages in current["results"].items():
+        base_stages = baseline.get("results", {}).get(size)
+        if not base_stages:
+            print(f"   {size} 張：基準中沒有此大小，略過")
+            continue
+        for name, value in stages.items():
+            base = base_stages.get(name)
+            if not base or not base["us_per_item"]:
+                continue
+            ratio = value["us_per_item"] / base["us_per_item"]
+            mark = "  "
+            if ratio > 1 + threshold and max(value["seconds"], base["seconds"]) >= MIN_COMPARE_SECONDS:
+                regressions.append((size, name, round(ratio, 3)))
+                mark = "⚠️"
+            print(f"{mark} {size:>7} 張 {name:<20} {base['us_per_item']:10.2f} → "
+                  f"{value['us_per_item']:10.2f} 微秒/件（×{ratio:.2f}）")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="掃描、雜湊、規劃、重命名各階段的微基準測試")
+    parser.add_argument("--sizes", default="1000,10000",
+                        help="圖庫大小（逗號分隔，默認：1000,10000；完整量測：1000,10000,100000）")
+    parser.add_argument("--depth", type=int, default=2, help="子目錄層數")
+    parser.add_argument("--fanout", type=int, default=3, help="每層的子目錄數")
+    parser.add_argument("--min-bytes", type=int, default=1024, help="最小檔案大小（位元組）")
+    parser.add_argument("--max-bytes", type=int, default=8192, help="最大檔案大小（位元組）")
+    parser.add_argument("--cjk-ratio", type=float, default=0.2, help="中文檔名（已命名）的比例")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05, help="內容重複的檔案比例")
+    parser.add_argument("--collision-rate", type=float, default=0.1, help="新名稱重複的比例")
+    parser.add_argument("--tracker-sample", type=int, default=200,
+                        help="file_tracker 查詢的抽樣數（每次查詢都讀取整個追蹤檔）")
+    parser.add_argument("--repeat", type=int, default=3, help="只讀項目的重複次數（取最短時間）")
+    parser.add_argument("--seed", type=int, default=0, help="隨機種子")
+    parser.add_argument("--config", default=None, help="命名規則組態（默認：config/config.yaml）")
+    parser.add_argument("--workdir", default=None, help="工作目錄（默認：暫存目錄，結束後刪除）")
+    parser.add_argument("--keep", action="store_true", help="保留產生的圖庫和 session 目錄")
+    parser.add_argument("--output", default=None,
+                        help="結果 JSON 路徑（默認：benchmarks/results/micro_<時間>.json）")
+    parser.add_argument("--compare", default=None, help="要比較的前次結果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="視為退化的變慢比例（默認：0.2）")
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    except ValueError:
+        parser.error(f"無效的 --sizes：{args.sizes}")
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="rename-micro-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "depth": args.depth, "fanout": args.fanout,
+            "min_bytes": args.min_bytes, "max_bytes": args.max_bytes,
+            "cjk_ratio": args.cjk_ratio, "duplicate_ratio": args.duplicate_ratio,
+            "collision_rate": args.collision_rate, "tracker_sample": args.tracker_sample,
+            "repeat": args.repeat, "seed": args.seed,
+        },
+        "results": {},
+    }
+    try:
+        for size in sizes:
+            result["results"][str(size)] = run_size(size, args, workdir)
+            print()
+    finally:
+        if args.workdir is None and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"📁 保留工作目錄：{workdir}")
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"micro_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 結果：{output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} 個項目退化")
+            return 1
+        print("✅ 沒有退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模擬視覺模型伺服器 - 模仿 LM Studio 的 OpenAI 相容端點，用於量測管線吞吐量
+
+功能：
+- POST /v1/chat/completions：返回固定的分析 JSON（依圖片內容雜湊挑選，同一張圖片結果相同）
+- GET /v1/models：返回模型列表
+- 可設定：
+  - 延遲分布：fixed:秒、uniform:最小,最大、lognormal:中位數,sigma
+  - 錯誤注入：依比例返回 HTTP 500
+  - 逾時注入：依比例停頓 hang 秒後直接斷線（不返回回應）
+  - 並行槽位：同時生成的請求數上限（超過時排隊，與 LM Studio 相同）
+  - 自訂輸出：JSON 陣列或 JSON Lines，每筆為一個分析結果
+- usage 區段：prompt token 依圖片大小估算，completion token 依輸出長度估算
+
+使用方式：
+    python benchmarks/mock_vision_server.py --port 1234 --latency lognormal:1.5,0.4 --slots 2
+    # 另一個終端機：
+    image-rename run --target-dir /tmp/images
+
+設計原理：
+- 只使用標準庫，不需要 GPU 或模型檔案即可重現完整流程
+- 隨機數使用固定種子，同樣的設定產生同樣的延遲序列，結果可比較
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_OUTPUTS = [
+    {"image_title": "月度營收報告", "main_theme": "財經", "sub_theme": "營收分析",
+     "core_content": "月度營收與成長率", "recommended_name": "財經_營收分析_月度營收報告"},
+    {"image_title": "系統架構圖", "main_theme": "技術", "sub_theme": "AI系統",
+     "core_content": "推論服務架構", "recommended_name": "技術_AI系統_系統架構圖"},
+    {"image_title": "N/A", "main_theme": "設計", "sub_theme": "介面設計",
+     "core_content": "行動應用登入畫面", "recommended_name": "設計_介面設計_登入畫面"},
+    {"image_title": "專案時程表", "main_theme": "報告", "sub_theme": "專案管理",
+     "core_content": "第三季里程碑", "recommended_name": "報告_專案管理_專案時程表"},
+    {"image_title": "投資組合配置", "main_theme": "財經", "sub_theme": "投資分析",
+     "core_content": "股債配置比例", "recommended_name": "財經_投資分析_投資組合配置"},
+]
+MODEL_ID = "qwen/qwen3-vl-30b"
+# 每 KB base64 圖片約使用的 prompt token（粗略估算）
+TOKENS_PER_KB = 2.0
+PROMPT_BASE_TOKENS = 180
+
+
+def parse_latency(spec: str):
+    """
+    解析延遲分布規格，返回 (rng) -> 秒 的函式
+
+    Raises:
+        ValueError: 格式錯誤
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")] if params else []
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        import math
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"無效的延遲規格：{spec}（fixed:S、uniform:A,B、lognormal:中位數,sigma）")
+
+
+def load_outputs(path: Path) -> List[Dict]:
+    """讀取自訂輸出（JSON 陣列或 JSON Lines）"""
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class MockVisionServer(ThreadingHTTPServer):
+    """模擬伺服器（serve_forever 或 start() 在背景線程執行）"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: str = "fixed:0", error_rate: float = 0.0,
+                 timeout_rate: float = 0.0, hang_seconds: float = 5.0,
+                 slots: int = 1, outputs: Optional[List[Dict]] = None, seed: int = 0):
+        """
+        Args:
+            port: 0 表示由系統指定可用埠
+            latency: 延遲分布規格（見 parse_latency）
+            error_rate: 返回 HTTP 500 的比例
+            timeout_rate: 停頓後斷線的比例
+            hang_seconds: 逾時注入的停頓秒數（應大於客戶端逾時）
+            slots: 並行生成的槽位數
+            outputs: 分析結果列表
+            seed: 隨機種子
+        """
+        super().__init__((host, port), _Handler)
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.slots = threading.BoundedSemaphore(slots)
+        self.outputs = outputs or DEFAULT_OUTPUTS
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "timeouts": 0, "max_concurrency": 0}
+        self._active = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> "MockVisionServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-vision", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def draw(self):
+        """抽出本次請求的（延遲, 是否錯誤, 是否逾時）"""
+        with self.lock:
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+            return self.latency(self.rng), roll < self.error_rate, \
+                self.error_rate <= roll < self.error_rate + self.timeout_rate
+
+    def enter(self):
+        with self.lock:
+            self._active += 1
+            self.stats["max_concurrency"] = max(self.stats["max_concurrency"], self._active)
+
+    def leave(self):
+        with self.lock:
+            self._active -= 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MockVisionServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, data: Dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客戶端已逾時斷線
+            pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": MODEL_ID, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        image_url = ""
+        for message in request.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, list):
+                for part in content:
+                    if part.get("type") == "image_url":
+                        image_url = part["image_url"]["url"]
+
+        server = self.server
+        latency, error, timeout = server.draw()
+        with server.slots:
+            server.enter()
+            try:
+                if timeout:
+                    with server.lock:
+                        server.stats["timeouts"] += 1
+                    time.sleep(server.hang_seconds)
+                    self.close_connection = True
+                    return
+                time.sleep(latency)
+            finally:
+                server.leave()
+
+        if error:
+            with server.lock:
+                server.stats["errors"] += 1
+            self._send_json(500, {"error": {"message": "injected error", "type": "server_error"}})
+            return
+
+        digest = hashlib.md5(image_url.encode("utf-8")).digest()
+        output = server.outputs[int.from_bytes(digest[:4], "big") % len(server.outputs)]
+        content = json.dumps(output, ensure_ascii=False)
+        prompt_tokens = PROMPT_BASE_TOKENS + int(len(image_url) / 1024 * TOKENS_PER_KB)
+        completion_tokens = max(1, len(content) // 2)
+        self._send_json(200, {
+            "id": f"chatcmpl-{digest.hex()[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", MODEL_ID),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+            "stats": {"generation_time": round(latency, 4)},
+        })
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """模擬伺服器的參數（基準測試共用）"""
+    parser.add_argument("--latency", default="fixed:0",
+                        help="延遲分布：fixed:S、uniform:A,B、lognormal:中位數,sigma（默認：fixed:0）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 500 的比例")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="停頓後斷線的比例")
+    parser.add_argument("--hang-seconds", type=float, default=5.0, help="逾時注入的停頓秒數")
+    parser.add_argument("--slots", type=int, default=1, help="並行生成的槽位數")
+    parser.add_argument("--outputs", default=None, help="自訂分析結果（JSON 陣列或 JSON Lines）")
+    parser.add_argument("--seed", type=int, default=0, help="隨機種子")
+
+
+def server_from_args(args, host: str = "127.0.0.1", port: int = 0) -> MockVisionServer:
+    return MockVisionServer(
+        host, port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        slots=args.slots,
+        outputs=load_outputs(args.outputs) if args.outputs else None,
+        seed=args.seed,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="模擬 LM Studio 的 OpenAI 相容視覺模型端點")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        server = server_from_args(args, args.host, args.port)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"❌ 無法啟動模擬伺服器：{e}")
+    print(f"🧪 模擬伺服器：{server.url}（延遲 {args.latency}，槽位 {args.slots}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 {json.dumps(server.stats, ensure_ascii=False)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
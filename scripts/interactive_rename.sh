@@ -30,12 +30,18 @@ NC='\033[0m'
 
 # 項目設定
 PROJECT_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
-CONDA_ENV="image-rename"
 CONFIG_FILE="${PROJECT_ROOT}/config/config.yaml"
 LOG_DIR="${PROJECT_ROOT}/logs"
 TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
 LOG_FILE="${LOG_DIR}/run_${TIMESTAMP}.log"
 
+# 命令行入口：已安裝（pip install -e .）時使用 image-rename，否則直接以 python3 執行
+if command -v image-rename &> /dev/null; then
+    RENAME_CLI=(image-rename)
+else
+    RENAME_CLI=(python3 "${PROJECT_ROOT}/src/rename_cli.py")
+fi
+
 # 創建日誌目錄
 mkdir -p "$LOG_DIR"
 
@@ -125,33 +131,9 @@ ask_directory() {
     done
 }
 
-# 計算圖片數量
-count_images() {
-    local dir="$1"
-    find "$dir" -maxdepth 1 \( -iname "*.jpg" -o -iname "*.jpeg" -o -iname "*.png" \
-        -o -iname "*.gif" -o -iname "*.webp" -o -iname "*.bmp" \) -type f 2>/dev/null | wc -l
-}
-
-# 智能檢測已命名檔案（新增）
-detect_renamed_files() {
-    local dir="$1"
-    local has_chinese=0
-    local unnamed_count=0
-    local renamed_count=0
-    
-    # 統計包含中文和不包含中文的檔案
-    while IFS= read -r -d '' file; do
-        filename=$(basename "$file")
-        # 簡單的中文檢測：通過 grep 或 perl
-        if echo "$filename" | grep -q '[^\x00-\x7F]'; then
-            ((renamed_count++))
-        else
-            ((unnamed_count++))
-        fi
-    done < <(find "$dir" -maxdepth 1 \( -iname "*.jpg" -o -iname "*.jpeg" -o -iname "*.png" \
-        -o -iname "*.gif" -o -iname "*.webp" -o -iname "*.bmp" \) -type f -print0 2>/dev/null)
-    
-    echo "$unnamed_count $renamed_count"
+# 計算圖片數量並檢測已命名檔案（單次掃描，輸出：總數 未命名數 已命名數）
+scan_images() {
+    "${RENAME_CLI[@]}" scan --target-dir "$1" --porcelain 2>/dev/null || echo "0 0 0"
 }
 
 #######################################################
@@ -189,7 +171,7 @@ main() {
     fi
     
     # 驗證圖片數量和檢測已命名檔案
-    IMAGE_COUNT=$(count_images "$IMAGE_DIR")
+    read IMAGE_COUNT UNNAMED_COUNT RENAMED_COUNT <<< "$(scan_images "$IMAGE_DIR")"
     
     if [ "$IMAGE_COUNT" -eq 0 ]; then
         print_warning "找不到圖片檔案"
@@ -201,9 +183,6 @@ main() {
     else
         print_success "找到 $IMAGE_COUNT 個圖片檔案"
         
-        # 智能檢測已命名的檔案
-        read UNNAMED_COUNT RENAMED_COUNT <<< "$(detect_renamed_files "$IMAGE_DIR")"
-        
         if [ "$RENAMED_COUNT" -gt 0 ]; then
             echo ""
             print_warning "檢測到 $RENAMED_COUNT 個已命名的檔案，$UNNAMED_COUNT 個未命名的檔案"
@@ -265,25 +244,13 @@ main() {
     print_info "步驟 4: 環境檢查"
     echo ""
     
-    # 檢查 Conda
-    if ! command -v conda &> /dev/null; then
-        print_error "找不到 Conda"
+    # 檢查 Python 依賴（請先 conda activate image-rename 或 pip install -e .）
+    if ! python3 -c "import requests, yaml" &> /dev/null; then
+        print_error "找不到 Python 依賴（requests、PyYAML）"
+        echo -e "${YELLOW}請先執行：conda activate image-rename 或 pip install -e ${PROJECT_ROOT}${NC}"
         exit 1
     fi
-    print_success "Conda 已安裝"
-    
-    # 檢查/創建環境
-    if ! conda env list | grep -q "^${CONDA_ENV} "; then
-        print_warning "環境 '${CONDA_ENV}' 不存在，正在創建..."
-        if conda env create -f "${PROJECT_ROOT}/environment.yml" -q; then
-            print_success "環境創建成功"
-        else
-            print_error "環境創建失敗"
-            exit 1
-        fi
-    else
-        print_success "環境 '${CONDA_ENV}' 已存在"
-    fi
+    print_success "Python 環境已就緒"
     
     # 檢查 LM Studio
     if ! timeout 2 curl -s http://127.0.0.1:1234/v1/models > /dev/null 2>&1; then
@@ -310,31 +277,19 @@ main() {
     if [ "$FORCE_RENAME" = true ]; then
         PYTHON_ARGS+=("--force-rename")
     fi
+    # 刪除原檔案由命名引擎在重命名時處理（移動而非複製），不再另外搜尋刪除
+    if [ "$DELETE_ORIGINAL" = true ]; then
+        PYTHON_ARGS+=("--delete-original")
+    fi
     
-    if conda run -n "$CONDA_ENV" python "${PROJECT_ROOT}/src/full_batch_rename_execute.py" \
-        "${PYTHON_ARGS[@]}"; then
+    if "${RENAME_CLI[@]}" run "${PYTHON_ARGS[@]}"; then
         
         echo ""
         print_header "✨ 分析完成！"
         
-        # 如果選擇刪除原檔案
         if [ "$DELETE_ORIGINAL" = true ]; then
-            print_warning "處理原檔案..."
-            
-            # 計算需要刪除的檔案
-            DELETE_COUNT=0
-            
-            # 尋找所有原始檔案（copilot-image-* 格式）並刪除
-            while IFS= read -r -d '' file; do
-                rm -f "$file"
-                ((DELETE_COUNT++))
-                log "已刪除：$file"
-            done < <(find "$IMAGE_DIR" -maxdepth 1 -iname "copilot-image-*.png" -o -iname "copilot-image-*.jpg" -o -iname "copilot-image-*.jpeg" -print0 2>/dev/null)
-            
-            if [ "$DELETE_COUNT" -gt 0 ]; then
-                print_success "已刪除 $DELETE_COUNT 個原檔案"
-                log "已刪除 $DELETE_COUNT 個原檔案"
-            fi
+            print_success "已刪除原檔案（重命名時移動）"
+            log "已刪除原檔案（重命名時移動）"
         else
             print_success "已保留原檔案"
             log "已保留原檔案"
@@ -373,7 +328,7 @@ main() {
 }
 
 # 捕捉 Ctrl+C
-trap 'echo ""; print_warning "操作已中止"; log "使用者中止操作"; exit 130' INT
+trap 'echo ""; print_warning "操作已中止（分析進度已保存，再次執行即從中斷處繼續）"; log "使用者中止操作"; exit 130' INT
 
 # 運行主程序
 main
@@ -17,7 +17,13 @@ NC='\033[0m'
 # 路徑
 PROJECT_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 IMAGE_DIR="${HOME}/Downloads"
-CONDA_ENV="image-rename"
+
+# 命令行入口：已安裝（pip install -e .）時使用 image-rename，否則直接以 python3 執行
+if command -v image-rename &> /dev/null; then
+    RENAME_CLI=(image-rename)
+else
+    RENAME_CLI=(python3 "${PROJECT_ROOT}/src/rename_cli.py")
+fi
 
 echo ""
 echo -e "${BLUE}┌──────────────────────────────────────────────┐${NC}"
@@ -25,17 +31,12 @@ echo -e "${BLUE}│${NC} ${BLUE}✨ 圖片智能命名 - 一鍵執行${NC}
 echo -e "${BLUE}└──────────────────────────────────────────────┘${NC}"
 echo ""
 
-# 檢查 Conda
-if ! command -v conda &> /dev/null; then
-    echo -e "${RED}✗ 找不到 Conda，請先安裝 Miniconda${NC}"
-    exit 1
-fi
-
-# 檢查/創建環境
+# 檢查 Python 依賴
 echo -e "${YELLOW}🔧 準備環境...${NC}"
-if ! conda env list | grep -q "^${CONDA_ENV} "; then
-    echo -e "${YELLOW}📦 創建 Conda 環境（約 2-3 分鐘）...${NC}"
-    conda env create -f "${PROJECT_ROOT}/environment.yml" -q
+if ! python3 -c "import requests, yaml" &> /dev/null; then
+    echo -e "${RED}✗ 找不到 Python 依賴（requests、PyYAML）${NC}"
+    echo -e "${YELLOW}💡 請先執行：conda activate image-rename 或 pip install -e ${PROJECT_ROOT}${NC}"
+    exit 1
 fi
 
 # 檢查 LM Studio
@@ -52,8 +53,8 @@ echo -e "${BLUE}🚀 開始分析圖片...${NC}"
 echo -e "${YELLOW}⏱️  可能需要幾分鐘，請耐心等待${NC}\n"
 
 # 執行分析
-if conda run -n "$CONDA_ENV" python "${PROJECT_ROOT}/src/full_batch_rename_execute.py" \
-    --image_dir "$IMAGE_DIR" \
+if "${RENAME_CLI[@]}" run \
+    --target-dir "$IMAGE_DIR" \
     --config "${PROJECT_ROOT}/config/config.yaml"; then
     
     echo ""
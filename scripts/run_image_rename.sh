@@ -18,7 +18,6 @@ NC='\033[0m' # No Color
 
 # 項目根路徑（自動偵測）
 PROJECT_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
-CONDA_ENV="image-rename"
 IMAGE_DIR="${PROJECT_ROOT}/data/images"  # 預設圖片目錄
 CONFIG_FILE="${PROJECT_ROOT}/config/config.yaml"
 LOG_DIR="${PROJECT_ROOT}/logs"
@@ -63,46 +62,33 @@ log() {
 # 創建日誌目錄
 mkdir -p "$LOG_DIR"
 
+# 命令行入口：已安裝（pip install -e .）時使用 image-rename，否則直接以 python3 執行
+if command -v image-rename &> /dev/null; then
+    RENAME_CLI=(image-rename)
+else
+    RENAME_CLI=(python3 "${PROJECT_ROOT}/src/rename_cli.py")
+fi
+
 #######################################################
 # 🔍 環境檢查函數
 #######################################################
 
-check_conda_installed() {
-    print_step "檢查 Conda 環境..."
+check_python_env() {
+    print_step "檢查 Python 環境..."
     
-    if ! command -v conda &> /dev/null; then
-        print_error "找不到 Conda！"
+    # 依賴應已安裝在目前的環境（conda activate image-rename 或 pip install -e .）
+    if ! python3 -c "import requests, yaml" &> /dev/null; then
+        print_error "找不到 Python 依賴（requests、PyYAML）！"
         echo ""
-        echo "💡 請先安裝 Miniconda 或 Anaconda："
-        echo "   https://docs.conda.io/projects/miniconda/en/latest/"
+        echo "💡 請先準備環境："
+        echo "   conda activate image-rename"
+        echo "   或 pip install -e ${PROJECT_ROOT}"
+        log "✗ 找不到 Python 依賴"
         exit 1
     fi
     
-    print_success "Conda 已安裝"
-    log "✓ Conda 已安裝"
-}
-
-check_conda_env_exists() {
-    print_step "檢查 Conda 環境 '${CONDA_ENV}'..."
-    
-    # 檢查環境是否存在
-    if ! conda env list | grep -q "^${CONDA_ENV} "; then
-        print_warning "環境 '${CONDA_ENV}' 不存在，需要創建..."
-        log "⚠  環境 '${CONDA_ENV}' 不存在，創建中..."
-        
-        echo -e "\n${BOLD}📦 創建 Conda 環境（約需 2-3 分鐘）...${NC}"
-        if conda env create -f "${PROJECT_ROOT}/environment.yml" >> "$LOG_FILE" 2>&1; then
-            print_success "環境創建成功"
-            log "✓ 環境創建成功"
-        else
-            print_error "環境創建失敗"
-            log "✗ 環境創建失敗，查看日誌：$LOG_FILE"
-            exit 1
-        fi
-    else
-        print_success "環境 '${CONDA_ENV}' 已存在"
-        log "✓ 環境已存在"
-    fi
+    print_success "Python 環境已就緒"
+    log "✓ Python 環境已就緒"
 }
 
 check_lm_studio() {
@@ -154,7 +140,7 @@ check_image_directory() {
     fi
     
     # 檢查是否有圖片檔案
-    image_count=$(find "$IMAGE_DIR" -maxdepth 1 \( -iname "*.jpg" -o -iname "*.jpeg" -o -iname "*.png" -o -iname "*.gif" -o -iname "*.webp" -o -iname "*.bmp" \) -type f 2>/dev/null | wc -l)
+    read image_count _ _ <<< "$("${RENAME_CLI[@]}" scan --target-dir "$IMAGE_DIR" --porcelain 2>/dev/null || echo "0 0 0")"
     
     if [ "$image_count" -eq 0 ]; then
         print_warning "圖片目錄中沒有找到圖片檔案"
@@ -189,14 +175,11 @@ check_config_file() {
 run_image_analysis() {
     print_step "啟動圖片分析..."
     
-    # 激活 Conda 環境
-    log "啟動 Conda 環境: $CONDA_ENV"
+    log "執行：${RENAME_CLI[*]} run"
     
-    # 使用 conda run 執行，避免 source 問題
-    if conda run -n "$CONDA_ENV" python "${PROJECT_ROOT}/src/full_batch_rename_execute.py" \
-        --image_dir "$IMAGE_DIR" \
-        --config "$CONFIG_FILE" \
-        --log_file "${LOG_DIR}/analysis_${TIMESTAMP}.log" >> "$LOG_FILE" 2>&1; then
+    if "${RENAME_CLI[@]}" run \
+        --target-dir "$IMAGE_DIR" \
+        --config "$CONFIG_FILE" >> "$LOG_FILE" 2>&1; then
         
         print_success "圖片分析完成！"
         log "✓ 圖片分析完成"
@@ -243,7 +226,7 @@ main() {
     print_header "🎯 圖片智能命名系統 v1.0"
     
     echo "一鍵執行流程："
-    echo "1. ✓ 檢查 Conda 環境"
+    echo "1. ✓ 檢查 Python 環境"
     echo "2. ✓ 檢查 LM Studio 連接"
     echo "3. ✓ 檢查圖片目錄"
     echo "4. ✓ 啟動分析和命名"
@@ -267,8 +250,7 @@ main() {
     log "=========================================="
     
     # 執行檢查
-    check_conda_installed
-    check_conda_env_exists
+    check_python_env
     check_config_file
     check_image_directory
     check_lm_studio
@@ -318,7 +300,7 @@ main() {
 }
 
 # 捕捉 Ctrl+C
-trap 'print_error "操作已中止"; log "⚠  使用者中止操作"; exit 130' INT
+trap 'print_error "操作已中止（分析進度已保存，再次執行即從中斷處繼續）"; log "⚠  使用者中止操作"; exit 130' INT
 
 # 運行主程序
 main
@@ -5,134 +5,180 @@
 
 使用方法：
     python src/deduplicate_and_cleanup.py --target-dir /path/to/images
+    image-rename dedup --target-dir /path/to/images
 """
 
 import hashlib
 import json
 from pathlib import Path
 from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 import argparse
 
-# 解析命令行參數
-parser = argparse.ArgumentParser(
-    description="掃描並清理重複圖片檔案"
-)
-parser.add_argument(
-    "--target-dir",
-    default=None,
-    help="指定要掃描的目錄（默認：當前目錄）"
-)
-args = parser.parse_args()
-
 # 使用相對路徑：項目根目錄
 PROJECT_ROOT = Path(__file__).parent.parent
-if args.target_dir:
-    downloads_dir = Path(args.target_dir).expanduser()
-else:
-    downloads_dir = Path.cwd()
-
-print("🔍 第一步：偵測重複圖片檔案")
-print("=" * 70)
-print(f"掃描目錄：{downloads_dir}")
-print()
-
-# 掃描所有圖片（遞迴掃描所有子資料夾）
-image_files = []
-for file_path in sorted(downloads_dir.rglob("*")):
-    if file_path.is_file() and file_path.suffix.lower() in {'.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp'}:
-        image_files.append(file_path)
-
-print(f"📋 掃描完成：{len(image_files)} 個圖片檔案")
-print()
-
-# 計算檔案哈希值
-print("🔐 計算檔案哈希值...")
-file_hashes = defaultdict(list)
-
-for file_path in image_files:
-    try:
-        # 計算文件內容的 MD5 哈希
-        md5_hash = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                md5_hash.update(chunk)
-        
-        file_hash = md5_hash.hexdigest()
-        file_hashes[file_hash].append(file_path)
-    except:
-        pass
-
-print(f"✅ 哈希計算完成")
-print()
-
-# 找出重複檔案
-duplicates_to_delete = []
-duplicate_info = []
-
-for file_hash, files in file_hashes.items():
-    if len(files) > 1:
-        # 按修改時間排序，保留最新的，刪除舊的
-        sorted_files = sorted(files, key=lambda x: x.stat().st_mtime, reverse=True)
-        
-        # 保留第一個（最新的），其他標記為重複
-        for dup_file in sorted_files[1:]:
-            duplicates_to_delete.append(dup_file)
-            duplicate_info.append({
-                "keep": sorted_files[0].name,
-                "delete": dup_file.name,
-                "hash": file_hash,
-                "size": dup_file.stat().st_size
-            })
-
-print(f"📊 重複偵測結果:")
-print(f"  總計檔案：{len(image_files)}")
-print(f"  唯一檔案：{len(image_files) - len(duplicates_to_delete)}")
-print(f"  重複副本：{len(duplicates_to_delete)}")
-print()
-
-if duplicates_to_delete:
-    print("🗑️ 要刪除的重複檔案清單：")
+SESSION_DIR = PROJECT_ROOT / "data" / "session"
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp'}
+
+
+def find_image_files(root: Path) -> List[Path]:
+    """掃描所有圖片（遞迴掃描所有子資料夾）"""
+    return [
+        file_path for file_path in sorted(root.rglob("*"))
+        if file_path.is_file() and file_path.suffix.lower() in IMAGE_EXTENSIONS
+    ]
+
+
+def file_md5(file_path: Path) -> str:
+    """計算文件內容的 MD5 哈希"""
+    md5_hash = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            md5_hash.update(chunk)
+    return md5_hash.hexdigest()
+
+
+def find_duplicates(image_files: List[Path]) -> Tuple[List[Path], List[Dict]]:
+    """
+    找出重複檔案（同內容保留修改時間最新的一份）
+
+    Returns:
+        (要刪除的檔案列表, 重複明細列表)
+    """
+    file_hashes = defaultdict(list)
+    for file_path in image_files:
+        try:
+            file_hashes[file_md5(file_path)].append(file_path)
+        except OSError:
+            pass
+
+    duplicates_to_delete = []
+    duplicate_info = []
+    for file_hash, files in file_hashes.items():
+        if len(files) > 1:
+            # 按修改時間排序，保留最新的，刪除舊的
+            sorted_files = sorted(files, key=lambda x: x.stat().st_mtime, reverse=True)
+
+            # 保留第一個（最新的），其他標記為重複
+            for dup_file in sorted_files[1:]:
+                duplicates_to_delete.append(dup_file)
+                duplicate_info.append({
+                    "keep": sorted_files[0].name,
+                    "delete": dup_file.name,
+                    "hash": file_hash,
+                    "size": dup_file.stat().st_size
+                })
+    return duplicates_to_delete, duplicate_info
+
+
+def cleanup_duplicates(target_dir: Path, session_dir: Path = SESSION_DIR,
+                       dry_run: bool = False) -> Dict:
+    """
+    偵測並刪除重複圖片，保存 cleanup_report.json
+
+    Args:
+        target_dir: 要掃描的目錄
+        session_dir: 報告保存目錄
+        dry_run: 只列出重複檔案，不刪除
+
+    Returns:
+        清理報告 dict
+    """
+    print("🔍 第一步：偵測重複圖片檔案")
+    print("=" * 70)
+    print(f"掃描目錄：{target_dir}")
     print()
-    for info in duplicate_info[:10]:  # 顯示前10個
-        print(f"  保留: {info['keep']}")
-        print(f"  刪除: {info['delete']}")
-        print()
-    
-    if len(duplicate_info) > 10:
-        print(f"  ... 還有 {len(duplicate_info) - 10} 個重複")
-    
+
+    image_files = find_image_files(target_dir)
+    print(f"📋 掃描完成：{len(image_files)} 個圖片檔案")
     print()
-    print("開始刪除重複檔案...")
-    
+
+    print("🔐 計算檔案哈希值...")
+    duplicates_to_delete, duplicate_info = find_duplicates(image_files)
+    print(f"✅ 哈希計算完成")
+    print()
+
+    print(f"📊 重複偵測結果:")
+    print(f"  總計檔案：{len(image_files)}")
+    print(f"  唯一檔案：{len(image_files) - len(duplicates_to_delete)}")
+    print(f"  重複副本：{len(duplicates_to_delete)}")
+    print()
+
     deleted_count = 0
-    for dup_file in duplicates_to_delete:
-        try:
-            dup_file.unlink()
-            deleted_count += 1
-            print(f"  ✅ 已刪除: {dup_file.name}")
-        except Exception as e:
-            print(f"  ❌ 刪除失敗: {dup_file.name} - {e}")
-    
+    if duplicates_to_delete:
+        print("🗑️ 要刪除的重複檔案清單：")
+        print()
+        for info in duplicate_info[:10]:  # 顯示前10個
+            print(f"  保留: {info['keep']}")
+            print(f"  刪除: {info['delete']}")
+            print()
+
+        if len(duplicate_info) > 10:
+            print(f"  ... 還有 {len(duplicate_info) - 10} 個重複")
+
+        print()
+        if dry_run:
+            print("ℹ️  試執行模式：不刪除任何檔案")
+        else:
+            print("開始刪除重複檔案...")
+            for dup_file in duplicates_to_delete:
+                try:
+                    dup_file.unlink()
+                    deleted_count += 1
+                    print(f"  ✅ 已刪除: {dup_file.name}")
+                except Exception as e:
+                    print(f"  ❌ 刪除失敗: {dup_file.name} - {e}")
+
+            print()
+            print(f"✅ 成功刪除：{deleted_count} 個重複檔案")
+    else:
+        print("✅ 沒有發現重複檔案")
+
+    # 保存清理報告
+    cleanup_report = {
+        "original_count": len(image_files),
+        "duplicates_found": len(duplicates_to_delete),
+        "deleted": deleted_count,
+        "remaining_count": len(image_files) - deleted_count,
+        "dry_run": dry_run,
+        "duplicate_details": duplicate_info
+    }
+
+    session_dir = Path(session_dir)
+    session_dir.mkdir(parents=True, exist_ok=True)
+    with open(session_dir / "cleanup_report.json", "w", encoding="utf-8") as f:
+        json.dump(cleanup_report, f, ensure_ascii=False, indent=2)
+
     print()
-    print(f"✅ 成功刪除：{deleted_count} 個重複檔案")
-else:
-    print("✅ 沒有發現重複檔案")
-
-# 保存清理報告
-cleanup_report = {
-    "original_count": len(image_files),
-    "duplicates_found": len(duplicates_to_delete),
-    "remaining_count": len(image_files) - len(duplicates_to_delete),
-    "duplicate_details": duplicate_info
-}
-
-with open(session_dir / "cleanup_report.json", "w", encoding="utf-8") as f:
-    json.dump(cleanup_report, f, ensure_ascii=False, indent=2)
-
-print()
-print("=" * 70)
-print(f"✅ 清理完成")
-print(f"📊 最終結果：")
-print(f"   原始檔案數：{cleanup_report['original_count']}")
-print(f"   已刪除：{cleanup_report['duplicates_found']}")
-print(f"   保留檔案數：{cleanup_report['remaining_count']}")
+    print("=" * 70)
+    print(f"✅ 清理完成")
+    print(f"📊 最終結果：")
+    print(f"   原始檔案數：{cleanup_report['original_count']}")
+    print(f"   已刪除：{cleanup_report['deleted']}")
+    print(f"   保留檔案數：{cleanup_report['remaining_count']}")
+    return cleanup_report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="掃描並清理重複圖片檔案"
+    )
+    parser.add_argument(
+        "--target-dir",
+        default=None,
+        help="指定要掃描的目錄（默認：當前目錄）"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="只列出重複檔案，不刪除"
+    )
+    args = parser.parse_args(argv)
+
+    target_dir = Path(args.target_dir).expanduser() if args.target_dir else Path.cwd()
+    cleanup_duplicates(target_dir, dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
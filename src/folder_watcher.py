@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+資料夾監看 - 偵測新增或變更的圖片，等檔案寫完後交給引擎處理
+
+功能：
+- watchdog 後端：以作業系統的檔案事件（Linux inotify、macOS FSEvents、Windows
+  ReadDirectoryChangesW）通知，閒置時不消耗 CPU
+- 輪詢後端（未安裝 watchdog 時）：每隔 poll_interval 秒只 stat 目錄，
+  修改時間有變動的目錄才列出檔案比對
+- 防抖（debounce）：檔案大小和修改時間連續 debounce 秒不變才視為寫入完成
+- 忽略隱藏檔（例如 macOS 截圖寫入中的 .Screenshot...）和非圖片副檔名
+
+使用方式：
+    watcher = FolderWatcher(root, IMAGE_EXTENSIONS, debounce=2.0)
+    watcher.start()
+    while True:
+        files = watcher.wait_ready(timeout=60)
+        ...
+    watcher.stop()
+
+設計原理：
+- 後端只負責「某個檔案可能變了」的通知，寫入是否完成一律由 collect() 以 stat 判斷，
+  兩種後端的行為一致
+- 輪詢後端看不到「就地覆寫既有檔案」（目錄修改時間不變）；截圖和下載都是新增檔案，
+  需要偵測覆寫時請安裝 watchdog
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# 檔案連續不變多久（秒）才視為寫入完成
+DEBOUNCE = 2.0
+# 輪詢後端的間隔（秒）
+POLL_INTERVAL = 2.0
+
+Signature = Tuple[int, int]
+
+
+def _signature(stat: os.stat_result) -> Signature:
+    return stat.st_size, stat.st_mtime_ns
+
+
+def watchdog_available() -> bool:
+    try:
+        import watchdog.observers  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class FolderWatcher:
+    """監看目錄樹中新增或變更的圖片"""
+
+    def __init__(self, root: Path, extensions: Iterable[str], debounce: float = DEBOUNCE,
+                 poll_interval: float = POLL_INTERVAL, backend: str = "auto",
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            root: 監看的目錄（含子目錄）
+            extensions: 圖片副檔名（小寫，含點）
+            debounce: 檔案連續不變多久（秒）才視為寫入完成
+            poll_interval: 輪詢後端的間隔（秒）
+            backend: auto（有 watchdog 時使用）、watchdog 或 poll
+
+        Raises:
+            ValueError: 未知的後端，或指定 watchdog 但未安裝
+        """
+        if backend == "auto":
+            backend = "watchdog" if watchdog_available() else "poll"
+        elif backend == "watchdog" and not watchdog_available():
+            raise ValueError("未安裝 watchdog（pip install watchdog），或改用輪詢（backend=poll）")
+        elif backend not in ("watchdog", "poll"):
+            raise ValueError(f"未知的監看後端：{backend}（可用：auto、watchdog、poll）")
+        self.root = Path(root)
+        self.extensions = {e.lower() for e in extensions}
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        # 待確認的檔案：路徑 → (簽章, 最後一次變動的時間)
+        self._pending: Dict[Path, Tuple[Optional[Signature], float]] = {}
+        # 已交出的檔案和當時的簽章（之後沒有再變動的通知直接忽略）
+        self._delivered: Dict[Path, Signature] = {}
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+        # 輪詢後端的快照：目錄 → (修改時間, 子目錄, {檔案: 簽章})
+        self._snapshot: Dict[Path, Tuple[int, List[Path], Dict[Path, Signature]]] = {}
+
+    def is_candidate(self, path: Path) -> bool:
+        return path.suffix.lower() in self.extensions and not path.name.startswith(".")
+
+    def notice(self, path: Path):
+        """登記可能新增或變更的檔案（後端的線程呼叫）"""
+        path = Path(path)
+        if not self.is_candidate(path):
+            return
+        with self._lock:
+            previous = self._pending.get(path)
+            self._pending[path] = (previous[0] if previous else None, self.clock())
+        self._wake.set()
+
+    # ------------------------------------------------------------------
+    # 後端
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """開始監看（輪詢後端先建立目前的快照，既有檔案不會被通知）"""
+        self._stopped.clear()
+        if self.backend == "watchdog":
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+
+            watcher = self
+
+            class _Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    if event.is_directory:
+                        return
+                    if event.event_type in ("created", "modified", "closed"):
+                        watcher.notice(Path(event.src_path))
+                    elif event.event_type == "moved":
+                        watcher.notice(Path(event.dest_path))
+
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), str(self.root), recursive=True)
+            self._observer.start()
+        else:
+            self._poll(initial=True)
+            self._thread = threading.Thread(target=self._poll_loop, name="folder-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止監看"""
+        self._stopped.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _poll_loop(self):
+        while not self._stopped.wait(self.poll_interval):
+            self._poll()
+
+    def _poll(self, initial: bool = False):
+        """比對目錄修改時間，只列出有變動的目錄"""
+        seen: Set[Path] = set()
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            seen.add(directory)
+            try:
+                mtime = directory.stat().st_mtime_ns
+            except OSError:
+                continue
+            previous = self._snapshot.get(directory)
+            if previous is not None and previous[0] == mtime:
+                # 目錄內容沒變，子目錄仍要檢查（子目錄的變動不會更新上層的修改時間）
+                stack.extend(previous[1])
+                continue
+            subdirectories: List[Path] = []
+            files: Dict[Path, Signature] = {}
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith("."):
+                                subdirectories.append(Path(entry.path))
+                        elif entry.is_file() and self.is_candidate(Path(entry.name)):
+                            files[Path(entry.path)] = _signature(entry.stat())
+            except OSError:
+                continue
+            self._snapshot[directory] = (mtime, subdirectories, files)
+            stack.extend(subdirectories)
+            if not initial:
+                known = previous[2] if previous is not None else {}
+                for path, signature in files.items():
+                    if known.get(path) != signature:
+                        self.notice(path)
+        # 已刪除的目錄
+        for directory in set(self._snapshot) - seen:
+            del self._snapshot[directory]
+
+    # ------------------------------------------------------------------
+    # 防抖
+    # ------------------------------------------------------------------
+
+    def collect(self) -> List[Path]:
+        """
+        取出已寫入完成的檔案
+
+        檔案不存在或與上次交出時相同時移除；簽章有變動時重新計時；
+        連續 debounce 秒不變且非空檔才返回。
+        """
+        now = self.clock()
+        with self._lock:
+            pending = dict(self._pending)
+        ready = []
+        updates = {}
+        removed = []
+        for path, (signature, changed_at) in pending.items():
+            try:
+                current = _signature(path.stat())
+            except OSError:
+                removed.append(path)
+                continue
+            if current == self._delivered.get(path):
+                removed.append(path)
+            elif current != signature:
+                updates[path] = (current, now)
+            elif now - changed_at >= self.debounce and current[0] > 0:
+                ready.append(path)
+        with self._lock:
+            for path in removed:
+                if self._pending.get(path) == pending[path]:
+                    del self._pending[path]
+            for path, entry in updates.items():
+                # 期間又收到通知時以較新的時間為準
+                latest = self._pending.get(path)
+                self._pending[path] = (entry[0], max(entry[1], latest[1]) if latest else entry[1])
+            # 檢查期間又收到通知的檔案留待下次確認
+            ready = [path for path in ready if self._pending.get(path) == pending[path]]
+            for path in ready:
+                self._delivered[path] = pending[path][0]
+                del self._pending[path]
+        return sorted(ready)
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> List[Path]:
+        """
+        等待到有檔案寫入完成、逾時或 stop()
+
+        沒有待確認的檔案時只等待通知；有待確認的檔案時每 debounce/4 秒檢查一次。
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        while not self._stopped.is_set():
+            # 先清除再檢查，檢查之後才到的通知不會遺失
+            self._wake.clear()
+            ready = self.collect()
+            if ready:
+                return ready
+            wait = None if deadline is None else deadline - self.clock()
+            if wait is not None and wait <= 0:
+                return []
+            if self.pending_count:
+                step = max(0.05, self.debounce / 4)
+                wait = step if wait is None else min(wait, step)
+            self._wake.wait(wait)
+        return []
@@ -10,6 +10,9 @@
 - 實時進度顯示（進度條、百分比、ETA）
 - 執行日誌顯示（在選項原本位置）
 - 完成通知
+- 背景線程只把事件放入佇列，主線程以固定頻率（root.after）批次更新介面
+- 資料夾統計在背景線程逐步計算，可取消並快取（開始執行時不再重新掃描）
+- 任務伺服器（image-rename serve）執行中時，改為送出任務並輪詢日誌和進度
 
 設計特點：
 - 符合 macOS Human Interface Guidelines
@@ -23,11 +26,22 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, ttk
 import subprocess
+import os
+import time
 from pathlib import Path
 import threading
+import queue
 from datetime import datetime
 import re
 
+from progress_events import CallbackEventSink
+from progress_tracker import format_eta
+from rename_engine import RenameEngine, IMAGE_EXTENSIONS, is_already_renamed
+from job_server import JobClient, JobError
+from rename_planner import load_config
+from run_control import RunCancelled, RunControl
+from work_scheduler import POLICY_LABELS
+
 # 獲取項目根目錄
 PROJECT_ROOT = Path(__file__).parent.parent
 SCRIPTS_DIR = PROJECT_ROOT / "scripts"
@@ -43,6 +57,67 @@ LIGHT_TEXT = "#e8f4f8"        # 淺藍白色文字
 DARK_TEXT_BG = "#0d1f2d"      # 文本框背景
 BUTTON_TEXT = "#1a1a1a"       # 按鈕深色文字（高對比度）
 
+# 進度事件的階段名稱
+STAGE_LABELS = {"scan": "掃描", "analysis": "分析", "rename": "重命名"}
+
+# 介面更新
+UI_FRAME_MS = 50              # 事件佇列的處理間隔（約 20 fps）
+MAX_LOG_LINES = 2000          # 執行日誌最多保留的行數（超過時刪除最舊的行）
+STATS_UPDATE_SECONDS = 0.2    # 資料夾統計的中途回報間隔
+
+
+def format_bytes(size):
+    """以 B / KB / MB / GB 顯示檔案大小"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def compute_folder_stats(folder, cancel_event, on_update):
+    """
+    遞迴統計資料夾（背景線程執行，os.scandir 一次取得類型和大小）
+    
+    Args:
+        folder: 資料夾路徑
+        cancel_event: threading.Event，設定後盡快停止
+        on_update: on_update(stats, finished)，每 STATS_UPDATE_SECONDS 秒和結束時呼叫
+    
+    Returns:
+        統計 dict（images、subfolders、processed、bytes、files）；取消時返回 None
+    """
+    stats = {"images": 0, "subfolders": 0, "processed": 0, "bytes": 0}
+    files = []
+    pending = [folder]
+    last_update = time.monotonic()
+    while pending:
+        if cancel_event.is_set():
+            return None
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stats["subfolders"] += 1
+                            pending.append(entry.path)
+                        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                            stats["images"] += 1
+                            stats["bytes"] += entry.stat().st_size
+                            if is_already_renamed(os.path.splitext(entry.name)[0]):
+                                stats["processed"] += 1
+                            files.append(Path(entry.path))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        now = time.monotonic()
+        if now - last_update >= STATS_UPDATE_SECONDS:
+            on_update(dict(stats), False)
+            last_update = now
+    stats["files"] = files
+    on_update(stats, True)
+    return stats
+
 class ImageRenamerGUI:
     def __init__(self, root):
         self.root = root
@@ -91,6 +166,24 @@ class ImageRenamerGUI:
         self.total_items = 0
         self.is_processing = False
         
+        # 命名引擎（第一次執行時建立，之後重複使用）
+        self.engine = None
+        
+        # 任務伺服器（image-rename serve 執行中時改為送出任務，多個呼叫端共用一個引擎）
+        self.job_client = JobClient.from_config(load_config())
+        self.remote_job = None
+        
+        # 目前執行的暫停 / 停止控制（每次開始時建立）
+        self.run_control = None
+        
+        # 背景線程 → 主線程的事件佇列（Tk 只能在主線程操作）
+        self.events = queue.Queue()
+        self.root.after(UI_FRAME_MS, self.process_events)
+        
+        # 資料夾統計：快取（路徑 → 統計）和目前背景掃描的取消旗標
+        self.folder_stats = {}
+        self.stats_cancel = None
+        
         # 保存視窗狀態以備恢復
         self.saved_geometry = None
         
@@ -219,6 +312,16 @@ class ImageRenamerGUI:
         )
         path_display.pack(fill=tk.X, pady=(0, 12))
         
+        # 資料夾統計（背景掃描逐步更新）
+        self.folder_stats_label = tk.Label(
+            folder_frame,
+            text="",
+            font=self.help_font,
+            bg=self.bg_color,
+            fg=MACOS_GRAY
+        )
+        self.folder_stats_label.pack(anchor=tk.W, pady=(0, 8))
+        
         # 選擇按鈕
         select_btn = tk.Button(
             folder_frame,
@@ -347,6 +450,45 @@ class ImageRenamerGUI:
         )
         clear_btn.pack(side=tk.LEFT, padx=5)
         
+        # 暫停 / 停止按鈕（處理中才可按；進度立即保存，下次開始時從中斷處繼續）
+        self.pause_btn = tk.Button(
+            button_frame,
+            text="⏸️ 暫停",
+            command=self.toggle_pause,
+            font=self.button_font,
+            bg=MACOS_GRAY,
+            fg=BUTTON_TEXT,
+            padx=20,
+            pady=10,
+            cursor="hand2",
+            activebackground="#72747D",
+            activeforeground=BUTTON_TEXT,
+            relief=tk.RAISED,
+            bd=0,
+            highlightthickness=0,
+            state=tk.DISABLED
+        )
+        self.pause_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.stop_btn = tk.Button(
+            button_frame,
+            text="⏹️ 停止",
+            command=self.stop_renaming,
+            font=self.button_font,
+            bg=MACOS_GRAY,
+            fg=BUTTON_TEXT,
+            padx=20,
+            pady=10,
+            cursor="hand2",
+            activebackground="#72747D",
+            activeforeground=BUTTON_TEXT,
+            relief=tk.RAISED,
+            bd=0,
+            highlightthickness=0,
+            state=tk.DISABLED
+        )
+        self.stop_btn.pack(side=tk.LEFT, padx=5)
+        
         # 關閉按鈕（紅色，破壞性操作）
         quit_btn = tk.Button(
             button_frame,
@@ -444,6 +586,45 @@ class ImageRenamerGUI:
         )
         warning_text.pack(anchor=tk.W, pady=(8, 0))
         
+        # 分析順序（處理中變更時從下一張圖片開始生效）
+        schedule_label = tk.Label(
+            options_frame,
+            text="📑 分析順序",
+            font=self.checkbox_font,
+            bg=self.bg_color,
+            fg=self.fg_color
+        )
+        schedule_label.pack(anchor=tk.W, pady=(16, 4))
+        
+        self.schedule_var = tk.StringVar(value=POLICY_LABELS["path"])
+        schedule_menu = tk.OptionMenu(options_frame, self.schedule_var, *POLICY_LABELS.values())
+        schedule_menu.config(bg=self.bg_color, fg=self.fg_color, highlightthickness=0, cursor="hand2")
+        schedule_menu.pack(anchor=tk.W, padx=(20, 0))
+        self.schedule_var.trace_add("write", lambda *_: self.update_schedule())
+        
+        priority_help = tk.Label(
+            options_frame,
+            text="優先資料夾（逗號分隔，可用 *）",
+            font=("San Francisco", 12),
+            bg=self.bg_color,
+            fg=MACOS_GRAY,
+            justify=tk.LEFT
+        )
+        priority_help.pack(anchor=tk.W, padx=(20, 0), pady=(8, 2))
+        
+        self.priority_var = tk.StringVar(value="")
+        priority_entry = tk.Entry(
+            options_frame,
+            textvariable=self.priority_var,
+            font=("San Francisco", 12),
+            bg=self.text_bg,
+            fg=self.fg_color,
+            width=22
+        )
+        priority_entry.pack(anchor=tk.W, padx=(20, 0))
+        priority_entry.bind("<Return>", lambda _: self.update_schedule())
+        priority_entry.bind("<FocusOut>", lambda _: self.update_schedule())
+        
     def build_result_section(self, parent):
         """構建結果顯示部分（在原步驟2位置）"""
         result_frame = tk.LabelFrame(
@@ -490,10 +671,46 @@ class ImageRenamerGUI:
         if folder:
             self.selected_dir.set(folder)
             self.log(f"✅ 選擇了資料夾：{folder}\n", "info")
+            self.start_folder_stats(folder)
+            
+    def start_folder_stats(self, folder):
+        """在背景計算資料夾統計（取消上一個資料夾的掃描；已快取時直接顯示）"""
+        self.cancel_folder_stats()
+        cached = self.folder_stats.get(folder)
+        if cached is not None:
+            self.show_folder_stats(cached, True)
+            return
+        
+        self.folder_stats_label.config(text="📈 統計中...")
+        cancel_event = threading.Event()
+        self.stats_cancel = cancel_event
+        thread = threading.Thread(
+            target=compute_folder_stats,
+            args=(folder, cancel_event,
+                  lambda stats, finished: self.events.put(("folder_stats", folder, stats, finished)))
+        )
+        thread.daemon = True
+        thread.start()
+        
+    def cancel_folder_stats(self):
+        """取消進行中的資料夾統計"""
+        if self.stats_cancel is not None:
+            self.stats_cancel.set()
+            self.stats_cancel = None
+            
+    def show_folder_stats(self, stats, finished):
+        """顯示資料夾統計（主線程）"""
+        text = (
+            f"📈 圖片：{stats['images']} 個 | 子資料夾：{stats['subfolders']} 個 | "
+            f"已命名：{stats['processed']} 個 | 大小：{format_bytes(stats['bytes'])}"
+        )
+        self.folder_stats_label.config(text=text if finished else text + " | 統計中...")
             
     def clear_selection(self):
         """清空選擇"""
+        self.cancel_folder_stats()
         self.selected_dir.set("")
+        self.folder_stats_label.config(text="")
         self.result_text.delete(1.0, tk.END)
         
     def start_renaming(self):
@@ -507,101 +724,284 @@ class ImageRenamerGUI:
             return
         
         self.is_processing = True
+        self.run_control = RunControl()
+        self.pause_btn.config(state=tk.NORMAL, text="⏸️ 暫停")
+        self.stop_btn.config(state=tk.NORMAL)
         self.result_text.delete(1.0, tk.END)
         self.log("🚀 開始執行重命名...\n", "info")
         
+        # Tk 變數在主線程讀取，再交給背景線程
+        # 已完成的資料夾統計直接提供檔案清單，引擎不再重新掃描
+        cached = self.folder_stats.get(self.selected_dir.get())
+        options = {
+            "force_rename": self.force_rename_var.get(),
+            "delete_original": self.delete_original_var.get(),
+            "image_files": cached["files"] if cached is not None else None,
+            "control": self.run_control,
+        }
+        options.update(self.schedule_options())
+        
         # 在另一個線程中運行重命名
-        thread = threading.Thread(target=self.run_renaming)
+        thread = threading.Thread(
+            target=self.run_renaming,
+            args=(self.selected_dir.get(), options)
+        )
         thread.daemon = True
         thread.start()
         
-    def run_renaming(self):
-        """執行重命名（在后台線程）"""
-        try:
-            target_dir = self.selected_dir.get()
-            cmd = [
-                "python3",
-                str(PROJECT_ROOT / "src" / "full_batch_rename_execute.py"),
-                "--target", target_dir
-            ]
-            
-            if self.force_rename_var.get():
-                cmd.append("--force-rename")
-            
-            if self.delete_original_var.get():
-                cmd.append("--delete-original")
-            
-            # 執行 subprocess，實時捕獲輸出
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
+    def get_engine(self, target_dir, options):
+        """取得（或建立）重複使用的命名引擎，連線和組態在多次執行之間保留"""
+        if self.engine is None:
+            self.engine = RenameEngine(
+                target_dir,
+                on_log=self.on_engine_log,
+                event_sinks=[CallbackEventSink(self.on_progress_event)],
+                progress_lines=False
             )
+        else:
+            self.engine.set_target_dir(target_dir)
+        self.engine.control = options["control"]
+        self.engine.force_rename = options["force_rename"]
+        self.engine.delete_original = options["delete_original"]
+        self.engine.set_schedule(options["schedule"], options["priorities"])
+        return self.engine
+        
+    def schedule_options(self):
+        """目前選擇的排程策略和優先資料夾（主線程）"""
+        names = {label: name for name, label in POLICY_LABELS.items()}
+        return {
+            "schedule": names.get(self.schedule_var.get(), "path"),
+            "priorities": [p.strip() for p in self.priority_var.get().split(",") if p.strip()],
+        }
+        
+    def update_schedule(self):
+        """處理中變更分析順序：交給引擎（或任務伺服器）在下一張圖片前重新排序"""
+        if not self.is_processing:
+            return
+        options = self.schedule_options()
+        if self.remote_job is not None:
+            try:
+                self.job_client.set_schedule(self.remote_job, options["schedule"], options["priorities"])
+            except (JobError, OSError) as e:
+                self.log(f"⚠️ 無法變更分析順序：{e}\n", "warning")
+                return
+        elif self.engine is not None:
+            self.engine.set_schedule(options["schedule"], options["priorities"])
+        else:
+            return
+        self.log(f"📑 分析順序：{self.schedule_var.get()}"
+                 + (f"，優先 {', '.join(options['priorities'])}" if options["priorities"] else "")
+                 + "\n", "info")
+        
+    def toggle_pause(self):
+        """暫停（引擎保存進度後在圖片之間等待，模型閒置）或繼續"""
+        if not self.is_processing or self.run_control is None or self.run_control.cancelled:
+            return
+        pausing = not self.run_control.paused
+        try:
+            if self.remote_job is not None:
+                if pausing:
+                    self.job_client.pause(self.remote_job)
+                else:
+                    self.job_client.resume(self.remote_job)
+        except (JobError, OSError) as e:
+            self.log(f"⚠️ 無法{'暫停' if pausing else '繼續'}任務：{e}\n", "warning")
+            return
+        if pausing:
+            self.run_control.pause()
+            self.pause_btn.config(text="▶️ 繼續")
+            self.step_label.config(text="已暫停")
+        else:
+            self.run_control.resume()
+            self.pause_btn.config(text="⏸️ 暫停")
+        
+    def stop_renaming(self):
+        """停止：放棄進行中的請求，已完成的分析結果保存，下次開始時從中斷處繼續"""
+        if not self.is_processing or self.run_control is None or self.run_control.cancelled:
+            return
+        if self.remote_job is not None:
+            try:
+                self.job_client.cancel(self.remote_job)
+            except (JobError, OSError) as e:
+                self.log(f"⚠️ 無法取消任務：{e}\n", "warning")
+        self.run_control.cancel(abandon=True)
+        self.pause_btn.config(state=tk.DISABLED)
+        self.stop_btn.config(state=tk.DISABLED)
+        self.log("⏹️ 停止中...\n", "warning")
+        
+    def run_renaming(self, target_dir, options):
+        """執行重命名（在後台線程；任務伺服器執行中時交給伺服器，否則直接呼叫引擎）"""
+        try:
+            if self.job_client.available():
+                succeeded = self.run_remote(target_dir, options)
+            else:
+                engine = self.get_engine(target_dir, options)
+                engine.run(options["image_files"])
+                succeeded = True
             
-            # 讀取 stdout
-            for line in process.stdout:
-                self.parse_and_display(line)
-            
-            # 讀取 stderr
-            for line in process.stderr:
-                self.log(line, "error")
-            
-            process.wait()
-            
-            if process.returncode == 0:
+            if succeeded:
                 self.log("\n✅ 重命名完成！\n", "success")
-                messagebox.showinfo("完成", "圖片重命名已完成！")
-            else:
-                self.log(f"\n❌ 重命名失敗（錯誤碼：{process.returncode}）\n", "error")
+            self.events.put(("done", target_dir, succeeded))
                 
+        except RunCancelled:
+            self.log("\n⏹️ 已停止，進度已保存，下次開始時從中斷處繼續\n", "warning")
+            self.events.put(("done", target_dir, False))
         except Exception as e:
             self.log(f"❌ 執行出錯：{str(e)}\n", "error")
-        finally:
-            self.is_processing = False
+            self.events.put(("done", target_dir, False))
             
-    def parse_and_display(self, line):
-        """解析並顯示輸出"""
-        line = line.rstrip('\n')
-        
-        if "[進度]" in line:
-            # 解析進度訊息
-            match = re.search(r'\[進度\]\s+(\S+):\s+(\d+)%\s+\|\s+(\d+)/(\d+)\s+\|\s+ETA:\s+(.+)', line)
-            if match:
-                step = match.group(1)
-                pct = int(match.group(2))
-                current = int(match.group(3))
-                total = int(match.group(4))
-                eta = match.group(5)
-                
-                self.progress_label.config(text=f"進度：{pct}% ({current}/{total})")
-                self.progress_bar["value"] = pct
-                self.eta_label.config(text=f"ETA：{eta}")
-                self.step_label.config(text=f"正在執行：{step}")
-                self.log(line + "\n", "info")
-        elif "[完成]" in line:
-            self.progress_bar["value"] = 100
-            self.progress_label.config(text="進度：100% (完成！)")
-            self.log(line + "\n", "success")
-        elif line.startswith("✅"):
-            self.log(line + "\n", "success")
-        elif line.startswith("❌"):
-            self.log(line + "\n", "error")
+    def run_remote(self, target_dir, options):
+        """送出任務到任務伺服器，輪詢日誌和進度直到任務結束（後台線程）"""
+        job = self.job_client.submit(
+            target_dir, client="gui",
+            force_rename=options["force_rename"],
+            delete_original=options["delete_original"],
+            schedule=options["schedule"],
+            priorities=options["priorities"],
+        )
+        self.remote_job = job["id"]
+        self.log(f"🛎️ 已送出到任務伺服器：任務 #{job['id']}\n", "info")
+        # 送出期間按下的暫停 / 停止轉交給伺服器
+        control = options["control"]
+        if control.cancelled:
+            self.job_client.cancel(job["id"])
+        elif control.paused:
+            self.job_client.pause(job["id"])
+        try:
+            job = self.job_client.follow(job["id"], lambda line: self.on_engine_log(line + "\n"),
+                                         on_job=self.on_remote_job)
+        finally:
+            self.remote_job = None
+        if job["state"] != "done":
+            self.log(f"⚠️ 任務 #{job['id']}：{job['state']}"
+                     + (f"（{job['error']}）" if job.get("error") else "") + "\n", "warning")
+        return job["state"] == "done"
+        
+    def on_remote_job(self, job):
+        """任務伺服器回報的進度（後台線程）"""
+        progress = job.get("progress")
+        if progress:
+            self.events.put((
+                "progress", STAGE_LABELS.get(progress["stage"], progress["stage"]),
+                progress["processed"], progress["total"],
+                (progress["eta_seconds"] or 0, progress["eta_low"] or 0, progress["eta_high"] or 0)
+            ))
+        
+    def on_progress_event(self, event):
+        """進度事件回呼（背景線程；只轉交帶有計數的事件）"""
+        if event.processed is not None and event.total:
+            self.events.put((
+                "progress", STAGE_LABELS.get(event.stage, event.stage),
+                event.processed, event.total,
+                (event.eta_seconds or 0, event.eta_low or 0, event.eta_high or 0)
+            ))
+        
+    def on_engine_log(self, text):
+        """引擎日誌回呼（背景線程；text 可能是不含換行的半行，原樣插入）"""
+        line = text.strip()
+        if "[完成]" in line:
+            self.events.put(("progress", None, 1, 1, None))
+            self.log(text, "success")
+        elif line.startswith("✅") or line.endswith("✅"):
+            self.log(text, "success")
+        elif line.startswith("❌") or line.endswith("❌"):
+            self.log(text, "error")
         elif line.startswith("⚠️"):
-            self.log(line + "\n", "warning")
+            self.log(text, "warning")
         else:
-            self.log(line + "\n", "info")
+            self.log(text, "info")
             
     def log(self, message, tag="info"):
-        """記錄消息"""
-        self.result_text.insert(tk.END, message, tag)
-        self.result_text.see(tk.END)
-        self.root.update()
+        """記錄消息（任何線程皆可呼叫，實際插入在 process_events 中進行）"""
+        self.events.put(("log", message, tag))
+        
+    def process_events(self):
+        """
+        處理事件佇列（主線程，每 UI_FRAME_MS 毫秒一次）
+        
+        - 連續且標籤相同的日誌片段合併為一次插入，每個週期只捲動一次
+        - 進度只套用本週期最後一個事件
+        - 日誌超過 MAX_LOG_LINES 行時刪除最舊的行
+        """
+        try:
+            chunks = []
+            last_progress = None
+            done = None
+            while True:
+                try:
+                    event = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                kind = event[0]
+                if kind == "log":
+                    _, message, tag = event
+                    if chunks and chunks[-1][1] == tag:
+                        chunks[-1][0].append(message)
+                    else:
+                        chunks.append(([message], tag))
+                elif kind == "progress":
+                    last_progress = event[1:]
+                elif kind == "folder_stats":
+                    _, folder, stats, finished = event
+                    if folder != self.selected_dir.get():
+                        continue  # 已切換到其他資料夾
+                    if finished:
+                        self.folder_stats[folder] = stats
+                        self.stats_cancel = None
+                    self.show_folder_stats(stats, finished)
+                elif kind == "done":
+                    done = event[1:]
+        
+            if chunks:
+                for parts, tag in chunks:
+                    self.result_text.insert(tk.END, "".join(parts), tag)
+                line_count = int(self.result_text.index("end-1c").split(".")[0])
+                if line_count > MAX_LOG_LINES:
+                    self.result_text.delete("1.0", f"{line_count - MAX_LOG_LINES + 1}.0")
+                self.result_text.see(tk.END)
+        
+            if last_progress is not None:
+                self.update_progress(*last_progress)
+        
+            if done is not None:
+                folder, succeeded = done
+                self.is_processing = False
+                self.pause_btn.config(state=tk.DISABLED, text="⏸️ 暫停")
+                self.stop_btn.config(state=tk.DISABLED)
+                # 檔案已重命名，統計快取失效
+                self.folder_stats.pop(folder, None)
+                if folder == self.selected_dir.get():
+                    self.start_folder_stats(folder)
+                if succeeded:
+                    messagebox.showinfo("完成", "圖片重命名已完成！")
+        finally:
+            # 處理事件時發生例外也要繼續排程，否則介面停止更新
+            self.root.after(UI_FRAME_MS, self.process_events)
+        
+    def update_progress(self, step, current, total, eta_band):
+        """更新進度條和標籤（step 為 None 表示全部完成；eta_band 為 (ETA, 下限, 上限)）"""
+        if step is None:
+            self.progress_bar["value"] = 100
+            self.progress_label.config(text="進度：100% (完成！)")
+            return
+        pct = int(current * 100 / total) if total else 0
+        eta = format_eta(*eta_band)
+        self.progress_label.config(text=f"進度：{pct}% ({current}/{total})")
+        self.progress_bar["value"] = pct
+        self.eta_label.config(text=f"ETA：{eta}")
+        paused = self.run_control is not None and self.run_control.paused
+        self.step_label.config(text="已暫停" if paused else f"正在執行：{step}")
 
     def on_closing(self):
         """處理視窗關閉事件 - 優雅銷毀視窗"""
-        self.root.destroy()
+        self.cancel_folder_stats()
+        if self.run_control is not None:
+            self.run_control.cancel(abandon=True)
+        try:
+            if self.engine is not None:
+                self.engine.close()
+        finally:
+            self.root.destroy()
 
 
 def main():
@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本機任務伺服器 - 多個呼叫端（GUI、腳本、cron）共用一個引擎排隊執行重命名任務
+
+功能：
+- JobStore：任務佇列保存在 SQLite（伺服器重啟後，中斷的任務重新排隊）
+- JobServer：
+  - 只有一個工作線程和一個引擎：連線、組態、命名配置在任務之間保留，
+    同一時間只有一個任務向 LM Studio 送出請求
+  - 執行中的任務可暫停、繼續、取消（引擎在圖片之間停下，見 run_control.py）
+  - 每個任務保留最近的日誌行和最新進度，供呼叫端輪詢
+  - 每個目標目錄使用 session 目錄下自己的命名空間（session/roots/...，見 target_roots.py）
+- JobClient：呼叫端（只用標準庫）
+
+HTTP API（預設只綁定 127.0.0.1）：
+    GET  /health                    {"ok": true, "active": 任務 ID 或 null}
+    GET  /jobs                      {"jobs": [...]}（最新的在前）
+    POST /jobs                      建立任務 {"target_dir", "force_rename", "delete_original",
+                                    "limit", "schedule", "priorities", "client"}
+    GET  /jobs/<id>                 任務（執行中時含 progress）
+    GET  /jobs/<id>/log?since=N     {"lines": [...], "next": M}
+    POST /jobs/<id>/pause           暫停（排隊中的任務不會被取出）
+    POST /jobs/<id>/resume          繼續
+    POST /jobs/<id>/cancel          取消
+    POST /jobs/<id>/schedule        變更分析順序 {"schedule", "priorities"}
+
+任務狀態：queued → running → done / failed / cancelled；queued / running 可轉為 paused
+
+設計原理：
+- 多個行程各自連線時會互相搶同一個模型，排隊後總吞吐量不變、單一任務不再被拖慢
+- 執行中的任務暫停時工作線程一併等待，GPU 會真正空出來，而不是改跑下一個任務
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib import error as urlerror
+from urllib import request as urlrequest
+
+from progress_events import CallbackEventSink
+from run_control import RunCancelled, RunControl
+from target_roots import root_session_dir
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8790
+# 每個任務保留的日誌行數
+LOG_LINES = 2000
+# 已結束的任務保留日誌的數量
+FINISHED_LOGS = 20
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+JOB_OPTIONS = ("force_rename", "delete_original", "limit", "schedule", "priorities")
+
+
+class JobStore:
+    """任務佇列（SQLite，線程安全）"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " target_dir TEXT NOT NULL,"
+            " options TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " client TEXT,"
+            " created TEXT NOT NULL,"
+            " started TEXT,"
+            " finished TEXT,"
+            " report TEXT,"
+            " error TEXT)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _row(row) -> Dict:
+        keys = ("id", "target_dir", "options", "state", "client", "created", "started", "finished",
+                "report", "error")
+        job = dict(zip(keys, row))
+        job["options"] = json.loads(job["options"])
+        job["report"] = json.loads(job["report"]) if job["report"] else None
+        return job
+
+    def add(self, target_dir: str, options: Dict, client: Optional[str] = None) -> Dict:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (target_dir, options, state, client, created) VALUES (?, ?, 'queued', ?, ?)",
+                (target_dir, json.dumps(options, ensure_ascii=False), client, datetime.now().isoformat())
+            )
+            self._conn.commit()
+            job_id = cursor.lastrowid
+        return self.get(job_id)
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def list(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def next_queued(self) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+        return self._row(row) if row else None
+
+    def update(self, job_id: int, **fields):
+        if "report" in fields and fields["report"] is not None:
+            fields["report"] = json.dumps(fields["report"], ensure_ascii=False)
+        if "options" in fields:
+            fields["options"] = json.dumps(fields["options"], ensure_ascii=False)
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def requeue_interrupted(self) -> int:
+        """伺服器重啟時：上次執行中的任務重新排隊（增量模式會跳過已完成的部分）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = 'queued', started = NULL WHERE state = 'running'"
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobError(Exception):
+    """無效的任務請求（status：HTTP 狀態碼）"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class _JobLog:
+    """任務日誌（合併半行片段，保留最近 LOG_LINES 行）"""
+
+    def __init__(self):
+        self.lines: deque = deque(maxlen=LOG_LINES)
+        self.total = 0
+        self._partial = ""
+
+    def write(self, text: str):
+        text = self._partial + text
+        *complete, self._partial = text.split("\n")
+        for line in complete:
+            self.lines.append(line)
+            self.total += 1
+
+    def since(self, index: int) -> Dict:
+        first = self.total - len(self.lines)
+        start = max(index, first)
+        return {"lines": list(self.lines)[start - first:], "next": self.total}
+
+
+class JobServer:
+    """單一引擎的任務伺服器"""
+
+    def __init__(self, engine_factory: Callable, store: JobStore,
+                 host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, echo: bool = True):
+        """
+        Args:
+            engine_factory: 建立引擎的函式（接受 RenameEngine 的關鍵字參數）
+            store: 任務佇列
+            host / port: HTTP 端點
+            echo: 任務日誌是否同時輸出到伺服器的 stdout
+        """
+        self.store = store
+        self.host = host
+        self.port = port
+        self.echo = echo
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._logs: Dict[int, _JobLog] = {}
+        self.active: Optional[int] = None
+        self.control: Optional[RunControl] = None
+        self.progress: Optional[Dict] = None
+        self.engine_factory = engine_factory
+        self.engine = None
+        self.base_session: Optional[Path] = None
+        self._ready = threading.Event()
+        self._startup_error: Optional[Exception] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._worker: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # 引擎回呼（工作線程）
+    # ------------------------------------------------------------------
+
+    def _on_log(self, text: str):
+        if self.echo:
+            print(text, end="", flush=True)
+        job_id = self.active
+        if job_id is not None:
+            self._logs[job_id].write(text)
+
+    def _on_event(self, event):
+        if event.processed is not None and event.total:
+            self.progress = {
+                "stage": event.stage,
+                "processed": event.processed,
+                "total": event.total,
+                "eta_seconds": event.eta_seconds,
+                "eta_low": event.eta_low,
+                "eta_high": event.eta_high,
+            }
+
+    # ------------------------------------------------------------------
+    # 任務操作（HTTP 線程）
+    # ------------------------------------------------------------------
+
+    def submit(self, data: Dict) -> Dict:
+        target = data.get("target_dir")
+        if not target:
+            raise JobError("缺少 target_dir")
+        target_dir = Path(target).expanduser()
+        if not target_dir.is_absolute():
+            raise JobError(f"target_dir 必須是絕對路徑：{target}")
+        if not target_dir.is_dir():
+            raise JobError(f"目錄不存在：{target_dir}")
+        options = {name: data[name] for name in JOB_OPTIONS if data.get(name) is not None}
+        job = self.store.add(str(target_dir), options, data.get("client"))
+        self._wake.set()
+        return job
+
+    def jobs(self) -> List[Dict]:
+        """最近的任務（執行中的任務含 progress）"""
+        jobs = self.store.list()
+        progress = self.progress
+        for job in jobs:
+            if job["id"] == self.active and progress is not None:
+                job["progress"] = progress
+        return jobs
+
+    def job(self, job_id: int) -> Dict:
+        job = self.store.get(job_id)
+        if job is None:
+            raise JobError(f"找不到任務 {job_id}", 404)
+        if job_id == self.active and self.progress is not None:
+            job["progress"] = self.progress
+        return job
+
+    def log(self, job_id: int, since: int = 0) -> Dict:
+        self.job(job_id)
+        log = self._logs.get(job_id)
+        return log.since(since) if log is not None else {"lines": [], "next": 0}
+
+    def pause(self, job_id: int) -> Dict:
+        with self._lock:
+            job = self.job(job_id)
+            if job["state"] == "running" and job_id == self.active:
+                self.control.pause()
+            elif job["state"] != "queued":
+                raise JobError(f"任務 {job_id} 目前為 {job['state']}，無法暫停", 409)
+            self.store.update(job_id, state="paused")
+        return self.job(job_id)
+
+    def resume(self, job_id: int) -> Dict:
+        with self._lock:
+            job = self.job(job_id)
+            if job["state"] != "paused":
+                raise JobError(f"任務 {job_id} 目前為 {job['state']}，無法繼續", 409)
+            if job_id == self.active:
+                self.store.update(job_id, state="running")
+                self.control.resume()
+            else:
+                self.store.update(job_id, state="queued")
+                self._wake.set()
+        return self.job(job_id)
+
+    def cancel(self, job_id: int) -> Dict:
+        with self._lock:
+            job = self.job(job_id)
+            if job["state"] in FINISHED_STATES:
+                raise JobError(f"任務 {job_id} 已結束（{job['state']}）", 409)
+            if job_id == self.active:
+                # 工作線程在下一個安全點結束任務並更新狀態
+                self.control.cancel()
+            else:
+                self.store.update(job_id, state="cancelled", finished=datetime.now().isoformat())
+        return self.job(job_id)
+
+    def set_schedule(self, job_id: int, data: Dict) -> Dict:
+        with self._lock:
+            job = self.job(job_id)
+            if job["state"] in FINISHED_STATES:
+                raise JobError(f"任務 {job_id} 已結束（{job['state']}）", 409)
+            options = dict(job["options"])
+            for name in ("schedule", "priorities"):
+                if data.get(name) is not None:
+                    options[name] = data[name]
+            try:
+                if job_id == self.active:
+                    self.engine.set_schedule(data.get("schedule"), data.get("priorities"))
+                else:
+                    from work_scheduler import policy_names
+                    if options.get("schedule") not in (None, *policy_names()):
+                        raise ValueError(f"未知的排程策略：{options['schedule']}")
+            except ValueError as e:
+                raise JobError(str(e))
+            self.store.update(job_id, options=options)
+        return self.job(job_id)
+
+    # ------------------------------------------------------------------
+    # 工作線程
+    # ------------------------------------------------------------------
+
+    def _work(self):
+        # 引擎在工作線程建立和關閉（日誌和命名配置的 SQLite 連線只能在同一個線程使用）
+        try:
+            self.engine = self.engine_factory(on_log=self._on_log)
+        except Exception as e:
+            self._startup_error = e
+            self._ready.set()
+            return
+        self.engine.progress_lines = False
+        self.base_session = self.engine.session_dir
+        self.engine.event_sinks.append(CallbackEventSink(self._on_event))
+        self._ready.set()
+        try:
+            while not self._stopped.is_set():
+                job = self.store.next_queued()
+                if job is None:
+                    self._wake.wait(5.0)
+                    self._wake.clear()
+                    continue
+                self._run_job(job)
+        finally:
+            self.engine.close()
+
+    def _run_job(self, job: Dict):
+        job_id = job["id"]
+        options = job["options"]
+        engine = self.engine
+        with self._lock:
+            # 取出後到開始前被暫停或取消的任務留在原狀態
+            if self.store.get(job_id)["state"] != "queued":
+                return
+            self._logs[job_id] = _JobLog()
+            self.active = job_id
+            self.control = engine.control = RunControl()
+            self.progress = None
+            self.store.update(job_id, state="running", started=datetime.now().isoformat())
+        for finished in [j for j in list(self._logs) if j != job_id][:-FINISHED_LOGS]:
+            self._logs.pop(finished, None)
+
+        state, report, error = "done", None, None
+        try:
+            # 每個目標目錄使用自己的 session 命名空間，不同目錄的任務不會互相覆蓋分析結果和報告
+            engine.set_target_dir(job["target_dir"],
+                                  session_dir=root_session_dir(self.base_session, Path(job["target_dir"])))
+            engine.force_rename = bool(options.get("force_rename", False))
+            engine.delete_original = bool(options.get("delete_original", False))
+            engine.limit = options.get("limit")
+            engine.set_schedule(options.get("schedule", "path"), options.get("priorities", []))
+            engine.log(f"📥 任務 {job_id}：{job['target_dir']}")
+            report = engine.run()
+        except RunCancelled:
+            state = "cancelled"
+            engine.log(f"⏹️  任務 {job_id} 已取消")
+        except Exception as e:
+            state, error = "failed", str(e)
+            engine.log(f"❌ 任務 {job_id} 執行出錯：{e}")
+        finally:
+            with self._lock:
+                self.store.update(job_id, state=state, finished=datetime.now().isoformat(),
+                                  report=report, error=error)
+                self.active = None
+                self.control = None
+
+    # ------------------------------------------------------------------
+    # 啟動 / 停止
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """
+        啟動 HTTP 端點和工作線程（建立引擎）
+
+        Raises:
+            OSError: 埠號已被使用
+            Exception: 建立引擎時的錯誤
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status: int, payload: Dict):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _route(self, method: str):
+                path, _, query = self.path.partition("?")
+                parts = [p for p in path.split("/") if p]
+                try:
+                    data = {}
+                    if method == "POST":
+                        length = int(self.headers.get("Content-Length") or 0)
+                        if length:
+                            data = json.loads(self.rfile.read(length).decode("utf-8"))
+                    if parts == ["health"] and method == "GET":
+                        return self._send(200, {"ok": True, "active": server.active})
+                    if parts == ["jobs"]:
+                        if method == "GET":
+                            return self._send(200, {"jobs": server.jobs()})
+                        return self._send(201, server.submit(data))
+                    if len(parts) >= 2 and parts[0] == "jobs" and parts[1].isdigit():
+                        job_id = int(parts[1])
+                        action = parts[2] if len(parts) == 3 else None
+                        if method == "GET" and action is None:
+                            return self._send(200, server.job(job_id))
+                        if method == "GET" and action == "log":
+                            since = dict(p.partition("=")[::2] for p in query.split("&") if p).get("since")
+                            return self._send(200, server.log(job_id, int(since or 0)))
+                        if method == "POST" and action in ("pause", "resume", "cancel"):
+                            return self._send(200, getattr(server, action)(job_id))
+                        if method == "POST" and action == "schedule":
+                            return self._send(200, server.set_schedule(job_id, data))
+                    self._send(404, {"error": f"未知的路徑：{method} {path}"})
+                except JobError as e:
+                    self._send(e.status, {"error": str(e)})
+                except (ValueError, TypeError) as e:
+                    self._send(400, {"error": f"無效的請求：{e}"})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        http_server = ThreadingHTTPServer((self.host, self.port), Handler)
+        http_server.daemon_threads = True
+        # 埠號綁定成功後才重新排隊（同一個佇列不會有另一個伺服器正在執行）
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            print(f"🔁 重新排隊上次中斷的任務：{requeued} 個")
+        self._worker = threading.Thread(target=self._work, name="job-server-worker", daemon=True)
+        self._worker.start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            http_server.server_close()
+            self._worker.join()
+            self._worker = None
+            raise self._startup_error
+        self._server = http_server
+        threading.Thread(target=self._server.serve_forever, name="job-server-http", daemon=True).start()
+
+    def close(self):
+        """停止接受請求；執行中的任務在下一個安全點取消（重啟後重新排隊）"""
+        self._stopped.set()
+        self._wake.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._lock:
+            interrupted = self.active
+            if self.control is not None:
+                # 伺服器停止時不等待進行中的請求（分析進度已保存，重新排隊後從中斷處繼續）
+                self.control.cancel(abandon=True)
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+        if interrupted is not None and self.store.get(interrupted)["state"] == "cancelled":
+            # 因伺服器停止而中斷的任務下次啟動時繼續
+            self.store.update(interrupted, state="queued", started=None, finished=None)
+        self.store.close()
+
+
+class JobClient:
+    """任務伺服器的呼叫端（只用標準庫）"""
+
+    def __init__(self, url: str = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout: float = 10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "JobClient":
+        section = config.get("job_server", {}) or {}
+        return cls(f"http://{section.get('host', DEFAULT_HOST)}:{section.get('port', DEFAULT_PORT)}")
+
+    def _request(self, method: str, path: str, payload: Optional[Dict] = None,
+                 timeout: Optional[float] = None) -> Dict:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        req = urlrequest.Request(self.url + path, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+        try:
+            with urlrequest.urlopen(req, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urlerror.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode("utf-8")).get("error", str(e))
+            except ValueError:
+                message = str(e)
+            raise JobError(message, e.code)
+
+    def available(self, timeout: float = 0.5) -> bool:
+        """伺服器是否在執行"""
+        try:
+            return bool(self._request("GET", "/health", timeout=timeout).get("ok"))
+        except (OSError, ValueError, JobError):
+            return False
+
+    def submit(self, target_dir, client: Optional[str] = None, **options) -> Dict:
+        payload = {"target_dir": str(Path(target_dir).expanduser().resolve()), "client": client}
+        payload.update(options)
+        return self._request("POST", "/jobs", payload)
+
+    def jobs(self) -> List[Dict]:
+        return self._request("GET", "/jobs")["jobs"]
+
+    def job(self, job_id: int) -> Dict:
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def log(self, job_id: int, since: int = 0) -> Dict:
+        return self._request("GET", f"/jobs/{job_id}/log?since={since}")
+
+    def pause(self, job_id: int) -> Dict:
+        return self._request("POST", f"/jobs/{job_id}/pause")
+
+    def resume(self, job_id: int) -> Dict:
+        return self._request("POST", f"/jobs/{job_id}/resume")
+
+    def cancel(self, job_id: int) -> Dict:
+        return self._request("POST", f"/jobs/{job_id}/cancel")
+
+    def set_schedule(self, job_id: int, schedule: Optional[str] = None,
+                     priorities: Optional[List[str]] = None) -> Dict:
+        return self._request("POST", f"/jobs/{job_id}/schedule",
+                             {"schedule": schedule, "priorities": priorities})
+
+    def follow(self, job_id: int, on_line: Callable[[str], None], interval: float = 0.5,
+               on_job: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """輪詢日誌和狀態直到任務結束，返回最終的任務"""
+        since = 0
+        while True:
+            job = self.job(job_id)
+            chunk = self.log(job_id, since)
+            for line in chunk["lines"]:
+                on_line(line)
+            since = chunk["next"]
+            if on_job is not None:
+                on_job(job)
+            if job["state"] in FINISHED_STATES:
+                return job
+            time.sleep(interval)
+
+
+def format_job(job: Dict) -> str:
+    """一行的任務摘要"""
+    progress = job.get("progress")
+    detail = ""
+    if progress:
+        detail = f" | {progress['stage']} {progress['processed']}/{progress['total']}"
+    elif job.get("report"):
+        detail = f" | 分析 {job['report'].get('analyzed', 0)}，重命名 {job['report'].get('renamed', 0)}"
+    elif job.get("error"):
+        detail = f" | {job['error'][:60]}"
+    return f"#{job['id']:<4} {job['state']:<9} {job['target_dir']}{detail}"
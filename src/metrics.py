@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+即時指標 - 長時間執行的任務以 Prometheus 格式公開計數器和直方圖
+
+功能：
+- Counter / Gauge / Histogram：可帶標籤的指標，輸出 Prometheus 文字格式（0.0.4）
+- EngineMetrics：引擎用到的全部指標
+  - 每項完成數（依階段和結果：success / error / cached）和單項耗時直方圖
+  - 模型請求：進行中數量、耗時直方圖、送出位元組、重試、錯誤
+  - 依 ProgressTracker 即時計算：各階段吞吐量（張/秒）和待處理佇列深度
+- MetricsEventSink：接收 ProgressEvent 更新每項完成的指標（見 progress_events.py）
+- 輸出方式（可同時啟用）：
+  - serve(port)：本機 HTTP 端點 GET /metrics
+  - write_textfile(path)：定期寫入 node_exporter textfile collector 使用的 .prom 檔案
+
+使用方式：
+    image-rename run --target-dir ~/Downloads --metrics-port 9464
+    curl http://127.0.0.1:9464/metrics
+
+設計原理：
+- 未啟用時引擎不建立任何指標，也不增加事件輸出槽
+- 指標只在主線程更新，HTTP / 檔案輸出線程只讀取，不需要鎖住更新路徑
+- textfile 以暫存檔 + os.replace 原子替換，collector 不會讀到寫到一半的內容
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 指標名稱前綴
+PREFIX = "image_rename_"
+# 單項耗時的直方圖上界（秒）
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# textfile 的默認寫入間隔（秒）
+TEXTFILE_INTERVAL = 5.0
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """指標家族（同名稱、不同標籤值的一組數值）"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """取得指定標籤值的子指標（第一次使用時建立）"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """只增不減的計數器"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterator[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    """可增可減的數值；提供 function 時在輸出時才計算"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        """
+        Args:
+            function: 返回 {標籤值: 數值} 的函式（例如依目前進度計算的佇列深度）
+        """
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def samples(self) -> Iterator[str]:
+        if self.function is None:
+            yield from super().samples()
+            return
+        for values, value in self.function().items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """累積直方圖（_bucket / _sum / _count）"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> Iterator[str]:
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(child.bounds, child.counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            le = _format_labels(self.labelnames, values, 'le="+Inf"')
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_bucket{le} {child.count}"
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class EngineMetrics:
+    """RenameEngine 的指標集合和輸出方式"""
+
+    def __init__(self):
+        self.items = Counter("items_total", "完成的項目數（依階段和結果）", ("stage", "result"))
+        self.item_seconds = Histogram("item_seconds", "單項處理耗時（秒）", ("stage",))
+        self.requests_in_flight = Gauge("requests_in_flight", "進行中的模型請求數")
+        self.request_seconds = Histogram("request_seconds", "模型請求耗時（秒，含等待生成）")
+        self.request_bytes = Counter("request_bytes_total", "送出的請求本文位元組數")
+        self.request_retries = Counter("request_retries_total", "模型請求重試次數")
+        self.request_errors = Counter("request_errors_total", "模型請求失敗次數（依例外類型）", ("error",))
+        self.errors = Counter("errors_total", "處理錯誤數（依階段）", ("stage",))
+        self.items_per_second = Gauge(
+            "items_per_second", "目前階段的吞吐量（EWMA，張/秒）", ("stage",), function=self._rates)
+        self.queue_depth = Gauge(
+            "queue_depth", "目前階段尚待處理的項目數", ("stage",), function=self._queue_depth)
+        self.metrics: List[_Metric] = [
+            self.items, self.item_seconds, self.requests_in_flight, self.request_seconds,
+            self.request_bytes, self.request_retries, self.request_errors, self.errors,
+            self.items_per_second, self.queue_depth,
+        ]
+        self.requests_in_flight.set(0)
+        self.engine = None
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._textfile: Optional["_TextfileWriter"] = None
+
+    def bind(self, engine):
+        """綁定引擎（即時指標從 engine.progress 讀取，切換目標目錄後仍有效）"""
+        self.engine = engine
+
+    def _current_stage(self) -> Optional[str]:
+        progress = self.engine.progress if self.engine is not None else None
+        if progress is None or progress.estimator is None:
+            return None
+        return {"analyzing": "analysis", "renaming": "rename"}.get(progress.phase)
+
+    def _rates(self) -> Dict[Tuple[str, ...], float]:
+        stage = self._current_stage()
+        if stage is None:
+            return {}
+        return {(stage,): round(self.engine.progress.estimator.items_per_second(), 3)}
+
+    def _queue_depth(self) -> Dict[Tuple[str, ...], float]:
+        stage = self._current_stage()
+        if stage is None:
+            return {}
+        progress = self.engine.progress
+        return {(stage,): max(0, progress.stage_total - progress.processed_files)}
+
+    def event_sink(self) -> "MetricsEventSink":
+        return MetricsEventSink(self)
+
+    def render(self) -> str:
+        """Prometheus 文字格式"""
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """在背景線程啟動 HTTP 端點（GET /metrics）"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def write_textfile(self, path: Path, interval: float = TEXTFILE_INTERVAL):
+        """每 interval 秒把指標寫入 textfile（關閉時再寫一次）"""
+        self._textfile = _TextfileWriter(self, Path(path).expanduser(), interval)
+
+    def close(self):
+        """停止 HTTP 端點，寫出最後一次 textfile"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._textfile is not None:
+            self._textfile.close()
+            self._textfile = None
+
+
+class MetricsEventSink:
+    """把 ProgressEvent 轉為指標更新的事件輸出槽"""
+
+    def __init__(self, metrics: EngineMetrics):
+        self.metrics = metrics
+        self.closed = False
+
+    def send(self, event):
+        if event.type == "item":
+            if event.cached:
+                result = "cached"
+            else:
+                result = "success" if event.ok else "error"
+                self.metrics.item_seconds.labels(event.stage).observe(event.latency or 0.0)
+            self.metrics.items.labels(event.stage, result).inc()
+        elif event.type == "error":
+            self.metrics.errors.labels(event.stage).inc()
+
+    def close(self):
+        self.closed = True
+
+
+class _TextfileWriter:
+    """定期寫入 .prom 檔案的背景線程"""
+
+    def __init__(self, metrics: EngineMetrics, path: Path, interval: float):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-textfile", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        tmp = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.metrics.render())
+        os.replace(tmp, self.path)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+效能剖析模式 - 取樣式 CPU 剖析和 tracemalloc 記憶體配置統計
+
+功能：
+- SamplingProfiler：定時取樣呼叫堆疊，依階段（掃描 / 分析 / 規劃 / 重命名）分開統計
+  - Unix 主線程：setitimer(ITIMER_PROF) 依 CPU 時間取樣，等待網路的時間不計入
+  - 其他情況（Windows、在背景線程建立引擎的 GUI）：背景線程依牆鐘時間取樣
+- ProfileSession：同時啟用取樣和 tracemalloc，結束時寫出報告到 session 目錄
+  - profile_cpu.txt：各階段的函式排行（自身 / 累計取樣數）
+  - profile_stacks.collapsed：火焰圖格式（flamegraph.pl、speedscope 可直接開啟），
+    第一層為階段名稱
+  - profile_memory.txt：記憶體峰值（整體和各階段），以及峰值附近和結束時的前幾名配置位置
+
+使用方式：
+    image-rename run --target-dir ~/Downloads --profile
+
+設計原理：
+- 不需安裝外部剖析工具，標準庫即可在實際圖庫上重現
+- 取樣只記錄堆疊，報告在結束時才整理，取樣成本固定
+- 階段由呼叫端提供的函式判斷（引擎使用 ProgressTracker 的 phase）
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 默認取樣間隔（秒）
+SAMPLE_INTERVAL = 0.005
+# tracemalloc 保存的堆疊深度
+TRACEMALLOC_FRAMES = 10
+# 報告中列出的項目數
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 30
+# 記憶體成長超過此比例時重新拍攝峰值快照（最多每秒一次）
+PEAK_SNAPSHOT_GROWTH = 1.1
+
+# ProgressTracker.phase → 階段名稱
+PHASE_STAGES = {
+    "initializing": "setup",
+    "scanning": "scan",
+    "scanned": "scan",
+    "analyzing": "analysis",
+    "analyzed": "plan",
+    "renaming": "rename",
+    "completed": "report",
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """依階段統計的取樣式剖析器"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL,
+                 stage_fn: Optional[Callable[[], str]] = None):
+        """
+        Args:
+            interval: 取樣間隔（秒）
+            stage_fn: 返回目前階段名稱的函式
+        """
+        self.interval = interval
+        self.stage_fn = stage_fn or (lambda: "all")
+        self.stacks: Dict[Tuple[str, Tuple[str, ...]], int] = defaultdict(int)
+        self.memory_peaks: Dict[str, int] = defaultdict(int)
+        self.peak_snapshot = None
+        self.peak_snapshot_stage = None
+        self._snapshot_size = 0
+        self._snapshot_time = 0.0
+        self.samples = 0
+        self.mode = None
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._previous_handler = None
+        self._busy = False
+
+    def start(self):
+        """開始取樣（在要剖析的線程中呼叫）"""
+        self._thread_id = threading.get_ident()
+        if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            self.mode = "cpu"
+            self._previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.mode = "wall"
+            self._sampler = threading.Thread(target=self._run_sampler, name="profiler", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        """停止取樣"""
+        if self.mode == "cpu":
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        elif self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def _on_signal(self, signum, frame):
+        # 處理取樣本身（例如拍攝快照）時到達的訊號不計入
+        if self._busy:
+            return
+        self._busy = True
+        try:
+            self._record(frame)
+        finally:
+            self._busy = False
+
+    def _run_sampler(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def _record(self, frame):
+        try:
+            stage = self.stage_fn()
+        except Exception:
+            stage = "unknown"
+        stack: List[str] = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[(stage, tuple(stack))] += 1
+        self.samples += 1
+        if tracemalloc.is_tracing():
+            current = tracemalloc.get_traced_memory()[0]
+            if current > self.memory_peaks[stage]:
+                self.memory_peaks[stage] = current
+            now = time.monotonic()
+            if current > self._snapshot_size * PEAK_SNAPSHOT_GROWTH and now - self._snapshot_time >= 1.0:
+                # 暫時的大型配置（例如 base64 字串）在結束時已釋放，只有峰值快照看得到
+                self.peak_snapshot = tracemalloc.take_snapshot()
+                self.peak_snapshot_stage = stage
+                self._snapshot_size = current
+                self._snapshot_time = now
+
+    def write_collapsed(self, path: Path):
+        """寫出火焰圖格式（每行：階段;外層;...;內層 取樣數）"""
+        with open(path, "w", encoding="utf-8") as f:
+            for (stage, stack), count in sorted(self.stacks.items()):
+                f.write(";".join((stage,) + stack) + f" {count}\n")
+
+    def write_report(self, path: Path):
+        """寫出各階段的函式排行"""
+        by_stage: Dict[str, Dict[Tuple[str, ...], int]] = defaultdict(dict)
+        for (stage, stack), count in self.stacks.items():
+            by_stage[stage][stack] = count
+
+        seconds_per_sample = self.interval
+        with open(path, "w", encoding="utf-8") as f:
+            clock = "CPU 時間" if self.mode == "cpu" else "牆鐘時間"
+            f.write(f"# 取樣式剖析（{clock}，每 {self.interval * 1000:.0f} 毫秒一次，共 {self.samples} 個取樣）\n")
+            for stage, stacks in sorted(by_stage.items(), key=lambda kv: -sum(kv[1].values())):
+                total = sum(stacks.values())
+                own: Dict[str, int] = defaultdict(int)
+                cumulative: Dict[str, int] = defaultdict(int)
+                for stack, count in stacks.items():
+                    own[stack[-1]] += count
+                    for label in set(stack):
+                        cumulative[label] += count
+
+                f.write(f"\n== {stage}：{total} 個取樣（約 {total * seconds_per_sample:.2f} 秒）==\n")
+                f.write(f"\n{'自身':>8} {'累計':>8}  函式\n")
+                for label, count in sorted(own.items(), key=lambda kv: -kv[1])[:TOP_FUNCTIONS]:
+                    f.write(f"{count * 100 / total:7.1f}% {cumulative[label] * 100 / total:7.1f}%  {label}\n")
+
+
+class ProfileSession:
+    """一次剖析（CPU 取樣 + tracemalloc），結束時寫出報告"""
+
+    def __init__(self, output_dir: Path, stage_fn: Optional[Callable[[], str]] = None,
+                 interval: float = SAMPLE_INTERVAL):
+        """
+        Args:
+            output_dir: 報告輸出目錄（session 目錄）
+            stage_fn: 返回目前階段名稱的函式
+            interval: 取樣間隔（秒）
+        """
+        self.output_dir = Path(output_dir)
+        self.profiler = SamplingProfiler(interval, stage_fn)
+        self.started = None
+        self._owns_tracemalloc = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._owns_tracemalloc = True
+        self.started = time.perf_counter()
+        self.profiler.start()
+
+    def stop(self) -> List[Path]:
+        """停止剖析並寫出報告，返回輸出檔案列表"""
+        self.profiler.stop()
+        elapsed = time.perf_counter() - self.started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        cpu_path = self.output_dir / "profile_cpu.txt"
+        stacks_path = self.output_dir / "profile_stacks.collapsed"
+        memory_path = self.output_dir / "profile_memory.txt"
+        self.profiler.write_report(cpu_path)
+        self.profiler.write_collapsed(stacks_path)
+        self._write_memory(memory_path, snapshot, current, peak, elapsed)
+        return [cpu_path, stacks_path, memory_path]
+
+    def _write_memory(self, path: Path, snapshot, current: int, peak: int, elapsed: float):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# tracemalloc（執行 {elapsed:.1f} 秒）\n")
+            f.write(f"峰值：{peak / 1024 / 1024:.2f} MB\n")
+            f.write(f"結束時：{current / 1024 / 1024:.2f} MB\n")
+            if self.profiler.memory_peaks:
+                f.write("\n== 各階段峰值（取樣時觀察到的最大值）==\n")
+                for stage, size in sorted(self.profiler.memory_peaks.items(), key=lambda kv: -kv[1]):
+                    f.write(f"{size / 1024 / 1024:10.2f} MB  {stage}\n")
+            profiler = self.profiler
+            if profiler.peak_snapshot is not None:
+                f.write(f"\n== 峰值附近的前 {TOP_ALLOCATIONS} 個配置位置"
+                        f"（{profiler.peak_snapshot_stage}，{profiler._snapshot_size / 1024 / 1024:.2f} MB）==\n")
+                _write_top_allocations(f, profiler.peak_snapshot)
+            f.write(f"\n== 結束時仍保留的前 {TOP_ALLOCATIONS} 個配置位置 ==\n")
+            _write_top_allocations(f, snapshot)
+
+
+def _write_top_allocations(f, snapshot):
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        f.write(f"{stat.size / 1024:10.1f} KB {stat.count:8d} 個  {frame.filename}:{frame.lineno}\n")
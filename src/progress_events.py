@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+結構化進度事件 - ProgressTracker 的可插拔事件通道
+
+功能：
+- ProgressEvent：型別化的進度事件（階段、計數、單項耗時、ETA、錯誤）
+- 事件輸出槽：
+  - CallbackEventSink：同行程回呼（GUI）
+  - JsonLinesEventSink：JSON Lines 寫入檔案描述符、具名管道（FIFO）或檔案
+  - UnixSocketEventSink：連線到 Unix socket，逐行送出 JSON
+- open_event_sink()：依命令行的規格字串建立輸出槽
+
+事件類型（type 欄位）：
+    stage_start     階段開始（total）
+    item            單項完成（name、ok、latency、cached、processed、total、
+                    eta_seconds / eta_low / eta_high、error）
+    progress        批次進度（processed、total、eta_seconds / eta_low / eta_high、batch）
+    stage_complete  階段完成（successful、failed、elapsed）
+    error           錯誤（message、name）
+    tier_change     期限模式切換品質等級（tier：新等級、message：原因、processed、total）
+    paused          任務暫停（processed、total；進度已保存）
+    resumed         任務繼續（processed、total、elapsed：暫停的秒數）
+    cancelled       任務取消（processed、total；進度已保存，下次執行時從此處繼續）
+
+設計原理：
+- 訂閱端不必解析人類可讀的文字輸出
+- 沒有輸出槽時不建立事件物件，追蹤成本為零
+- 輸出槽寫入失敗（讀取端關閉）時自動停用，不中斷處理流程
+"""
+
+import json
+import os
+import socket
+import time
+from typing import Callable, Dict
+
+
+class ProgressEvent:
+    """進度事件"""
+
+    __slots__ = (
+        "type", "stage", "timestamp", "processed", "total", "successful", "failed",
+        "name", "ok", "latency", "cached", "eta_seconds", "eta_low", "eta_high",
+        "elapsed", "batch", "error", "message", "tier",
+    )
+
+    def __init__(self, type: str, stage: str, **fields):
+        """
+        Args:
+            type: 事件類型（stage_start / item / progress / stage_complete / error）
+            stage: 階段（scan / analysis / rename）
+            **fields: 其他欄位（見 __slots__），未提供的欄位為 None
+        """
+        self.type = type
+        self.stage = stage
+        self.timestamp = time.time()
+        for field in self.__slots__[3:]:
+            setattr(self, field, fields.get(field))
+
+    def to_dict(self) -> Dict:
+        """轉換為 dict（省略值為 None 的欄位）"""
+        return {
+            field: getattr(self, field)
+            for field in self.__slots__
+            if getattr(self, field) is not None
+        }
+
+    def __repr__(self):
+        return f"ProgressEvent({self.type!r}, {self.stage!r})"
+
+
+class CallbackEventSink:
+    """同行程回呼輸出槽（回呼在發出事件的線程中執行）"""
+
+    def __init__(self, callback: Callable[[ProgressEvent], None]):
+        self.callback = callback
+        self.closed = False
+
+    def send(self, event: ProgressEvent):
+        self.callback(event)
+
+    def close(self):
+        self.closed = True
+
+
+class JsonLinesEventSink:
+    """JSON Lines 輸出槽（每個事件一行，逐行 flush）"""
+
+    def __init__(self, stream, owns_stream: bool = True):
+        """
+        Args:
+            stream: 文字模式的可寫入串流
+            owns_stream: close() 時是否關閉串流
+        """
+        self.stream = stream
+        self.owns_stream = owns_stream
+        self.closed = False
+
+    @classmethod
+    def from_fd(cls, fd: int) -> "JsonLinesEventSink":
+        """寫入已開啟的檔案描述符（例如父行程傳入的管道）"""
+        return cls(os.fdopen(fd, 'w', encoding='utf-8', buffering=1))
+
+    @classmethod
+    def from_path(cls, path: str) -> "JsonLinesEventSink":
+        """寫入檔案或具名管道（FIFO 會等待讀取端開啟）"""
+        return cls(open(path, 'a', encoding='utf-8', buffering=1))
+
+    def send(self, event: ProgressEvent):
+        try:
+            self.stream.write(json.dumps(event.to_dict(), ensure_ascii=False) + '\n')
+            self.stream.flush()
+        except (BrokenPipeError, OSError, ValueError):
+            # 讀取端已關閉：停用輸出槽
+            self.closed = True
+
+    def close(self):
+        if self.owns_stream and not self.closed:
+            try:
+                self.stream.close()
+            except OSError:
+                pass
+        self.closed = True
+
+
+class UnixSocketEventSink:
+    """Unix socket 輸出槽（連線到訂閱端監聽的 socket）"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 訂閱端監聽的 socket 路徑
+        """
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.closed = False
+
+    def send(self, event: ProgressEvent):
+        data = (json.dumps(event.to_dict(), ensure_ascii=False) + '\n').encode('utf-8')
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.sock.close()
+        self.closed = True
+
+
+def open_event_sink(spec: str):
+    """
+    依規格字串建立事件輸出槽
+
+    - "fd:N"：寫入檔案描述符 N（JSON Lines）
+    - "unix:PATH"：連線到 Unix socket
+    - "-"：寫入 stdout（呼叫端須把其他輸出改到 stderr，image-rename --events - 會自動處理）
+    - 其他：視為檔案或具名管道路徑
+
+    Raises:
+        ValueError: 規格格式錯誤
+        OSError: 無法開啟或連線
+    """
+    if spec == "-":
+        import sys
+        return JsonLinesEventSink(sys.stdout, owns_stream=False)
+    if spec.startswith("fd:"):
+        try:
+            fd = int(spec[3:])
+        except ValueError:
+            raise ValueError(f"無效的檔案描述符：{spec}")
+        return JsonLinesEventSink.from_fd(fd)
+    if spec.startswith("unix:"):
+        return UnixSocketEventSink(spec[5:])
+    return JsonLinesEventSink.from_path(spec)
@@ -9,38 +9,228 @@
 - 估計剩餘時間
 - 保存進度以支持恢復
 - 詳細的分階段日誌
+- 結構化進度事件（見 progress_events.py），送到可插拔的輸出槽
+- 背景寫入線程：日誌批次追加，進度快照限頻並以原子方式替換
+- 每個階段獨立的吞吐量估計（rate_estimator.py）：EWMA ETA 和信賴區間、
+  快取命中與實際推論分開計算、單項耗時 p50/p95
 
 設計原理：
 - 最小化記憶體使用（使用文件而不是保存在記憶體）
 - 最小化修改影響（不改變核心邏輯）
 - 支持長時間運行（可靠的進度追蹤）
+- 處理線程不做檔案 I/O：日誌和快照交給 BackgroundWriter，
+  程式結束或收到 SIGTERM 時會先寫完
 """
 
+import atexit
 import json
+import os
+import signal
+import sys
+import threading
+import weakref
 from pathlib import Path
 from typing import Dict, Optional, List
-from datetime import datetime, timedelta
+from datetime import datetime
 import time
 
+from progress_events import ProgressEvent
+from rate_estimator import StageRateEstimator
+
+# 進度快照的最短寫入間隔（秒）；階段開始/完成時一律立即寫入
+SNAPSHOT_INTERVAL = 1.0
+# 背景線程批次寫入日誌的間隔（秒）
+FLUSH_INTERVAL = 0.5
+
+# 尚未關閉的寫入器（結束時逐一 flush）
+_WRITERS = weakref.WeakSet()
+_signal_handler_installed = False
+
+
+def format_time(seconds: float) -> str:
+    """格式化時間（不需要 ProgressTracker，GUI 的遠端模式也使用）"""
+    if seconds < 0:
+        return "計算中..."
+
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+
+    if hours > 0:
+        return f"{hours}時 {minutes}分 {secs}秒"
+    elif minutes > 0:
+        return f"{minutes}分 {secs}秒"
+    else:
+        return f"{secs}秒"
+
+
+def format_eta(eta: float, low: float, high: float) -> str:
+    """格式化 ETA 和信賴區間"""
+    if eta <= 0:
+        return "計算中..."
+    return f"{format_time(eta)}（{format_time(low)}～{format_time(high)}）"
+
+
+class BackgroundWriter:
+    """
+    背景寫入線程
+    
+    - 日誌行先累積在記憶體，每 FLUSH_INTERVAL 秒以一次追加寫入
+    - 快照只保留最新一份，最多每 snapshot_interval 秒寫入一次
+    - 快照先寫入暫存檔再 os.replace，讀取端不會看到寫了一半的 JSON
+    """
+    
+    def __init__(self, log_path: Path, snapshot_path: Path,
+                 snapshot_interval: float = SNAPSHOT_INTERVAL):
+        self.log_path = Path(log_path)
+        self.snapshot_path = Path(snapshot_path)
+        self.snapshot_interval = snapshot_interval
+        
+        self._cond = threading.Condition()
+        self._lines: List[str] = []
+        self._snapshot: Optional[Dict] = None
+        self._force = False
+        self._last_snapshot = 0.0
+        self._requested = 0   # flush 請求序號
+        self._completed = 0   # 已完成的 flush 序號
+        self._closed = False
+        self._log_file = None
+        
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+        _WRITERS.add(self)
+        _install_exit_handlers()
+    
+    def write_line(self, line: str):
+        """加入一行日誌（下次批次寫入時寫出）"""
+        with self._cond:
+            self._lines.append(line)
+    
+    def write_snapshot(self, data: Dict, force: bool = False):
+        """更新待寫入的快照；force 時立即寫入，不受間隔限制"""
+        with self._cond:
+            self._snapshot = data
+            if force:
+                self._force = True
+                self._cond.notify()
+    
+    def flush(self):
+        """寫出所有待寫入的日誌和快照，完成後才返回"""
+        with self._cond:
+            if self._closed:
+                return
+            self._requested += 1
+            target = self._requested
+            self._cond.notify()
+            while self._completed < target and self._thread.is_alive():
+                self._cond.wait(FLUSH_INTERVAL)
+    
+    def close(self):
+        """寫出剩餘內容並停止線程"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        _WRITERS.discard(self)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                if not (self._closed or self._force or self._requested > self._completed):
+                    self._cond.wait(FLUSH_INTERVAL)
+                lines, self._lines = self._lines, []
+                target = self._requested
+                closing = self._closed
+                urgent = self._force or closing or target > self._completed
+                snapshot = None
+                now = time.monotonic()
+                if self._snapshot is not None and (urgent or now - self._last_snapshot >= self.snapshot_interval):
+                    snapshot, self._snapshot = self._snapshot, None
+                    self._last_snapshot = now
+                self._force = False
+            
+            try:
+                if lines:
+                    self._write_lines(lines)
+                if snapshot is not None:
+                    self._write_snapshot(snapshot)
+            except OSError as e:
+                print(f"⚠️  進度檔案寫入失敗：{e}", file=sys.stderr)
+            
+            with self._cond:
+                self._completed = target
+                self._cond.notify_all()
+            if closing:
+                if self._log_file is not None:
+                    self._log_file.close()
+                return
+    
+    def _write_lines(self, lines: List[str]):
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'a', encoding='utf-8')
+        self._log_file.write('\n'.join(lines) + '\n')
+        self._log_file.flush()
+    
+    def _write_snapshot(self, data: Dict):
+        temp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.snapshot_path)
+
+
+def _close_all_writers():
+    """結束前寫完所有寫入器"""
+    for writer in list(_WRITERS):
+        writer.close()
+
+
+def _handle_sigterm(signum, frame):
+    """SIGTERM：先寫完進度檔案，再以預設行為結束"""
+    _close_all_writers()
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+def _install_exit_handlers():
+    """註冊 atexit，並在主線程且未自訂 SIGTERM 處理時接管 SIGTERM（只執行一次）"""
+    global _signal_handler_installed
+    if _signal_handler_installed:
+        return
+    _signal_handler_installed = True
+    atexit.register(_close_all_writers)
+    if threading.current_thread() is threading.main_thread() \
+            and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _handle_sigterm)
+
 
 class ProgressTracker:
     """進度追蹤器"""
     
-    def __init__(self, session_dir: Path, operation_name: str = "rename"):
+    def __init__(self, session_dir: Path, operation_name: str = "rename",
+                 sinks: Optional[List] = None, console: bool = True,
+                 snapshot_interval: float = SNAPSHOT_INTERVAL):
         """
         初始化進度追蹤器
         
         Args:
             session_dir: session 目錄（用於保存進度文件）
             operation_name: 操作名稱（用於區分不同操作的進度文件）
+            sinks: 進度事件輸出槽（見 progress_events.py）
+            console: 是否同時把日誌輸出到終端
+            snapshot_interval: 進度快照的最短寫入間隔（秒）
         """
         self.session_dir = Path(session_dir)
         self.operation_name = operation_name
+        self.sinks = list(sinks or [])
+        self.console = console
         self.session_dir.mkdir(parents=True, exist_ok=True)
         
         # 進度文件
         self.progress_file = self.session_dir / f"progress_{operation_name}.json"
         self.log_file = self.session_dir / f"progress_log_{operation_name}.txt"
+        self._writer = BackgroundWriter(self.log_file, self.progress_file, snapshot_interval)
         
         # 統計數據
         self.start_time = time.time()
@@ -50,11 +240,20 @@ class ProgressTracker:
         self.successful_files = 0
         self.failed_files = 0
         
+        # 目前階段的總數和吞吐量估計（分析、重命名各自重新開始）
+        self.stage_total = 0
+        self.stage_resumed = 0
+        self.estimator: Optional[StageRateEstimator] = None
+        
         # 分階段統計
         self.scan_complete = False
         self.analysis_complete = False
         self.rename_complete = False
         
+        # 執行狀態（running / paused / cancelled），暫停開始的時間
+        self.run_state = "running"
+        self._paused_at: Optional[float] = None
+        
     def _load_progress(self) -> Optional[Dict]:
         """從文件加載進度"""
         if self.progress_file.exists():
@@ -65,8 +264,8 @@ class ProgressTracker:
                 return None
         return None
     
-    def _save_progress(self):
-        """保存進度到文件"""
+    def _save_progress(self, force: bool = False):
+        """保存進度到文件（交給背景線程；force 時不受寫入間隔限制）"""
         progress_data = {
             "timestamp": datetime.now().isoformat(),
             "phase": self.phase,
@@ -77,51 +276,124 @@ class ProgressTracker:
             "progress_percent": self.get_progress_percent(),
             "elapsed_time": time.time() - self.start_time,
             "eta_seconds": self.get_eta_seconds(),
+            "stage_total": self.stage_total,
+            "stage_rate": self.get_rate_summary(),
             "scan_complete": self.scan_complete,
             "analysis_complete": self.analysis_complete,
             "rename_complete": self.rename_complete,
+            "run_state": self.run_state,
         }
         
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(progress_data, f, ensure_ascii=False, indent=2)
+        self._writer.write_snapshot(progress_data, force)
+    
+    def flush(self):
+        """寫出所有待寫入的日誌和快照"""
+        self._writer.flush()
+    
+    def close(self):
+        """寫完並停止背景寫入線程"""
+        self._writer.close()
+    
+    def add_sink(self, sink):
+        """加入進度事件輸出槽"""
+        self.sinks.append(sink)
+    
+    def emit(self, event_type: str, stage: str, **fields):
+        """發出進度事件（沒有輸出槽時不建立事件）"""
+        if not self.sinks:
+            return
+        event = ProgressEvent(event_type, stage, **fields)
+        for sink in self.sinks:
+            if not sink.closed:
+                sink.send(event)
+        self.sinks = [sink for sink in self.sinks if not sink.closed]
     
     def start_scan(self, total_files: int):
         """開始掃描階段"""
         self.phase = "scanning"
+        self.run_state = "running"
         self.total_files = total_files
         self.processed_files = 0
         self.log(f"📂 開始掃描文件... (總計 {total_files} 個)")
-        self._save_progress()
+        self._save_progress(force=True)
+        self.emit("stage_start", "scan", total=total_files)
     
     def complete_scan(self):
         """完成掃描階段"""
         self.phase = "scanned"
         self.scan_complete = True
         self.log(f"✅ 掃描完成")
-        self._save_progress()
+        self._save_progress(force=True)
+        self.emit("stage_complete", "scan", total=self.total_files,
+                  elapsed=time.time() - self.start_time)
+    
+    def _start_stage(self, total: int, already_done: int = 0):
+        """新階段：重設計數和吞吐量估計"""
+        self.stage_total = total
+        self.stage_resumed = already_done
+        self.processed_files = already_done
+        self.estimator = StageRateEstimator()
     
-    def start_analysis(self):
-        """開始分析階段"""
+    def start_analysis(self, total: Optional[int] = None, already_done: int = 0):
+        """
+        開始分析階段
+        
+        Args:
+            total: 本階段總數（默認：掃描總數）
+            already_done: 已從先前結果載入的數量（計入進度，不計入速率）
+        """
         self.phase = "analyzing"
-        self.processed_files = 0
-        self.log(f"🤖 開始 LLM 分析 {self.total_files} 張圖片...")
-        self._save_progress()
+        self._start_stage(self.total_files if total is None else total, already_done)
+        self.log(f"🤖 開始 LLM 分析 {self.stage_total} 張圖片...")
+        self._save_progress(force=True)
+        self.emit("stage_start", "analysis", total=self.stage_total)
+    
+    def item_done(self, stage: str, name: str, ok: bool, latency: float,
+                  processed: Optional[int] = None, total: Optional[int] = None,
+                  error: Optional[str] = None, cached: bool = False):
+        """
+        單項完成（更新吞吐量估計並發出事件，不寫日誌和快照）
+        
+        Args:
+            stage: "analysis" 或 "rename"
+            name: 檔案相對路徑
+            ok: 是否成功
+            latency: 該項耗時（秒）
+            processed: 本階段已完成數（提供時更新進度）
+            total: 本階段總數（提供時更新；默認沿用階段開始時的總數）
+            error: 錯誤訊息
+            cached: 是否為快取命中（沿用先前的結果，未實際推論）
+        """
+        if processed is not None:
+            self.processed_files = processed
+        if total is not None:
+            self.stage_total = total
+        if self.estimator is not None:
+            self.estimator.record(latency, cached)
+        if not self.sinks:
+            return
+        eta, eta_low, eta_high = self.get_eta_band()
+        self.emit(
+            "item", stage, name=name, ok=ok, latency=latency, cached=cached,
+            processed=self.processed_files, total=self.stage_total,
+            eta_seconds=eta, eta_low=eta_low, eta_high=eta_high, error=error
+        )
     
     def update_analysis(self, batch_num: int, batch_size: int, processed: int):
         """更新分析進度"""
         self.phase = "analyzing"
         self.processed_files = processed
         progress = self.get_progress_percent()
-        eta = self.get_eta_seconds()
-        
-        eta_str = self._format_time(eta) if eta > 0 else "計算中..."
+        eta, eta_low, eta_high = self.get_eta_band()
         
         self.log(
             f"  📦 Batch {batch_num:3d} | 進度 {progress:3d}% | "
-            f"已處理 {processed:4d}/{self.total_files} | "
-            f"ETA: {eta_str}"
+            f"已處理 {processed:4d}/{self.stage_total} | "
+            f"ETA: {self.format_eta(eta, eta_low, eta_high)}"
         )
         self._save_progress()
+        self.emit("progress", "analysis", batch=batch_num, processed=processed,
+                  total=self.stage_total, eta_seconds=eta, eta_low=eta_low, eta_high=eta_high)
     
     def complete_analysis(self, successful: int, failed: int):
         """完成分析階段"""
@@ -132,14 +404,22 @@ class ProgressTracker:
         self.log(
             f"✅ 分析完成：成功 {successful}/{self.total_files}，失敗 {failed}"
         )
-        self._save_progress()
+        self._save_progress(force=True)
+        self.emit("stage_complete", "analysis", successful=successful, failed=failed,
+                  total=self.total_files, elapsed=time.time() - self.start_time)
     
-    def start_rename(self):
-        """開始重命名階段"""
+    def start_rename(self, total: Optional[int] = None):
+        """
+        開始重命名階段
+        
+        Args:
+            total: 計畫項目數（默認：分析成功數）
+        """
         self.phase = "renaming"
-        self.processed_files = 0
-        self.log(f"🔄 開始重命名 {self.successful_files} 個文件...")
-        self._save_progress()
+        self._start_stage(self.successful_files if total is None else total)
+        self.log(f"🔄 開始重命名 {self.stage_total} 個文件...")
+        self._save_progress(force=True)
+        self.emit("stage_start", "rename", total=self.stage_total)
     
     def update_rename(self, processed: int):
         """更新重命名進度"""
@@ -147,18 +427,19 @@ class ProgressTracker:
         self.processed_files = processed
         
         # 計算進度（相對於需要重命名的文件數）
-        rename_total = self.successful_files
+        rename_total = self.stage_total
+        eta, eta_low, eta_high = self.get_eta_band()
         if rename_total > 0:
             progress = int(processed * 100 / rename_total)
-            eta = self.get_eta_seconds()
-            eta_str = self._format_time(eta) if eta > 0 else "計算中..."
             
             self.log(
                 f"  📝 重命名進度 {progress:3d}% | "
                 f"已重命名 {processed:4d}/{rename_total} | "
-                f"ETA: {eta_str}"
+                f"ETA: {self.format_eta(eta, eta_low, eta_high)}"
             )
         self._save_progress()
+        self.emit("progress", "rename", processed=processed, total=rename_total,
+                  eta_seconds=eta, eta_low=eta_low, eta_high=eta_high)
     
     def complete_rename(self, renamed_count: int, failed_count: int):
         """完成重命名階段"""
@@ -171,58 +452,95 @@ class ProgressTracker:
             f"✅ 重命名完成：成功 {renamed_count}，失敗 {failed_count} | "
             f"總耗時：{elapsed_str}"
         )
-        self._save_progress()
+        self._save_progress(force=True)
+        self.emit("stage_complete", "rename", successful=renamed_count, failed=failed_count,
+                  elapsed=elapsed)
+    
+    def pause(self):
+        """任務暫停：立即寫出進度快照並發出 paused 事件"""
+        self.run_state = "paused"
+        self._paused_at = time.monotonic()
+        self._save_progress(force=True)
+        self.flush()
+        self.emit("paused", self.phase, processed=self.processed_files, total=self.stage_total)
+    
+    def resume(self):
+        """任務繼續：暫停期間不計入吞吐量估計，發出 resumed 事件"""
+        paused = time.monotonic() - self._paused_at if self._paused_at is not None else 0.0
+        self.run_state = "running"
+        self._paused_at = None
+        if self.estimator is not None:
+            self.estimator.exclude(paused)
+        self._save_progress(force=True)
+        self.emit("resumed", self.phase, processed=self.processed_files, total=self.stage_total,
+                  elapsed=paused)
+    
+    def cancel(self):
+        """任務取消：立即寫出進度快照並發出 cancelled 事件"""
+        self.run_state = "cancelled"
+        self._paused_at = None
+        self._save_progress(force=True)
+        self.flush()
+        self.emit("cancelled", self.phase, processed=self.processed_files, total=self.stage_total)
     
     def get_progress_percent(self) -> int:
-        """獲取進度百分比"""
-        if self.total_files == 0:
+        """獲取目前階段的進度百分比（尚未開始分析時以掃描總數計）"""
+        total = self.stage_total or self.total_files
+        if total == 0:
             return 0
-        return int(self.processed_files * 100 / self.total_files)
+        return min(100, int(self.processed_files * 100 / total))
     
-    def get_eta_seconds(self) -> float:
-        """估計剩餘秒數"""
-        if self.processed_files == 0:
-            return 0
-        
-        elapsed = time.time() - self.start_time
-        avg_time_per_file = elapsed / self.processed_files
-        remaining_files = self.total_files - self.processed_files
-        eta = avg_time_per_file * remaining_files
+    def get_eta_band(self):
+        """
+        目前階段的 ETA 和 95% 信賴區間
         
-        return max(0, eta)
+        Returns:
+            (估計秒數, 下限, 上限)；尚無完成項目時全為 0
+        """
+        if self.estimator is None:
+            return 0.0, 0.0, 0.0
+        return self.estimator.eta(self.stage_total - self.processed_files)
+    
+    def get_eta_seconds(self) -> float:
+        """估計剩餘秒數（依目前階段的 EWMA 吞吐量）"""
+        return self.get_eta_band()[0]
+    
+    def get_rate_summary(self) -> Optional[Dict]:
+        """
+        目前階段的吞吐量摘要（速率、p50/p95、快取命中、ETA 區間）
+
+        resumed 為階段開始時已從檢查點或先前結果載入的數量：它們不在剩餘項目中，
+        不計入命中率（否則 ETA 會低估剩餘的推論時間），只在摘要中與 cache_hits 並列
+        """
+        if self.estimator is None:
+            return None
+        return {**self.estimator.summary(self.stage_total - self.processed_files),
+                "resumed": self.stage_resumed}
+    
+    def format_eta(self, eta: float, low: float, high: float) -> str:
+        """格式化 ETA 和信賴區間"""
+        return format_eta(eta, low, high)
     
     def _format_time(self, seconds: float) -> str:
         """格式化時間"""
-        if seconds < 0:
-            return "計算中..."
-        
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        
-        if hours > 0:
-            return f"{hours}時 {minutes}分 {secs}秒"
-        elif minutes > 0:
-            return f"{minutes}分 {secs}秒"
-        else:
-            return f"{secs}秒"
+        return format_time(seconds)
     
     def log(self, message: str, also_print: bool = True):
         """記錄日誌"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_message = f"[{timestamp}] {message}"
         
-        # 寫入日誌文件
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_message + '\n')
+        # 寫入日誌文件（背景線程批次追加）
+        self._writer.write_line(log_message)
         
         # 同時輸出到終端
-        if also_print:
+        if also_print and self.console:
             print(log_message)
     
     def error(self, message: str, also_print: bool = True):
         """記錄錯誤"""
         self.log(f"❌ {message}", also_print)
+        self.emit("error", self.phase, message=message)
     
     def warning(self, message: str, also_print: bool = True):
         """記錄警告"""
@@ -241,5 +559,6 @@ class ProgressTracker:
             "elapsed_seconds": elapsed,
             "elapsed_formatted": self._format_time(elapsed),
             "eta_seconds": self.get_eta_seconds(),
-            "eta_formatted": self._format_time(self.get_eta_seconds()),
+            "eta_formatted": self.format_eta(*self.get_eta_band()),
+            "stage_rate": self.get_rate_summary(),
         }
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+期限排程 - 依時間預算在品質等級之間切換
+
+功能：
+- QualityTier：品質等級（前處理長邊上限、精簡提示、較小模型、延後低優先目錄）
+- DeadlineController：持續比較「剩餘張數 × 目前等級的單張耗時」和剩餘時間
+  - 落後時降一級，領先（預估耗時低於剩餘時間的 ahead_margin）時升一級
+  - 每次切換後至少觀察 min_items 張再判斷，避免來回切換
+  - 記錄每個檔案使用的等級、切換紀錄和延後未處理的檔案，寫入最終報告的 deadline
+- downscale()：把圖片縮小到長邊上限並重新編碼為 JPEG（需要 Pillow，未安裝時送出原圖）
+- parse_duration()：解析 --deadline（"2h"、"90m"、"1h30m"、"5400"、"1:30"）
+
+組態（config.yaml 的 deadline 區段，皆可省略）：
+    deadline:
+      fast_model: null       # 最低等級改用的較小模型（null：沿用 lm_studio.model）
+      low_priority: []       # 落後時延後處理的目錄（glob，相對於目標目錄）
+      ahead_margin: 0.8
+      reserve: 0.05          # 保留給規劃和重命名的時間比例
+
+設計原理：
+- 單張耗時以 EWMA 追蹤，每個等級分開估計；尚未使用過的等級依 speedup 比例推算
+- 期限只影響分析階段的參數；延後的檔案在最後仍有時間時處理，時間用完時列為未處理
+  （仍是未命名狀態，下次增量執行會再分析）
+"""
+
+import fnmatch
+import io
+import re
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 單張耗時 EWMA 的平滑係數
+EWMA_ALPHA = 0.2
+# 切換等級後至少觀察的張數
+MIN_ITEMS = 5
+# 預估耗時低於剩餘時間的此比例時升級
+AHEAD_MARGIN = 0.8
+# 保留給規劃和重命名的時間比例
+RESERVE = 0.05
+# 縮圖的 JPEG 品質
+JPEG_QUALITY = 85
+
+_DURATION_RE = re.compile(r'^(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m)?(?:(\d+(?:\.\d+)?)s)?$')
+
+
+class QualityTier:
+    """品質等級"""
+
+    __slots__ = ("name", "max_edge", "short_prompt", "model", "defer_low_priority", "speedup")
+
+    def __init__(self, name: str, max_edge: Optional[int] = None, short_prompt: bool = False,
+                 model: Optional[str] = None, defer_low_priority: bool = False, speedup: float = 1.0):
+        """
+        Args:
+            name: 等級名稱
+            max_edge: 前處理的長邊上限（像素，None：送出原圖）
+            short_prompt: 使用精簡提示
+            model: 改用的模型（None：沿用引擎的模型）
+            defer_low_priority: 延後處理低優先目錄
+            speedup: 尚未實測時，相對於完整品質的單張耗時比例
+        """
+        self.name = name
+        self.max_edge = max_edge
+        self.short_prompt = short_prompt
+        self.model = model
+        self.defer_low_priority = defer_low_priority
+        self.speedup = speedup
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QualityTier":
+        return cls(data["name"], data.get("max_edge"), data.get("short_prompt", False),
+                   data.get("model"), data.get("defer_low_priority", False), data.get("speedup", 1.0))
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "max_edge": self.max_edge, "short_prompt": self.short_prompt,
+                "model": self.model, "defer_low_priority": self.defer_low_priority}
+
+
+def default_tiers(fast_model: Optional[str] = None) -> List[QualityTier]:
+    """默認等級：完整 → 縮圖 → 縮圖 + 精簡提示 → 最小（較小模型、延後低優先目錄）"""
+    return [
+        QualityTier("full"),
+        QualityTier("reduced", max_edge=1536, speedup=0.75),
+        QualityTier("fast", max_edge=1024, short_prompt=True, speedup=0.5),
+        QualityTier("minimal", max_edge=768, short_prompt=True, model=fast_model,
+                    defer_low_priority=True, speedup=0.35),
+    ]
+
+
+def parse_duration(text: str) -> float:
+    """
+    解析時間長度（秒）
+
+    Raises:
+        ValueError: 格式錯誤或不大於 0
+    """
+    value = text.strip().lower()
+    seconds = None
+    if ":" in value:
+        hours, _, minutes = value.partition(":")
+        if hours.isdigit() and minutes.isdigit():
+            seconds = int(hours) * 3600 + int(minutes) * 60
+    else:
+        try:
+            seconds = float(value)
+        except ValueError:
+            match = _DURATION_RE.match(value)
+            if match and any(match.groups()):
+                h, m, s = (float(g) if g else 0.0 for g in match.groups())
+                seconds = h * 3600 + m * 60 + s
+    if seconds is None or seconds <= 0:
+        raise ValueError(f"無效的時間長度：{text}（例如 2h、90m、1h30m、5400、1:30）")
+    return seconds
+
+
+def downscale(image_bytes: bytes, max_edge: int) -> Tuple[bytes, Optional[str]]:
+    """
+    縮小圖片到長邊不超過 max_edge 並編碼為 JPEG
+
+    Returns:
+        (圖片位元組, MIME 類型)；不需縮小、無法解碼或未安裝 Pillow 時返回 (原位元組, None)
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return image_bytes, None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            if max(image.size) <= max_edge:
+                return image_bytes, None
+            image.thumbnail((max_edge, max_edge))
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=JPEG_QUALITY)
+            return output.getvalue(), "image/jpeg"
+    except Exception:
+        return image_bytes, None
+
+
+class DeadlineController:
+    """依時間預算選擇品質等級"""
+
+    def __init__(self, budget_seconds: float, tiers: Sequence[QualityTier],
+                 low_priority: Sequence[str] = (), ahead_margin: float = AHEAD_MARGIN,
+                 reserve: float = RESERVE, min_items: int = MIN_ITEMS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            budget_seconds: 時間預算（從 start() 起算）
+            tiers: 品質等級（由高到低）
+            low_priority: 低優先目錄的 glob（相對於目標目錄）
+            ahead_margin: 預估耗時低於剩餘時間的此比例時升級
+            reserve: 保留給規劃和重命名的時間比例
+            min_items: 切換等級後至少觀察的張數
+        """
+        if not tiers:
+            raise ValueError("至少需要一個品質等級")
+        self.budget = budget_seconds
+        self.tiers = list(tiers)
+        self.low_priority = list(low_priority)
+        self.ahead_margin = ahead_margin
+        self.reserve = reserve
+        self.min_items = min_items
+        self.clock = clock
+        self.index = 0
+        self.started: Optional[float] = None
+        self._seconds: Dict[str, float] = {}
+        self._since_change = 0
+        self.files_by_tier: Dict[str, List[str]] = {tier.name: [] for tier in self.tiers}
+        self.changes: List[Dict] = []
+        self.deferred: List[str] = []
+        self.unprocessed: List[str] = []
+
+    @classmethod
+    def from_config(cls, budget_seconds: float, config: Dict,
+                    low_priority: Sequence[str] = ()) -> "DeadlineController":
+        """依組態的 deadline 區段建立（命令行的 low_priority 附加在組態之後）"""
+        section = config.get("deadline", {}) or {}
+        if section.get("tiers"):
+            tiers = [QualityTier.from_dict(t) for t in section["tiers"]]
+        else:
+            tiers = default_tiers(section.get("fast_model"))
+        return cls(
+            budget_seconds, tiers,
+            low_priority=list(section.get("low_priority") or []) + list(low_priority),
+            ahead_margin=section.get("ahead_margin", AHEAD_MARGIN),
+            reserve=section.get("reserve", RESERVE),
+        )
+
+    def start(self):
+        """開始計時（重複呼叫時沿用第一次的起點）"""
+        if self.started is None:
+            self.started = self.clock()
+
+    @property
+    def tier(self) -> QualityTier:
+        return self.tiers[self.index]
+
+    def time_left(self) -> float:
+        """分析階段可用的剩餘秒數（已扣除保留時間）"""
+        elapsed = self.clock() - self.started if self.started is not None else 0.0
+        return self.budget * (1 - self.reserve) - elapsed
+
+    def is_low_priority(self, filename: str) -> bool:
+        directory = filename.replace("\\", "/").rpartition("/")[0] or "."
+        return any(fnmatch.fnmatch(directory, pattern) or fnmatch.fnmatch(filename, pattern)
+                   for pattern in self.low_priority)
+
+    def should_defer(self, filename: str) -> bool:
+        """目前等級是否要延後處理此檔案"""
+        return self.tier.defer_low_priority and self.is_low_priority(filename)
+
+    def per_item(self, index: int) -> Optional[float]:
+        """等級 index 的單張耗時估計（沒有任何實測時返回 None）"""
+        tier = self.tiers[index]
+        if tier.name in self._seconds:
+            return self._seconds[tier.name]
+        # 以實測過的等級依 speedup 比例推算
+        for name, seconds in self._seconds.items():
+            reference = next(t for t in self.tiers if t.name == name)
+            return seconds * tier.speedup / reference.speedup
+        return None
+
+    def observe(self, filename: str, seconds: float):
+        """記錄一張圖片以目前等級處理的耗時（含請求間延遲）"""
+        name = self.tier.name
+        previous = self._seconds.get(name)
+        self._seconds[name] = seconds if previous is None else \
+            previous + EWMA_ALPHA * (seconds - previous)
+        self.files_by_tier[name].append(filename)
+        self._since_change += 1
+
+    def adjust(self, remaining: int) -> Optional[Dict]:
+        """
+        依剩餘張數調整等級
+
+        Returns:
+            切換時返回切換紀錄 {"from", "to", "projected", "time_left", "remaining"}，否則 None
+        """
+        if self._since_change < self.min_items or remaining <= 0:
+            return None
+        left = self.time_left()
+        current = self.per_item(self.index)
+        if current is None:
+            return None
+        projected = remaining * current
+        target = self.index
+        if projected > left and self.index < len(self.tiers) - 1:
+            target = self.index + 1
+        elif self.index > 0:
+            faster = self.per_item(self.index - 1)
+            if faster is not None and remaining * faster < left * self.ahead_margin:
+                target = self.index - 1
+        if target == self.index:
+            return None
+
+        change = {
+            "from": self.tier.name,
+            "to": self.tiers[target].name,
+            "projected": round(projected, 1),
+            "time_left": round(left, 1),
+            "remaining": remaining,
+            "elapsed": round(self.clock() - self.started, 1) if self.started is not None else 0.0,
+        }
+        self.index = target
+        self._since_change = 0
+        self.changes.append(change)
+        return change
+
+    def report(self) -> Dict:
+        """最終報告的 deadline 區段"""
+        elapsed = self.clock() - self.started if self.started is not None else 0.0
+        return {
+            "budget_seconds": round(self.budget, 1),
+            "elapsed_seconds": round(elapsed, 1),
+            "met": elapsed <= self.budget,
+            "tiers": [tier.to_dict() for tier in self.tiers],
+            "images_by_tier": {name: len(files) for name, files in self.files_by_tier.items()},
+            "files_by_tier": {name: files for name, files in self.files_by_tier.items()
+                              if files and name != self.tiers[0].name},
+            "changes": self.changes,
+            "deferred": len(self.deferred),
+            "unprocessed": self.unprocessed,
+        }
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+階段吞吐量估計器 - 依單一階段的完成間隔估計 ETA
+
+功能：
+- 以 EWMA 追蹤每項的完成間隔（平均值和變異數），快取命中和實際推論分開估計
+- 以最近的完成項目估計快取命中率，剩餘項目依命中率混合兩種間隔
+- 滑動視窗保存最近的單項耗時，提供 p50 / p95
+- ETA 附 95% 信賴區間（剩餘 n 項間隔總和的標準差為 σ·√n）
+
+設計原理：
+- 用「完成間隔」而非單項耗時：並行處理或請求間延遲都會反映在間隔中
+- 每個階段（分析、重命名）各自建立估計器，不混用掃描或前一階段的時間
+- 已從先前結果載入的項目不計入速率，只減少剩餘數量
+"""
+
+import math
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+# EWMA 平滑係數（越大越快反映最近的變化）
+DEFAULT_ALPHA = 0.2
+# 百分位數和命中率的滑動視窗大小
+DEFAULT_WINDOW = 200
+# 95% 信賴區間的 z 值
+Z_95 = 1.96
+
+
+class _Ewma:
+    """指數加權的平均值和變異數"""
+
+    __slots__ = ("alpha", "mean", "var", "count")
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def add(self, value: float):
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return
+        diff = value - self.mean
+        incr = self.alpha * diff
+        self.mean += incr
+        self.var = (1 - self.alpha) * (self.var + diff * incr)
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    """已排序列表的百分位數（最近秩）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class StageRateEstimator:
+    """單一階段的吞吐量和 ETA 估計"""
+
+    def __init__(self, alpha: float = DEFAULT_ALPHA, window: int = DEFAULT_WINDOW):
+        self.started = time.monotonic()
+        self._last = self.started
+        self._inference = _Ewma(alpha)
+        self._cached = _Ewma(alpha)
+        self._latencies = deque(maxlen=window)
+        self._recent_cached = deque(maxlen=window)
+        self.inferences = 0
+        self.cache_hits = 0
+
+    def record(self, latency: float, cached: bool = False):
+        """
+        記錄一項完成
+
+        Args:
+            latency: 該項本身的耗時（秒）
+            cached: 是否為快取命中（未實際推論）
+        """
+        now = time.monotonic()
+        interval = now - self._last
+        self._last = now
+        if cached:
+            self.cache_hits += 1
+            self._cached.add(interval)
+        else:
+            self.inferences += 1
+            self._inference.add(interval)
+            self._latencies.append(latency)
+        self._recent_cached.append(cached)
+
+    def exclude(self, seconds: float):
+        """不計入一段時間（暫停期間），避免暫停後的第一個間隔拉高估計"""
+        self.started += seconds
+        self._last += seconds
+
+    @property
+    def completed(self) -> int:
+        return self.inferences + self.cache_hits
+
+    def hit_rate(self) -> float:
+        """最近視窗內的快取命中率"""
+        if not self._recent_cached:
+            return 0.0
+        return sum(self._recent_cached) / len(self._recent_cached)
+
+    def _per_item(self) -> Optional[Tuple[float, float]]:
+        """剩餘項目的每項間隔（平均值, 變異數）；尚無資料時返回 None"""
+        if not self.completed:
+            return None
+        hit = self.hit_rate()
+        parts = []
+        if self._inference.count:
+            parts.append((1 - hit if self._cached.count else 1.0, self._inference))
+        if self._cached.count:
+            parts.append((hit if self._inference.count else 1.0, self._cached))
+        mean = sum(w * e.mean for w, e in parts)
+        second_moment = sum(w * (e.var + e.mean * e.mean) for w, e in parts)
+        return mean, max(0.0, second_moment - mean * mean)
+
+    def eta(self, remaining: int) -> Tuple[float, float, float]:
+        """
+        剩餘 remaining 項的 ETA
+
+        Returns:
+            (估計秒數, 95% 下限, 95% 上限)；尚無資料時全為 0
+        """
+        per_item = self._per_item()
+        if per_item is None or remaining <= 0:
+            return 0.0, 0.0, 0.0
+        mean, var = per_item
+        eta = mean * remaining
+        spread = Z_95 * math.sqrt(var * remaining)
+        return eta, max(0.0, eta - spread), eta + spread
+
+    def items_per_second(self) -> float:
+        """目前的吞吐量（依 EWMA 間隔）"""
+        per_item = self._per_item()
+        if per_item is None or per_item[0] <= 0:
+            return 0.0
+        return 1.0 / per_item[0]
+
+    def latency_percentiles(self) -> Tuple[float, float]:
+        """最近實際推論的單項耗時（p50, p95）"""
+        ordered = sorted(self._latencies)
+        return _percentile(ordered, 0.50), _percentile(ordered, 0.95)
+
+    def summary(self, remaining: int) -> Dict:
+        """快照和報告用的統計摘要"""
+        eta, low, high = self.eta(remaining)
+        p50, p95 = self.latency_percentiles()
+        return {
+            "inferences": self.inferences,
+            "cache_hits": self.cache_hits,
+            "items_per_second": round(self.items_per_second(), 3),
+            "latency_p50": round(p50, 3),
+            "latency_p95": round(p95, 3),
+            "eta_seconds": round(eta, 1),
+            "eta_low": round(low, 1),
+            "eta_high": round(high, 1),
+        }
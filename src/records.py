@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+精簡記錄型別 - 分析結果和命名計畫項目
+
+功能：
+- AnalysisRecord：單張圖片的分析結果（取代巢狀 dict）
+- PlanEntry：重命名計畫的一個項目（引用 AnalysisRecord，不複製主題欄位）
+- 與既有 JSON 格式（qwen_vision_analysis_complete.json、
+  qwen_rename_plan_complete.json）無損互轉
+- 逐筆寫出 JSON 文件，輸出與 json.dump(indent=2) 完全相同
+
+設計原理：
+- 使用 __slots__，每筆記錄不帶 __dict__，避免重複的鍵字串
+- 目錄前綴和主題字串以 sys.intern 共用，同一目錄/主題只保存一份
+- 計畫項目只保存新檔名，舊檔名和主題欄位從分析記錄取得
+"""
+
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+
+# 分析結果中有專屬欄位的鍵（其餘鍵保存在 extra_analysis，確保無損）
+ANALYSIS_FIELDS = ("image_title", "main_theme", "sub_theme", "core_content", "recommended_name")
+
+# 需要 intern 的欄位（主題類別重複率高）
+INTERNED_FIELDS = ("main_theme", "sub_theme")
+
+
+def _intern(value):
+    """只對字串做 intern，其他型別原樣返回"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def split_relative_path(filename: str):
+    """將相對路徑拆成（已 intern 的目錄前綴, 檔名）"""
+    directory, sep, name = filename.rpartition("/")
+    return sys.intern(directory), name
+
+
+def join_relative_path(directory: str, name: str) -> str:
+    """組合目錄前綴和檔名"""
+    return f"{directory}/{name}" if directory else name
+
+
+class AnalysisRecord:
+    """單張圖片的分析結果"""
+
+    __slots__ = (
+        "directory", "name", "status",
+        "image_title", "main_theme", "sub_theme", "core_content", "recommended_name",
+        "error", "extra_analysis", "extra",
+    )
+
+    def __init__(self, filename: str, status: str = "success",
+                 analysis: Optional[Dict] = None, error: Optional[str] = None,
+                 extra: Optional[Dict] = None):
+        """
+        初始化分析記錄
+
+        Args:
+            filename: 相對於目標目錄的路徑（例如 "B/001.png"）
+            status: "success" 或 "error"
+            analysis: 模型返回的分析 JSON（status 為 success 時）
+            error: 錯誤訊息（status 為 error 時）
+            extra: 其他頂層欄位（保留以便無損輸出）
+        """
+        self.directory, self.name = split_relative_path(filename)
+        self.status = sys.intern(status)
+        self.error = error
+        self.extra = extra or None
+        for field in ANALYSIS_FIELDS:
+            setattr(self, field, None)
+        self.extra_analysis = None
+        if analysis is not None:
+            self.set_analysis(analysis)
+
+    def set_analysis(self, analysis: Dict):
+        """從模型返回的分析 JSON 填入欄位"""
+        extra = {}
+        for key, value in analysis.items():
+            if key in ANALYSIS_FIELDS and value is not None:
+                setattr(self, key, _intern(value) if key in INTERNED_FIELDS else value)
+            else:
+                extra[key] = value
+        self.extra_analysis = extra or None
+
+    @property
+    def filename(self) -> str:
+        return join_relative_path(self.directory, self.name)
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status == "success"
+
+    def analysis(self) -> Dict:
+        """重建模型返回的分析 JSON（只包含存在的欄位）"""
+        result = {}
+        for field in ANALYSIS_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                result[field] = value
+        if self.extra_analysis:
+            result.update(self.extra_analysis)
+        return result
+
+    def get(self, field: str, default=None):
+        """以 dict.get 的語意讀取分析欄位"""
+        value = getattr(self, field, None) if field in ANALYSIS_FIELDS else None
+        if value is None and self.extra_analysis:
+            value = self.extra_analysis.get(field)
+        return default if value is None else value
+
+    def to_dict(self) -> Dict:
+        """轉換為既有 JSON 格式"""
+        data = {"filename": self.filename, "status": self.status}
+        if self.succeeded:
+            data["analysis"] = self.analysis()
+        else:
+            data["error"] = self.error
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AnalysisRecord":
+        """從既有 JSON 格式建立記錄"""
+        extra = {k: v for k, v in data.items() if k not in ("filename", "status", "analysis", "error")}
+        return cls(
+            data["filename"],
+            data.get("status", "success"),
+            analysis=data.get("analysis"),
+            error=data.get("error"),
+            extra=extra,
+        )
+
+    def __repr__(self):
+        return f"AnalysisRecord({self.filename!r}, {self.status!r})"
+
+
+class PlanEntry:
+    """重命名計畫項目（主題欄位直接引用分析記錄）"""
+
+    __slots__ = ("record", "new_name")
+
+    def __init__(self, record: AnalysisRecord, new_name: str):
+        """
+        Args:
+            record: 對應的分析記錄
+            new_name: 新檔名（不含目錄，重命名只在同一目錄內進行）
+        """
+        self.record = record
+        self.new_name = new_name
+
+    @property
+    def directory(self) -> str:
+        return self.record.directory
+
+    @property
+    def old_filename(self) -> str:
+        return self.record.filename
+
+    @property
+    def new_filename(self) -> str:
+        return join_relative_path(self.record.directory, self.new_name)
+
+    @new_filename.setter
+    def new_filename(self, value: str):
+        self.new_name = value.rpartition("/")[2]
+
+    def to_dict(self) -> Dict:
+        """轉換為 qwen_rename_plan_complete.json 的項目格式"""
+        record = self.record
+        return {
+            "old_filename": record.filename,
+            "new_filename": self.new_filename,
+            "image_title": record.get("image_title", "N/A"),
+            "main_theme": record.get("main_theme", "N/A"),
+            "sub_theme": record.get("sub_theme", "N/A"),
+            "core_content": record.get("core_content", "N/A"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PlanEntry":
+        """從計畫檔案項目建立（主題欄位還原為分析記錄）"""
+        analysis = {field: data[field] for field in ANALYSIS_FIELDS if field in data}
+        record = AnalysisRecord(data["old_filename"], "success", analysis=analysis)
+        return cls(record, data["new_filename"].rpartition("/")[2])
+
+    def __repr__(self):
+        return f"PlanEntry({self.old_filename!r} → {self.new_filename!r})"
+
+
+def _indent_json(value, level: int) -> str:
+    """以 indent=2 序列化，並將續行縮排到指定層級"""
+    text = json.dumps(value, ensure_ascii=False, indent=2)
+    return text.replace("\n", "\n" + "  " * level)
+
+
+def dump_records(path: Path, records: Iterable, metadata: Optional[Dict] = None,
+                 list_key: str = "detailed_results"):
+    """
+    逐筆寫出記錄到 JSON 文件（不先組出完整的 dict 列表）
+
+    輸出與 json.dump(..., ensure_ascii=False, indent=2) 完全相同：
+    - metadata 為 None：頂層為列表（命名計畫格式）
+    - 否則：{"metadata": ..., list_key: [...]}（分析結果格式）
+
+    Args:
+        path: 輸出路徑
+        records: AnalysisRecord / PlanEntry（或已是 dict）的可迭代物件
+        metadata: 頂層 metadata
+        list_key: 記錄列表的鍵名
+    """
+    level = 1 if metadata is None else 2
+    pad = "  " * level
+    with open(path, "w", encoding="utf-8") as f:
+        if metadata is not None:
+            f.write("{\n  \"metadata\": " + _indent_json(metadata, 1) + ",\n")
+            f.write(f"  {json.dumps(list_key)}: ")
+        f.write("[")
+        first = True
+        for record in records:
+            data = record if isinstance(record, dict) else record.to_dict()
+            f.write(("\n" if first else ",\n") + pad + _indent_json(data, level))
+            first = False
+        if not first:
+            f.write("\n" + "  " * (level - 1))
+        f.write("]")
+        if metadata is not None:
+            f.write("\n}")
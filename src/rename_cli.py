@@ -0,0 +1,995 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+圖片智能命名系統 - 統一命令行入口（image-rename）
+
+子命令：
+    scan     掃描目錄，統計已命名 / 未命名的圖片（不連線）
+    dedup    偵測並刪除內容重複的圖片
+    analyze  分析圖片並保存分析結果（不重命名）
+    plan     從已保存的分析結果生成命名對照表
+    apply    套用命名對照表
+    undo     復原最近一次的重命名
+    status   顯示最近一次執行的進度和報告
+    run      完整流程（分析 → 規劃 → 重命名），支援 --stream / --replan
+    estimate 分層抽樣分析少量圖片，推估完整執行的耗時、傳輸量和 token 用量
+    watch    監看目錄，新圖片寫入完成後立即分析和重命名
+    shard    多機分工：多台機器以共享目錄的租約分配區塊，最後由一台規劃和重命名
+    serve    本機任務伺服器：多個呼叫端的重命名任務排隊共用一個引擎
+    submit   送出任務到任務伺服器（--wait 等待完成）
+    jobs     列出任務，或暫停 / 繼續 / 取消任務
+
+設計原理：
+- 模組頂層只匯入標準庫的輕量模組，子命令執行時才匯入所需模組
+  （requests、yaml 等只在需要連線或讀取組態時載入）
+- 腳本直接呼叫本命令，不經過 conda run，也不逐檔 fork 外部命令計數
+
+使用方式：
+    pip install -e .            # 安裝 image-rename 命令
+    image-rename scan --target-dir ~/Downloads
+    python src/rename_cli.py run --target-dir ~/Downloads
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+SESSION_DIR = PROJECT_ROOT / "data" / "session"
+
+
+def _target_dir(args) -> Path:
+    """命令行的目標目錄（未指定時使用當前工作目錄；多目錄時為第一個）"""
+    target = args.target_dir
+    if isinstance(target, list):
+        target = target[0] if target else None
+    return Path(target).expanduser() if target else Path.cwd()
+
+
+def _target_roots(args) -> list:
+    """run 的全部目標目錄（--target-dir 可重複指定，加上 --manifest 清單檔）"""
+    from target_roots import check_roots, read_manifest
+
+    roots = [Path(t) for t in args.target_dir or []]
+    if args.manifest:
+        try:
+            roots.extend(read_manifest(args.manifest))
+        except OSError as e:
+            raise SystemExit(f"❌ 無法讀取清單檔 {args.manifest}：{e}")
+    if not roots:
+        return [_target_dir(args)]
+    try:
+        return check_roots(roots)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+
+
+def _selected_session_dir(args) -> Path:
+    """
+    undo / status 的 session 目錄
+
+    指定 --target-dir 且該目錄有命名空間（多目錄執行、任務伺服器的任務）時使用命名空間，
+    否則為 --session-dir
+    """
+    from target_roots import root_session_dir
+
+    if args.target_dir:
+        namespaced = root_session_dir(args.session_dir, _target_dir(args))
+        if namespaced.is_dir():
+            return namespaced
+    return args.session_dir
+
+
+def _root_sessions(session_dir: Path) -> list:
+    """session 目錄下各目標目錄的命名空間（見 target_roots.py）"""
+    roots = session_dir / "roots"
+    return sorted(p for p in roots.iterdir() if p.is_dir()) if roots.is_dir() else []
+
+
+def _open_event_sinks(specs):
+    """
+    開啟 --events 指定的進度事件輸出槽
+
+    指定 - 時 stdout 只留給事件：之後給人看的輸出（CLI 訊息、引擎和進度追蹤的日誌）改寫到 stderr
+    """
+    from progress_events import open_event_sink
+
+    sinks = []
+    for spec in specs or []:
+        try:
+            sinks.append(open_event_sink(spec))
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"❌ 無法開啟進度事件輸出槽 {spec}：{e}")
+    if "-" in (specs or []):
+        sys.stdout = sys.stderr
+    return sinks
+
+
+def _open_metrics(args):
+    """依 --metrics-port / --metrics-file 啟動即時指標輸出（皆未指定時返回 None）"""
+    port = getattr(args, "metrics_port", None)
+    textfile = getattr(args, "metrics_file", None)
+    if port is None and not textfile:
+        return None
+
+    from metrics import EngineMetrics
+    metrics = EngineMetrics()
+    if port is not None:
+        try:
+            metrics.serve(port)
+        except OSError as e:
+            raise SystemExit(f"❌ 無法啟動指標端點（port {port}）：{e}")
+        print(f"📈 指標端點：http://127.0.0.1:{port}/metrics")
+    if textfile:
+        metrics.write_textfile(textfile)
+    return metrics
+
+
+def _open_deadline(args, config_path):
+    """依 --deadline 建立期限控制器（未指定時返回 None）"""
+    if not getattr(args, "deadline", None):
+        return None
+
+    from quality_tiers import DeadlineController, parse_duration
+    from rename_planner import load_config
+    try:
+        budget = parse_duration(args.deadline)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    return DeadlineController.from_config(budget, load_config(config_path),
+                                          low_priority=getattr(args, "low_priority", None) or [])
+
+
+def _make_engine(args, **kwargs):
+    """建立引擎（延遲匯入 rename_engine 和 requests）"""
+    from rename_engine import RenameEngine, DATA_DIR, LOGS_DIR
+
+    # 確保必要的目錄存在
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+
+    # 有事件訂閱端時不再輸出給人看的 [進度] 行
+    event_sinks = _open_event_sinks(getattr(args, "events", None))
+    from trace_spans import open_tracer
+    tracer = open_tracer(getattr(args, "trace", None))
+    return RenameEngine(
+        _target_dir(args),
+        session_dir=args.session_dir,
+        config_path=getattr(args, "config", None),
+        event_sinks=event_sinks,
+        progress_lines=not event_sinks,
+        tracer=tracer,
+        metrics=_open_metrics(args),
+        profile=getattr(args, "profile", False),
+        deadline=_open_deadline(args, getattr(args, "config", None)),
+        schedule=getattr(args, "schedule", None),
+        priorities=getattr(args, "priority", None),
+        **kwargs
+    )
+
+
+@contextlib.contextmanager
+def _signal_control(engine):
+    """
+    執行期間的訊號處理（只在主線程生效）
+
+    - Ctrl+C / SIGTERM：取消並放棄進行中的請求，保存進度後以 130 結束；
+      再按一次 Ctrl+C 立即中斷
+    - SIGUSR1：暫停（保存進度，模型閒置）；SIGUSR2：繼續
+    """
+    import signal
+
+    previous = {}
+
+    def on_cancel(signum, frame):
+        if engine.control.cancelled:
+            signal.signal(signum, previous[signum])
+            if signum == signal.SIGINT:
+                raise KeyboardInterrupt
+            os.kill(os.getpid(), signum)
+            return
+        print("\n⏹️  取消中，保存進度...（再按一次 Ctrl+C 立即結束）", file=sys.stderr)
+        engine.control.cancel(abandon=True)
+
+    handlers = {signal.SIGINT: on_cancel, signal.SIGTERM: on_cancel}
+    if hasattr(signal, "SIGUSR1"):
+        handlers[signal.SIGUSR1] = lambda signum, frame: engine.control.pause()
+        handlers[signal.SIGUSR2] = lambda signum, frame: engine.control.resume()
+    for signum, handler in handlers.items():
+        previous[signum] = signal.signal(signum, handler)
+    try:
+        yield
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+
+def _load_json(path: Path):
+    """讀取 JSON 檔案（不存在或損壞時返回 None）"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# ----------------------------------------------------------------------
+# 子命令
+# ----------------------------------------------------------------------
+
+def cmd_scan(args) -> int:
+    """掃描目錄並統計（單次 os.walk，不開啟檔案）"""
+    from rename_engine import iter_image_directories, is_already_renamed
+
+    target_dir = _target_dir(args)
+    if not target_dir.is_dir():
+        print(f"❌ 目錄不存在：{target_dir}", file=sys.stderr)
+        return 1
+
+    total = renamed = 0
+    per_directory = []
+    for directory, files in iter_image_directories(target_dir):
+        dir_renamed = sum(1 for f in files if is_already_renamed(f.stem))
+        total += len(files)
+        renamed += dir_renamed
+        per_directory.append((directory, len(files), dir_renamed))
+
+    if args.porcelain:
+        # 供腳本讀取：總數 未命名數 已命名數
+        print(total, total - renamed, renamed)
+        return 0
+
+    print(f"📊 掃描結果：{target_dir}")
+    print(f"   圖片總數：{total} 個")
+    print(f"   已命名：{renamed} 個")
+    print(f"   未命名：{total - renamed} 個")
+    if args.verbose:
+        print()
+        for directory, count, dir_renamed in per_directory:
+            relative = directory.relative_to(target_dir) if directory != target_dir else '.'
+            print(f"   📁 {relative}：{count} 張（已命名 {dir_renamed}）")
+    return 0
+
+
+def cmd_dedup(args) -> int:
+    """偵測並清理重複圖片"""
+    from deduplicate_and_cleanup import cleanup_duplicates
+
+    cleanup_duplicates(_target_dir(args), args.session_dir, dry_run=args.dry_run)
+    return 0
+
+
+def cmd_analyze(args) -> int:
+    """分析圖片並保存 qwen_vision_analysis_complete.json"""
+    with _make_engine(args, force_rename=args.force_rename, limit=args.limit) as engine, \
+            _signal_control(engine):
+        engine.analyze(engine.scan())
+        if engine.deadline is not None:
+            engine.log_deadline(engine.deadline.report())
+    return 0
+
+
+def cmd_plan(args) -> int:
+    """從已保存的分析結果生成 qwen_rename_plan_complete.json"""
+    from records import AnalysisRecord
+    from result_sinks import iter_stored_records
+
+    analysis_path = Path(args.analysis_file).expanduser() if args.analysis_file \
+        else args.session_dir / "qwen_vision_analysis_complete.json"
+    if not analysis_path.exists():
+        print(f"❌ 找不到分析結果：{analysis_path}")
+        print("   請先執行 image-rename analyze")
+        return 1
+
+    with _make_engine(args) as engine:
+        records = [AnalysisRecord.from_dict(r) for r in iter_stored_records(analysis_path)]
+        engine.log(f"📂 已加載 {len(records)} 個分析結果：{analysis_path}")
+        engine.plan(records)
+    return 0
+
+
+def cmd_apply(args) -> int:
+    """套用命名對照表"""
+    from records import PlanEntry
+    from result_sinks import iter_stored_records
+
+    plan_path = Path(args.plan_file).expanduser() if args.plan_file \
+        else args.session_dir / "qwen_rename_plan_complete.json"
+    if not plan_path.exists():
+        print(f"❌ 找不到命名對照表：{plan_path}")
+        print("   請先執行 image-rename plan")
+        return 1
+
+    with _make_engine(args, delete_original=args.delete_original) as engine, _signal_control(engine):
+        rename_plan = [PlanEntry.from_dict(e) for e in iter_stored_records(plan_path)]
+        outcome = engine.apply(rename_plan, plan_path)
+    return 1 if outcome["errors"] else 0
+
+
+def cmd_undo(args) -> int:
+    """復原最近一次的重命名"""
+    from rename_journal import RenameJournal, undo_last_run
+    from rename_planner import release_allocations
+
+    session_dir = _selected_session_dir(args)
+    result = undo_last_run(RenameJournal(session_dir / "rename_journal.jsonl"))
+    # 已復原的名稱不再佔用，下次規劃不必為它們加序號
+    release_allocations(session_dir / "rename_allocations.sqlite", result["reverted"])
+    if result["run"] is None:
+        print(f"ℹ️ 沒有可復原的重命名紀錄：{session_dir}")
+        if session_dir == args.session_dir and _root_sessions(session_dir):
+            print("   多目錄執行和任務伺服器的紀錄在各目錄的命名空間中，請加上 --target-dir 指定目錄")
+        return 0
+
+    print(f"↩️  已復原執行 {result['run']}")
+    print(f"   移回原檔名：{result['restored']} 個")
+    print(f"   刪除複本：{result['removed']} 個")
+    if result["skipped"]:
+        print(f"⚠️  略過：{len(result['skipped'])} 個")
+        for entry in result["skipped"][:10]:
+            print(f"   {Path(entry['new']).name} → {Path(entry['old']).name}（{entry['reason']}）")
+    return 0
+
+
+def cmd_status(args) -> int:
+    """顯示最近一次執行的進度和報告（只讀取 session 檔案）"""
+    session_dir = _selected_session_dir(args)
+    progress = _load_json(session_dir / "progress_rename.json")
+    report = _load_json(session_dir / "qwen_rename_final_report.json")
+    multi = _load_json(session_dir / "qwen_multi_root_report.json")
+    namespaces = _root_sessions(session_dir) if session_dir == args.session_dir else []
+
+    if progress is None and report is None and multi is None and not namespaces:
+        print(f"ℹ️ 尚無執行紀錄：{session_dir}")
+        return 0
+
+    if progress is not None:
+        print(f"📍 最近進度（{progress.get('timestamp', 'N/A')}）")
+        print(f"   階段：{progress.get('phase')}")
+        print(f"   進度：{progress.get('progress_percent', 0)}% "
+              f"({progress.get('processed_files', 0)}/{progress.get('total_files', 0)})")
+        print(f"   成功：{progress.get('successful_files', 0)}，失敗：{progress.get('failed_files', 0)}")
+        if progress.get("run_state") in ("paused", "cancelled"):
+            checkpoint = _load_json(session_dir / "qwen_analysis_progress.json")
+            saved = len(checkpoint.get("results", [])) if isinstance(checkpoint, dict) else 0
+            label = "已暫停" if progress["run_state"] == "paused" else "已取消"
+            print(f"   狀態：{label}（已保存 {saved} 個分析結果，再次執行即從中斷處繼續）")
+    if report is not None:
+        print(f"📝 最終報告（{report.get('timestamp', 'N/A')}）")
+        print(f"   分析：{report.get('analyzed', 0)} 張"
+              f"（成功 {report.get('successful_analysis', 0)}，失敗 {report.get('failed_analysis', 0)}）")
+        print(f"   重命名：{report.get('renamed', 0)} 張，失敗 {report.get('rename_errors', 0)} 張")
+    if multi is not None:
+        print(f"📁 多目錄執行（{multi.get('timestamp', 'N/A')}）：{len(multi.get('roots', []))} 個目錄，"
+              f"失敗 {multi.get('failed_roots', 0)} 個")
+        for entry in multi.get("roots", []):
+            status = "✅" if entry.get("status") == "done" else "❌"
+            print(f"   {status} {entry.get('target_dir')}：分析 {entry.get('analyzed', 0)}，"
+                  f"重命名 {entry.get('renamed', 0)}")
+            print(f"      session：{entry.get('session_dir')}")
+    if namespaces:
+        print(f"🗂️  各目錄的 session（{len(namespaces)} 個，加上 --target-dir 查看單一目錄）")
+        for namespace in namespaces:
+            root_progress = _load_json(namespace / "progress_rename.json")
+            if root_progress is None:
+                print(f"   {namespace.name}：尚無進度")
+                continue
+            print(f"   {namespace.name}：{root_progress.get('phase')} "
+                  f"{root_progress.get('progress_percent', 0)}%（{root_progress.get('timestamp', 'N/A')}）")
+    return 0
+
+
+def cmd_run(args) -> int:
+    """完整流程（原 full_batch_rename_execute.py）"""
+    from datetime import datetime
+
+    roots = _target_roots(args)
+    target_dir = roots[0]
+    engine = _make_engine(
+        args,
+        force_rename=args.force_rename,
+        delete_original=args.delete_original,
+        limit=args.limit,
+    )
+
+    print("=" * 80)
+    print("🚀 圖片智能命名系統 - Qwen3-VL 批量分析和重命名 v1.2")
+    print("=" * 80)
+    print(f"時間：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    if len(roots) > 1:
+        print(f"目標目錄：{len(roots)} 個（各自的 session：{args.session_dir / 'roots'}）")
+        for root in roots:
+            print(f"   {root}")
+    else:
+        print(f"目標目錄：{target_dir}")
+    if args.force_rename:
+        print("📌 模式：強制重新命名（將重新分析所有檔案）")
+    else:
+        print("📌 模式：增量模式（將跳過已命名的檔案）")
+    if args.stream:
+        print(f"📌 串流模式：逐目錄處理，輸出槽：{args.sink}")
+    if args.replan:
+        rules = engine.rules
+        print(f"📌 重新規劃模式：命名規則 {rules.priority_field} → {rules.fallback_field}，分隔符 '{rules.separator}'")
+    print()
+
+    with engine, _signal_control(engine):
+        if len(roots) > 1:
+            summary = engine.run_roots(roots, stream=args.stream, sink_kind=args.sink, replan=args.replan)
+            return 1 if summary["failed_roots"] else 0
+        if args.replan:
+            try:
+                engine.replan(args.analysis_file, stream=args.stream, sink_kind=args.sink)
+            except FileNotFoundError as e:
+                print(f"❌ {e}")
+                print("   請先執行一次完整分析")
+                return 1
+        elif args.stream:
+            engine.run_streaming(args.sink)
+        else:
+            engine.run()
+    return 0
+
+
+def cmd_estimate(args) -> int:
+    """分層抽樣估算完整執行（只分析樣本，不保存結果、不重命名）"""
+    target_dir = _target_dir(args)
+    if not target_dir.is_dir():
+        print(f"❌ 目錄不存在：{target_dir}", file=sys.stderr)
+        return 1
+    if args.sample <= 0:
+        print("❌ --sample 必須大於 0", file=sys.stderr)
+        return 1
+
+    with _make_engine(args, force_rename=args.force_rename) as engine:
+        engine.estimate(args.sample, seed=args.seed, stream=args.stream, sink_kind=args.sink)
+    return 0
+
+
+def cmd_watch(args) -> int:
+    """監看模式：新圖片寫入完成後立即分析和重命名（Ctrl+C 結束）"""
+    from folder_watcher import FolderWatcher
+    from rename_planner import load_config
+
+    target_dir = _target_dir(args)
+    if not target_dir.is_dir():
+        print(f"❌ 目錄不存在：{target_dir}", file=sys.stderr)
+        return 1
+
+    watch_config = load_config(args.config).get("watch", {}) or {}
+
+    def setting(name, default):
+        value = getattr(args, name)
+        return value if value is not None else watch_config.get(name, default)
+
+    engine = _make_engine(args, delete_original=args.delete_original)
+    from rename_engine import IMAGE_EXTENSIONS
+    try:
+        watcher = FolderWatcher(
+            engine.target_dir, IMAGE_EXTENSIONS,
+            debounce=setting("debounce", 2.0),
+            poll_interval=setting("poll_interval", 2.0),
+            backend=setting("backend", "auto"),
+        )
+    except ValueError as e:
+        engine.close()
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    with engine:
+        engine.watch(watcher, catch_up=not args.no_catch_up, keep_warm=setting("keep_warm", 600))
+    return 0
+
+
+def cmd_shard(args) -> int:
+    """多機分工：以共享目錄的租約領取區塊分析，全部完成後由一台機器規劃和重命名"""
+    import re
+    from rename_planner import load_config
+    from work_leases import ShardStore, CHUNK_SIZE, LEASE_SECONDS, default_worker_name
+
+    target_dir = _target_dir(args)
+    if not target_dir.is_dir():
+        print(f"❌ 目錄不存在：{target_dir}", file=sys.stderr)
+        return 1
+    section = load_config(args.config).get("shard", {}) or {}
+    share_dir = Path(args.share_dir).expanduser() if args.share_dir else target_dir / ".rename_shard"
+    worker = args.worker or default_worker_name()
+    store = ShardStore(share_dir, worker, lease_seconds=args.lease or section.get("lease_seconds", LEASE_SECONDS))
+
+    if args.status:
+        status = store.status()
+        if not status["chunks"]:
+            print(f"ℹ️ 尚未發佈區塊清單：{share_dir}")
+            return 0
+        print(f"🧩 {share_dir}：{status['done']}/{status['chunks']} 個區塊完成，共 {status['files']} 張圖片")
+        for lease in status["active"]:
+            print(f"   🔒 {lease['lease']}：{lease['worker']}（租約剩 {lease['seconds_left']} 秒）")
+        for lease in status["expired"]:
+            print(f"   ⌛ {lease['lease']}：{lease['worker']}（已過期，等待接手）")
+        final = status["final"]
+        if final is not None:
+            print(f"🏁 {final.get('worker')} 已完成規劃和重命名：重命名 {final.get('renamed', 0)} 張，"
+                  f"失敗 {final.get('rename_errors', 0)} 張")
+        return 0
+
+    if store.finalized() is not None:
+        print(f"ℹ️ 共享目錄中的工作已全部完成：{share_dir}")
+        print("   重新分工前請先刪除該目錄")
+        return 0
+
+    # 同一台機器可執行多個工作者：各自使用 session 目錄下的命名空間
+    args.session_dir = args.session_dir / "shards" / re.sub(r'[^\w.-]+', "_", worker)
+    engine = _make_engine(
+        args,
+        force_rename=args.force_rename,
+        delete_original=args.delete_original,
+        limit=args.limit,
+    )
+    with engine, _signal_control(engine):
+        engine.run_shard(store, chunk_size=args.chunk_size or section.get("chunk_size", CHUNK_SIZE),
+                         finalize=not args.no_finalize)
+    return 0
+
+
+def _job_client(args):
+    """依 --server 或組態的 job_server 區段建立任務伺服器的呼叫端"""
+    from job_server import JobClient
+
+    if args.server:
+        return JobClient(args.server)
+    from rename_planner import load_config
+    return JobClient.from_config(load_config(getattr(args, "config", None)))
+
+
+def cmd_serve(args) -> int:
+    """任務伺服器：多個呼叫端共用一個引擎，任務依序執行（Ctrl+C 結束）"""
+    from job_server import JobServer, JobStore, DEFAULT_HOST, DEFAULT_PORT
+    from rename_planner import load_config
+
+    section = load_config(args.config).get("job_server", {}) or {}
+    host = args.host or section.get("host", DEFAULT_HOST)
+    port = args.port or section.get("port", DEFAULT_PORT)
+    store = JobStore(args.session_dir / "jobs.sqlite")
+    server = JobServer(lambda **kwargs: _make_engine(args, **kwargs), store, host, port)
+    try:
+        server.start()
+    except OSError as e:
+        store.close()
+        print(f"❌ 無法在 {host}:{port} 啟動任務伺服器：{e}", file=sys.stderr)
+        return 1
+
+    print(f"🛎️  任務伺服器：http://{host}:{port}（任務佇列：{store.path}，Ctrl+C 結束）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print()
+        print("⏹️  停止任務伺服器（執行中的任務下次啟動時繼續）")
+    finally:
+        server.close()
+    return 0
+
+
+def cmd_submit(args) -> int:
+    """送出重命名任務到任務伺服器"""
+    from job_server import JobError
+
+    target_dir = _target_dir(args)
+    client = _job_client(args)
+    options = {"force_rename": args.force_rename, "delete_original": args.delete_original,
+               "limit": args.limit, "schedule": args.schedule, "priorities": args.priority}
+    try:
+        job = client.submit(target_dir, client="cli", **options)
+    except JobError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    except OSError as e:
+        print(f"❌ 無法連線到任務伺服器 {client.url}：{e}", file=sys.stderr)
+        print("   請先執行 image-rename serve", file=sys.stderr)
+        return 1
+
+    print(f"📨 已送出任務 #{job['id']}：{job['target_dir']}")
+    if not args.wait:
+        return 0
+    try:
+        job = client.follow(job["id"], print)
+    except KeyboardInterrupt:
+        print(f"ℹ️ 任務 #{job['id']} 仍在伺服器上執行（image-rename jobs {job['id']} --cancel 可取消）")
+        return 130
+    print(f"📌 任務 #{job['id']}：{job['state']}")
+    return 0 if job["state"] == "done" else 1
+
+
+def cmd_jobs(args) -> int:
+    """列出任務，或查看 / 暫停 / 繼續 / 取消單一任務"""
+    from job_server import JobError, format_job
+
+    client = _job_client(args)
+    try:
+        if args.job_id is None:
+            jobs = client.jobs()
+            if not jobs:
+                print("ℹ️ 沒有任務")
+            for job in jobs:
+                print(format_job(job))
+            return 0
+        if args.action:
+            job = getattr(client, args.action)(args.job_id)
+        else:
+            job = client.job(args.job_id)
+        print(format_job(job))
+        if args.log:
+            for line in client.log(args.job_id)["lines"]:
+                print(line)
+    except JobError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    except OSError as e:
+        print(f"❌ 無法連線到任務伺服器 {client.url}：{e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+# ----------------------------------------------------------------------
+# 參數解析
+# ----------------------------------------------------------------------
+
+def _add_target_dir(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--target-dir",
+        default=None,
+        help="指定要處理的目錄（默認：當前目錄）"
+    )
+
+
+def _add_session_root(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--target-dir",
+        default=None,
+        help="目標目錄：使用多目錄執行或任務伺服器為該目錄建立的 session 命名空間（默認：--session-dir）"
+    )
+
+
+def _add_config(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--config",
+        default=None,
+        help="組態檔路徑（默認：config/config.yaml）"
+    )
+
+
+def _add_force_rename(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--force-rename",
+        "--override",
+        dest="force_rename",
+        action="store_true",
+        help="強制重新命名已命名的檔案（增量模式）"
+    )
+
+
+def _add_limit(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="限制處理的圖片數量（用於測試，默認：無限制）"
+    )
+
+
+def _add_delete_original(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--delete-original",
+        action="store_true",
+        help="重命名後刪除原檔案"
+    )
+
+
+def _add_events(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--events",
+        action="append",
+        metavar="SPEC",
+        help="輸出 JSON Lines 進度事件：fd:N、unix:PATH、- (stdout，其餘輸出改到 stderr) 或檔案/FIFO 路徑（可重複）"
+    )
+
+
+def _add_trace(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        default=None,
+        help="寫出 Chrome trace / Perfetto 格式的執行追蹤（每張圖片的讀取、編碼、請求、解析、重命名耗時）"
+    )
+
+
+def _add_profile(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="剖析模式：各階段的 CPU 取樣、火焰圖堆疊和記憶體配置報告寫入 session 目錄"
+    )
+
+
+def _add_metrics(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        metavar="PORT",
+        help="在 127.0.0.1:PORT/metrics 提供 Prometheus 格式的即時指標"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        metavar="PATH",
+        help="定期寫入 Prometheus textfile（node_exporter textfile collector 用的 .prom 檔案）"
+    )
+
+
+def _add_deadline(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--deadline",
+        metavar="DURATION",
+        default=None,
+        help="時間預算（例如 2h、90m、1h30m）：落後時降低前處理解析度、精簡提示、改用較小模型"
+             "或延後低優先目錄，領先時恢復完整品質"
+    )
+    parser.add_argument(
+        "--low-priority",
+        action="append",
+        metavar="GLOB",
+        help="期限模式中最低等級延後處理的目錄（相對於目標目錄的 glob，可重複）"
+    )
+
+
+def _add_schedule(parser: argparse.ArgumentParser):
+    from work_scheduler import POLICY_LABELS
+
+    parser.add_argument(
+        "--schedule",
+        choices=list(POLICY_LABELS),
+        default=None,
+        help="分析順序：" + "、".join(f"{name}（{label}）" for name, label in POLICY_LABELS.items())
+             + "（默認：組態 analysis.schedule 或 path）"
+    )
+    parser.add_argument(
+        "--priority",
+        action="append",
+        metavar="GLOB",
+        help="優先分析的資料夾（相對於目標目錄的 glob，可重複，依指定順序處理）"
+    )
+
+
+def _add_server(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--server",
+        default=None,
+        metavar="URL",
+        help="任務伺服器位址（默認：組態 job_server 的 host / port，即 http://127.0.0.1:8790）"
+    )
+
+
+def add_run_arguments(parser: argparse.ArgumentParser):
+    """run 子命令的參數（與 full_batch_rename_execute.py 相同）"""
+    _add_force_rename(parser)
+    parser.add_argument(
+        "--target-dir",
+        action="append",
+        default=None,
+        help="指定要處理的目錄（可重複指定多個目錄，默認：當前目錄）"
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        metavar="FILE",
+        help="目錄清單檔（每行一個目錄，# 開頭為註解），與 --target-dir 合併處理"
+    )
+    _add_limit(parser)
+    _add_delete_original(parser)
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="串流模式：逐目錄處理，結果邊產生邊寫入輸出槽（適用於超大圖庫）"
+    )
+    parser.add_argument(
+        "--sink",
+        choices=["jsonl", "sqlite"],
+        default="jsonl",
+        help="串流模式的輸出槽類型（sqlite 支援中斷後恢復，默認：jsonl）"
+    )
+    _add_config(parser)
+    _add_events(parser)
+    _add_trace(parser)
+    _add_metrics(parser)
+    _add_profile(parser)
+    _add_deadline(parser)
+    _add_schedule(parser)
+    parser.add_argument(
+        "--replan",
+        action="store_true",
+        help="依目前的命名規則，從已保存的分析結果重新規劃並套用名稱變更（不重新分析）"
+    )
+    parser.add_argument(
+        "--analysis-file",
+        default=None,
+        help="重新規劃時使用的分析結果檔（.json/.jsonl/.sqlite，默認：session 目錄中的最新結果）"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """建立命令行參數解析器"""
+    parser = argparse.ArgumentParser(
+        prog="image-rename",
+        description="圖片智能命名系統 - 使用 Qwen3-VL 進行視覺分析和重命名"
+    )
+    parser.add_argument(
+        "--session-dir",
+        type=Path,
+        default=SESSION_DIR,
+        help="session 目錄（分析結果、計畫、報告，默認：data/session）"
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>")
+    subparsers.required = True
+
+    scan = subparsers.add_parser("scan", help="掃描目錄，統計已命名 / 未命名的圖片")
+    _add_target_dir(scan)
+    scan.add_argument("--porcelain", action="store_true", help="只輸出「總數 未命名數 已命名數」供腳本讀取")
+    scan.add_argument("-v", "--verbose", action="store_true", help="列出每個目錄的統計")
+    scan.set_defaults(func=cmd_scan)
+
+    dedup = subparsers.add_parser("dedup", help="偵測並刪除內容重複的圖片")
+    _add_target_dir(dedup)
+    dedup.add_argument("--dry-run", action="store_true", help="只列出重複檔案，不刪除")
+    dedup.set_defaults(func=cmd_dedup)
+
+    analyze = subparsers.add_parser("analyze", help="分析圖片並保存分析結果（不重命名）")
+    _add_target_dir(analyze)
+    _add_config(analyze)
+    _add_force_rename(analyze)
+    _add_limit(analyze)
+    _add_events(analyze)
+    _add_trace(analyze)
+    _add_metrics(analyze)
+    _add_profile(analyze)
+    _add_deadline(analyze)
+    _add_schedule(analyze)
+    analyze.set_defaults(func=cmd_analyze)
+
+    plan = subparsers.add_parser("plan", help="從已保存的分析結果生成命名對照表")
+    _add_target_dir(plan)
+    _add_config(plan)
+    _add_trace(plan)
+    _add_profile(plan)
+    plan.add_argument("--analysis-file", default=None, help="分析結果檔（默認：session 目錄中的完整分析結果）")
+    plan.set_defaults(func=cmd_plan)
+
+    apply = subparsers.add_parser("apply", help="套用命名對照表")
+    _add_target_dir(apply)
+    _add_config(apply)
+    _add_delete_original(apply)
+    _add_events(apply)
+    _add_trace(apply)
+    _add_metrics(apply)
+    _add_profile(apply)
+    apply.add_argument("--plan-file", default=None, help="命名對照表（默認：session 目錄中的 qwen_rename_plan_complete.json）")
+    apply.set_defaults(func=cmd_apply)
+
+    undo = subparsers.add_parser("undo", help="復原最近一次的重命名")
+    _add_session_root(undo)
+    undo.set_defaults(func=cmd_undo)
+
+    status = subparsers.add_parser("status", help="顯示最近一次執行的進度和報告")
+    _add_session_root(status)
+    status.set_defaults(func=cmd_status)
+
+    run = subparsers.add_parser("run", help="完整流程：分析 → 規劃 → 重命名")
+    add_run_arguments(run)
+    run.set_defaults(func=cmd_run)
+
+    estimate = subparsers.add_parser("estimate", help="分層抽樣估算完整執行的耗時、傳輸量和 token 用量")
+    _add_target_dir(estimate)
+    _add_config(estimate)
+    _add_force_rename(estimate)
+    estimate.add_argument("--sample", type=int, default=50,
+                          help="樣本數（依目錄、副檔名、檔案大小分層配置，默認：50）")
+    estimate.add_argument("--seed", type=int, default=None, help="抽樣的隨機種子（默認：每次不同）")
+    estimate.add_argument("--stream", action="store_true",
+                          help="以串流模式的既有結果計算沿用數（搭配 --sink sqlite）")
+    estimate.add_argument("--sink", choices=["jsonl", "sqlite"], default="jsonl",
+                          help="串流模式的輸出槽類型（默認：jsonl）")
+    _add_events(estimate)
+    _add_trace(estimate)
+    estimate.set_defaults(func=cmd_estimate)
+
+    watch = subparsers.add_parser("watch", help="監看目錄，新圖片寫入完成後立即分析和重命名")
+    _add_target_dir(watch)
+    _add_config(watch)
+    _add_delete_original(watch)
+    watch.add_argument("--debounce", type=float, default=None,
+                       help="檔案大小和修改時間連續幾秒不變才視為寫入完成（默認：組態 watch.debounce 或 2）")
+    watch.add_argument("--backend", choices=["auto", "watchdog", "poll"], default=None,
+                       help="監看方式：watchdog（作業系統檔案事件）或 poll（輪詢目錄），"
+                            "auto 在已安裝 watchdog 時使用（默認：組態 watch.backend 或 auto）")
+    watch.add_argument("--poll-interval", type=float, default=None,
+                       help="輪詢間隔秒數（默認：組態 watch.poll_interval 或 2）")
+    watch.add_argument("--keep-warm", type=float, default=None,
+                       help="閒置超過幾秒送出預熱請求，避免模型被卸載，0 表示不送（默認：組態 watch.keep_warm 或 600）")
+    watch.add_argument("--no-catch-up", action="store_true",
+                       help="不處理開始監看前已存在的未命名圖片")
+    _add_schedule(watch)
+    _add_events(watch)
+    _add_metrics(watch)
+    watch.set_defaults(func=cmd_watch)
+
+    shard = subparsers.add_parser("shard", help="多機分工：共享目錄的租約分配區塊，最後由一台機器規劃和重命名")
+    _add_target_dir(shard)
+    _add_config(shard)
+    _add_force_rename(shard)
+    _add_delete_original(shard)
+    _add_limit(shard)
+    shard.add_argument("--share-dir", default=None,
+                       help="所有機器共用的目錄（租約、結果、完成標記，默認：目標目錄下的 .rename_shard）")
+    shard.add_argument("--worker", default=None, help="工作者名稱（默認：主機名稱-行程編號）")
+    shard.add_argument("--chunk-size", type=int, default=None,
+                       help="每個區塊的圖片數（只在發佈區塊清單時使用，默認：組態 shard.chunk_size 或 50）")
+    shard.add_argument("--lease", type=float, default=None,
+                       help="租約秒數，超過未續約由其他機器接手（默認：組態 shard.lease_seconds 或 120）")
+    shard.add_argument("--no-finalize", action="store_true",
+                       help="只分析，不參與最後的規劃和重命名")
+    shard.add_argument("--status", action="store_true", help="只顯示共享目錄的分工進度")
+    _add_events(shard)
+    _add_metrics(shard)
+    shard.set_defaults(func=cmd_shard)
+
+    serve = subparsers.add_parser("serve", help="啟動本機任務伺服器（GUI、腳本、cron 共用一個引擎排隊執行）")
+    _add_config(serve)
+    serve.add_argument("--host", default=None, help="綁定位址（默認：組態 job_server.host 或 127.0.0.1）")
+    serve.add_argument("--port", type=int, default=None, help="埠號（默認：組態 job_server.port 或 8790）")
+    _add_events(serve)
+    _add_metrics(serve)
+    serve.set_defaults(func=cmd_serve, target_dir=None)
+
+    submit = subparsers.add_parser("submit", help="送出重命名任務到任務伺服器")
+    _add_target_dir(submit)
+    _add_config(submit)
+    _add_force_rename(submit)
+    _add_limit(submit)
+    _add_delete_original(submit)
+    _add_schedule(submit)
+    _add_server(submit)
+    submit.add_argument("--wait", action="store_true", help="輸出任務日誌直到任務結束（結束碼依任務結果）")
+    submit.set_defaults(func=cmd_submit)
+
+    jobs = subparsers.add_parser("jobs", help="列出任務伺服器的任務，或查看 / 暫停 / 繼續 / 取消任務")
+    jobs.add_argument("job_id", type=int, nargs="?", default=None, help="任務編號（省略時列出最近的任務）")
+    action = jobs.add_mutually_exclusive_group()
+    for name, label in (("pause", "暫停"), ("resume", "繼續"), ("cancel", "取消")):
+        action.add_argument(f"--{name}", dest="action", action="store_const", const=name, help=f"{label}任務")
+    jobs.add_argument("--log", action="store_true", help="輸出任務最近的日誌")
+    _add_config(jobs)
+    _add_server(jobs)
+    jobs.set_defaults(func=cmd_jobs)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    from run_control import RunCancelled
+
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except RunCancelled:
+        # 進度已由引擎保存，再次執行同一命令即從中斷處繼續
+        print("⏹️  已取消（再次執行即從中斷處繼續）", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
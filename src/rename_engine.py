@@ -0,0 +1,1849 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+圖片智能命名引擎 - 可重複使用的 RenameEngine
+
+功能：
+- 明確的階段方法：scan → analyze → plan → apply（run() 依序執行全部）
+- 串流模式（run_streaming）和重新規劃模式（replan）
+- 多機分工模式（run_shard）：多台機器以共享目錄的租約領取區塊分析，最後由一台規劃和重命名
+- 多目錄模式（run_roots）：同一個引擎依序處理多個目標目錄，各目錄有獨立的 session 命名空間
+- 監看模式（watch）：新圖片寫入完成後立即處理，引擎和模型連線在兩批之間保持就緒
+- 估算模式（estimate）：分層抽樣分析少量圖片，推估完整執行的耗時、傳輸量和 token 用量
+- 進度和日誌回呼（on_progress、on_log），不必解析 stdout
+- 結構化進度事件（event_sinks），每張圖片的耗時和錯誤都可訂閱
+- 持久化 HTTP 連線（requests.Session），同一行程中可連續執行多個任務
+- 每個套用的重命名寫入 rename_journal.jsonl，可用 undo 復原
+- 可選的執行追蹤（tracer），每張圖片的讀取、編碼、請求、解析、重命名各記錄一個 span
+- 可選的即時指標（metrics），以 HTTP 端點或 textfile 提供 Prometheus 格式
+- 可選的剖析模式（profile），各階段的 CPU 取樣和記憶體配置報告寫入 session 目錄
+- 可選的期限模式（deadline），落後時降低前處理解析度、精簡提示、改用較小模型或延後低優先目錄
+- 分析順序可依排程策略（路徑、最新、小檔、目錄輪流）和資料夾優先順序排列，執行中可用 set_schedule() 調整
+- 暫停 / 繼續 / 取消（control，見 run_control.py）：暫停和取消時立即保存分析進度，
+  下次執行從 qwen_analysis_progress.json 繼續
+
+設計原理：
+- 匯入模組不產生副作用（不解析參數、不建立目錄、不掃描磁碟）
+- requests 延遲到建立引擎時才匯入，只掃描或查詢狀態的命令行啟動更快
+- 命令行（full_batch_rename_execute.py）和 GUI 都只是引擎的呼叫端
+- 引擎實例可切換目標目錄重複使用，連線和組態只初始化一次
+
+使用方式：
+    from rename_engine import RenameEngine
+
+    with RenameEngine("/path/to/images") as engine:
+        report = engine.run()
+"""
+
+import base64
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from progress_tracker import ProgressTracker, SNAPSHOT_INTERVAL
+from records import AnalysisRecord, PlanEntry, dump_records
+from rename_journal import RenameJournal
+from rename_planner import load_config, NamingRules, IncrementalPlanner, with_suffix
+from result_sinks import open_sink, iter_stored_records, RunningReport
+from token_usage import TokenUsageReport, extract_usage, image_dimensions
+from trace_spans import NULL_TRACER, traced_stage
+from run_control import RunCancelled, RunControl
+from work_scheduler import WorkQueue, policy_names
+
+# 配置
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_DIR = PROJECT_ROOT / "data"
+LOGS_DIR = PROJECT_ROOT / "logs"
+SESSION_DIR = DATA_DIR / "session"
+
+LM_STUDIO_API = "http://127.0.0.1:1234/v1/chat/completions"
+DEFAULT_MODEL = "qwen/qwen3-vl-30b"
+BATCH_SIZE = 10  # 每批 10 張圖片
+REQUEST_DELAY = 0.5  # 每張圖片分析後的延遲（秒）
+REQUEST_TIMEOUT = 60  # 單次請求逾時（秒）
+MAX_RETRIES = 3
+RETRY_DELAY = 2  # 重試前等待（秒）
+REPLAN_TRACE_LIMIT = 100  # replan 沿重命名日誌往回追溯的最大步數
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp'}
+
+ANALYSIS_PROMPT = """請深度分析這張圖片並用台灣繁體中文回答。返回 JSON 格式的結果（只返回 JSON，不要其他文字）：
+
+{
+  "image_title": "圖片中的標題文字（如無標題則為 'N/A'）",
+  "main_theme": "核心主題分類（如：財經、技術、設計、報告等）",
+  "sub_theme": "子分類（如：投資分析、AI系統、創意設計等）",
+  "core_content": "圖片的具體核心內容（關鍵詞或短句，20字以內）",
+  "recommended_name": "推薦命名（格式：主題_子主題_具體標題，最多25字，不含日期）"
+}"""
+
+# 期限模式的低品質等級使用的精簡提示（欄位相同）
+ANALYSIS_PROMPT_SHORT = """用台灣繁體中文只返回 JSON：
+{"image_title": "標題或 N/A", "main_theme": "主題", "sub_theme": "子主題", "core_content": "20字內", "recommended_name": "主題_子主題_標題"}"""
+
+_CHINESE_RE = re.compile(r'[\u4e00-\u9fff]')
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+# on_progress(stage, current, total, eta_seconds)；stage 為 "分析" 或 "重命名"
+ProgressCallback = Callable[[str, int, int, float], None]
+# on_log(text)；text 含行尾換行（與 print 的輸出相同）
+LogCallback = Callable[[str], None]
+
+
+def is_already_renamed(filename: str) -> bool:
+    """檢測檔案是否已被命名（檔名包含中文字符）"""
+    return bool(_CHINESE_RE.search(filename))
+
+
+def encode_image_to_base64(image_path: Path) -> str:
+    """將圖片編碼為 base64"""
+    with open(image_path, "rb") as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+
+def get_image_media_type(image_path: Path) -> str:
+    """根據副檔名確定 MIME 類型"""
+    ext = image_path.suffix.lower()
+    return {
+        '.png': 'image/png',
+        '.jpg': 'image/jpeg',
+        '.jpeg': 'image/jpeg',
+        '.webp': 'image/webp',
+        '.gif': 'image/gif'
+    }.get(ext, 'image/png')
+
+
+def iter_image_directories(root: Path) -> Iterator[Tuple[Path, List[Path]]]:
+    """
+    逐目錄產生圖片清單（os.walk，同一時間只持有單一目錄的檔案列表）
+
+    Yields:
+        (目錄路徑, 該目錄下排序後的圖片路徑列表)
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        files = sorted(
+            Path(dirpath) / name for name in filenames
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        )
+        if files:
+            yield Path(dirpath), files
+
+
+def count_images(root: Path) -> int:
+    """只計數不保存路徑的掃描（用於串流模式的進度總數）"""
+    return sum(len(files) for _, files in iter_image_directories(root))
+
+
+class RenameEngine:
+    """圖片分析和重命名引擎"""
+
+    def __init__(self, target_dir: Path,
+                 session_dir: Path = SESSION_DIR,
+                 config: Optional[Dict] = None,
+                 config_path: Optional[Path] = None,
+                 force_rename: bool = False,
+                 delete_original: bool = False,
+                 limit: Optional[int] = None,
+                 api_url: Optional[str] = None,
+                 model: Optional[str] = None,
+                 request_delay: Optional[float] = None,
+                 on_progress: Optional[ProgressCallback] = None,
+                 on_log: Optional[LogCallback] = None,
+                 event_sinks: Optional[List] = None,
+                 progress_lines: bool = True,
+                 tracer=NULL_TRACER,
+                 metrics=None,
+                 profile: bool = False,
+                 deadline=None,
+                 schedule: Optional[str] = None,
+                 priorities: Optional[List[str]] = None):
+        """
+        初始化引擎
+
+        Args:
+            target_dir: 要處理的圖片目錄
+            session_dir: session 目錄（分析結果、計畫、報告）
+            config: 組態 dict（優先於 config_path）
+            config_path: 組態檔路徑（默認：config/config.yaml）
+            force_rename: 強制重新分析已命名的檔案
+            delete_original: 重命名時移動（而非複製）原檔案
+            limit: 限制處理的圖片數量（測試用）
+            api_url: OpenAI 相容的 chat/completions 端點（默認：組態 lm_studio 的 host / port）
+            model: 模型名稱（默認：組態 lm_studio.model）
+            request_delay: 每張圖片分析後的延遲秒數（默認：組態 analysis.request_delay）
+            on_progress: 進度回呼（未設定時輸出 [進度] 行）
+            on_log: 日誌回呼（未設定時輸出到 stdout）
+            event_sinks: 進度事件輸出槽（見 progress_events.py），close() 時一併關閉
+            progress_lines: 未設定 on_progress 時是否輸出 [進度] 行
+                （已有事件訂閱端時可關閉，省去每張圖片的格式化輸出）
+            tracer: 執行追蹤器（見 trace_spans.py），close() 時寫出追蹤檔
+            metrics: 即時指標（metrics.EngineMetrics），close() 時停止輸出
+            profile: 以取樣式剖析器和 tracemalloc 執行，close() 時寫出報告（見 profiler.py）
+            deadline: 期限控制器（quality_tiers.DeadlineController），依時間預算切換品質等級
+            schedule: 分析順序的排程策略（見 work_scheduler.py，默認：組態 analysis.schedule 或 path）
+            priorities: 優先處理的資料夾（glob 列表，默認：組態 analysis.priorities）
+        """
+        self.session_dir = Path(session_dir)
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        self.config = config if config is not None else load_config(config_path)
+        self.rules = NamingRules.from_config(self.config)
+        self.force_rename = force_rename
+        self.delete_original = delete_original
+        self.limit = limit
+        lm_config = self.config.get("lm_studio", {}) or {}
+        analysis_config = self.config.get("analysis", {}) or {}
+        if api_url is None and "host" in lm_config and "port" in lm_config:
+            api_url = f"http://{lm_config['host']}:{lm_config['port']}/v1/chat/completions"
+        self.api_url = api_url or LM_STUDIO_API
+        self.model = model or lm_config.get("model", DEFAULT_MODEL)
+        self.request_delay = request_delay if request_delay is not None \
+            else analysis_config.get("request_delay", REQUEST_DELAY)
+        self.request_timeout = analysis_config.get("request_timeout", REQUEST_TIMEOUT)
+        self.max_retries = analysis_config.get("max_retries", MAX_RETRIES)
+        self.retry_delay = analysis_config.get("retry_delay", RETRY_DELAY)
+        self.on_progress = on_progress
+        self.on_log = on_log
+        self.event_sinks = list(event_sinks or [])
+        self.progress_lines = progress_lines
+        self.tracer = tracer
+        self.metrics = metrics
+        self.deadline = deadline
+        self.work_queue: Optional[WorkQueue] = None
+        # 暫停 / 取消（其他線程呼叫 self.control.pause() 等，見 run_control.py）
+        self.control = RunControl()
+        self.schedule_policy = "path"
+        self.schedule_priorities: List[str] = []
+        self.set_schedule(schedule or analysis_config.get("schedule") or "path",
+                          priorities if priorities is not None else analysis_config.get("priorities") or [])
+        if metrics is not None:
+            metrics.bind(self)
+            self.event_sinks.append(metrics.event_sink())
+
+        # 持久化 HTTP 連線（keep-alive），跨任務重複使用
+        import requests
+        self.http = requests.Session()
+        self.http.headers.update({"Content-Type": "application/json"})
+
+        # 重命名日誌（undo 依此復原）
+        self.journal = RenameJournal(self.session_dir / "rename_journal.jsonl")
+
+        self.progress: Optional[ProgressTracker] = None
+        self.last_analysis_rate: Optional[Dict] = None
+        self.last_token_usage: Optional[Dict] = None
+        self.planner: Optional[IncrementalPlanner] = None
+        self.target_dir: Optional[Path] = None
+        self.set_target_dir(target_dir)
+
+        # 剖析模式：階段依 ProgressTracker 的 phase 判斷（切換目標目錄後仍有效）
+        self.profile_session = None
+        if profile:
+            from profiler import ProfileSession, PHASE_STAGES
+            self.profile_session = ProfileSession(
+                self.session_dir,
+                stage_fn=lambda: PHASE_STAGES.get(self.progress.phase, self.progress.phase)
+            )
+            self.profile_session.start()
+
+    # ------------------------------------------------------------------
+    # 生命週期
+    # ------------------------------------------------------------------
+
+    def set_target_dir(self, target_dir: Path, session_dir: Optional[Path] = None):
+        """
+        切換目標目錄（連線和組態沿用，進度和命名配置重新綁定）
+
+        Args:
+            target_dir: 新的目標目錄
+            session_dir: 一併切換 session 目錄（多目錄模式的命名空間，None：不變）
+        """
+        self.target_dir = Path(target_dir).expanduser()
+        if session_dir is not None and Path(session_dir) != self.session_dir:
+            self.session_dir = Path(session_dir)
+            self.session_dir.mkdir(parents=True, exist_ok=True)
+            self.journal.close()
+            self.journal = RenameJournal(self.session_dir / "rename_journal.jsonl")
+        if self.planner is not None:
+            self.planner.close()
+        self.planner = IncrementalPlanner(
+            self.rules, self.session_dir / "rename_allocations.sqlite", self.target_dir
+        )
+        if self.progress is not None:
+            self.progress.close()
+        logging_config = self.config.get("logging", {}) or {}
+        self.progress = ProgressTracker(
+            self.session_dir, "rename", sinks=self.event_sinks,
+            snapshot_interval=logging_config.get("progress_snapshot_interval", SNAPSHOT_INTERVAL)
+        )
+
+    def close(self):
+        """關閉連線、日誌、資料庫和追蹤檔（剖析模式下寫出剖析報告）"""
+        if self.profile_session is not None:
+            paths = self.profile_session.stop()
+            self.profile_session = None
+            self.log("🔬 剖析報告：")
+            for path in paths:
+                self.log(f"   {path}")
+        self.http.close()
+        self.journal.close()
+        if self.progress is not None:
+            self.progress.close()
+        for sink in self.event_sinks:
+            sink.close()
+        if self.planner is not None:
+            self.planner.close()
+            self.planner = None
+        self.tracer.close()
+        if self.metrics is not None:
+            self.metrics.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # 輸出
+    # ------------------------------------------------------------------
+
+    def log(self, message: str = "", end: str = "\n"):
+        """輸出日誌（交給 on_log 或 stdout）"""
+        if self.on_log is not None:
+            self.on_log(message + end)
+        else:
+            print(message, end=end, flush=True)
+
+    def report_progress(self, stage: str, current: int, total: int):
+        """回報進度（交給 on_progress，或輸出 GUI/腳本可解析的 [進度] 行）"""
+        if self.on_progress is None and not self.progress_lines:
+            return
+        eta, low, high = self.progress.get_eta_band()
+        if self.on_progress is not None:
+            self.on_progress(stage, current, total, eta)
+        else:
+            progress_pct = int(current * 100 / total) if total else 0
+            eta_str = self.progress.format_eta(eta, low, high)
+            self.log(f"[進度] {stage}: {progress_pct}% | {current}/{total} | ETA: {eta_str}")
+
+    # ------------------------------------------------------------------
+    # 階段 1：掃描
+    # ------------------------------------------------------------------
+
+    @traced_stage("scan")
+    def scan(self, image_files: Optional[List[Path]] = None) -> List[Path]:
+        """
+        掃描目標目錄（遞迴），增量模式下排除已命名的檔案
+
+        Args:
+            image_files: 呼叫端已掃描好的圖片清單（例如 GUI 的資料夾統計），提供時不再走訪磁碟
+        """
+        if image_files is None:
+            image_files = [
+                f for f in self.target_dir.rglob("*")
+                if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS
+            ]
+        image_files = sorted(image_files)
+
+        # 應用限制（用於測試）
+        if self.limit:
+            image_files = image_files[:self.limit]
+
+        self.total_images = len(image_files)
+        if self.limit:
+            self.log(f"📊 掃描結果：找到 {len(image_files)} 個圖片檔案（已限制為 {self.limit} 張用於測試）")
+        else:
+            self.log(f"📊 掃描結果：找到 {len(image_files)} 個圖片檔案")
+
+        # 檢測已命名和未命名的檔案
+        if not self.force_rename:
+            unnamed_files = [f for f in image_files if not is_already_renamed(f.stem)]
+            renamed_count = len(image_files) - len(unnamed_files)
+
+            self.log(f"   已命名：{renamed_count} 個")
+            self.log(f"   未命名：{len(unnamed_files)} 個")
+
+            if renamed_count:
+                self.log("   💡 提示：已命名的檔案將被跳過。使用 --force-rename 重新分析所有檔案")
+
+            # 增量模式：只處理未命名的檔案
+            image_files = unnamed_files
+            self.log()
+            self.log(f"⚙️  開始處理 {len(image_files)} 個未命名的檔案...")
+        else:
+            self.log(f"   批次大小：{BATCH_SIZE} 張/批")
+            self.log(f"   預計批次數：{(len(image_files) + BATCH_SIZE - 1) // BATCH_SIZE}")
+            self.log()
+
+        self.log()
+        self.progress.start_scan(len(image_files))
+        self.progress.complete_scan()
+        return image_files
+
+    # ------------------------------------------------------------------
+    # 階段 2：分析
+    # ------------------------------------------------------------------
+
+    def analyze_image(self, image_path: Path, retry_count: Optional[int] = None,
+                      tier=None) -> AnalysisRecord:
+        """
+        使用 Qwen3-VL 分析單張圖片（含重試機制，次數默認為組態 analysis.max_retries）
+
+        Args:
+            tier: 品質等級（quality_tiers.QualityTier），提供時依等級縮圖、精簡提示或改用模型，
+                並記錄在結果的 quality_tier 欄位
+        """
+        filename = str(image_path.relative_to(self.target_dir))
+        retry_count = retry_count or self.max_retries
+        span = self.tracer.span
+
+        with span("image", cat="image", file=filename) as image_span:
+            for attempt in range(retry_count):
+                try:
+                    # 讀取並編碼圖片
+                    with span("read") as step:
+                        image_bytes = image_path.read_bytes()
+                        step.set(bytes=len(image_bytes))
+                    media_type = get_image_media_type(image_path)
+                    sent_bytes = image_bytes
+                    if tier is not None and tier.max_edge:
+                        from quality_tiers import downscale
+                        with span("downscale", max_edge=tier.max_edge) as step:
+                            sent_bytes, scaled_type = downscale(image_bytes, tier.max_edge)
+                            media_type = scaled_type or media_type
+                            step.set(bytes=len(sent_bytes))
+                    with span("encode"):
+                        image_base64 = base64.b64encode(sent_bytes).decode('utf-8')
+
+                    with span("preprocess"):
+                        if tier is None:
+                            payload = self.build_payload(media_type, image_base64)
+                        else:
+                            payload = self.build_payload(
+                                media_type, image_base64,
+                                prompt=ANALYSIS_PROMPT_SHORT if tier.short_prompt else ANALYSIS_PROMPT,
+                                model=tier.model,
+                            )
+                        body = json.dumps(payload).encode('utf-8')
+
+                    with span("request", attempt=attempt + 1, bytes=len(body)) as step:
+                        request_started = time.perf_counter()
+                        response = self.control.call(self.post_request, body)
+                        request_seconds = time.perf_counter() - request_started
+                        step.set(status=response.status_code)
+                        response.raise_for_status()
+
+                    # 解析回應
+                    with span("parse"):
+                        result = response.json()
+                        analysis_text = result['choices'][0]['message']['content']
+
+                        # 提取 JSON
+                        try:
+                            analysis_json = json.loads(analysis_text)
+                        except json.JSONDecodeError:
+                            json_match = _JSON_OBJECT_RE.search(analysis_text)
+                            if json_match:
+                                analysis_json = json.loads(json_match.group())
+                            else:
+                                raise ValueError("無法解析回應")
+
+                        usage = extract_usage(result)
+                        if usage is not None:
+                            usage["request_seconds"] = round(request_seconds, 3)
+                            usage["image_bytes"] = len(sent_bytes)
+                            dimensions = image_dimensions(sent_bytes)
+                            if dimensions:
+                                usage["width"], usage["height"] = dimensions
+
+                    image_span.set(status="success", attempts=attempt + 1)
+                    extra = {}
+                    if usage:
+                        extra["usage"] = usage
+                    if tier is not None:
+                        extra["quality_tier"] = tier.name
+                    return AnalysisRecord(filename, "success", analysis=analysis_json, extra=extra)
+
+                except RunCancelled:
+                    image_span.set(status="cancelled", attempts=attempt + 1)
+                    raise
+                except Exception as e:
+                    if self.metrics is not None:
+                        self.metrics.request_errors.labels(type(e).__name__).inc()
+                    if attempt < retry_count - 1:
+                        if self.metrics is not None:
+                            self.metrics.request_retries.inc()
+                        with span("retry_wait", error=str(e)):
+                            self.control.sleep(self.retry_delay)  # 重試前等待（取消時立即中止）
+                        continue
+                    image_span.set(status="error", attempts=attempt + 1)
+                    return AnalysisRecord(filename, "error", error=str(e),
+                                          extra={"quality_tier": tier.name} if tier is not None else None)
+
+    def build_payload(self, media_type: str, image_base64: str,
+                      prompt: str = ANALYSIS_PROMPT, model: Optional[str] = None) -> Dict:
+        """組成 chat/completions 請求內容（model 未指定時使用引擎的模型）"""
+        return {
+            "model": model or self.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{media_type};base64,{image_base64}"
+                            }
+                        },
+                        {
+                            "type": "text",
+                            "text": prompt
+                        }
+                    ]
+                }
+            ],
+            "temperature": 0.3,
+            "max_tokens": 500
+        }
+
+    def post_request(self, body: bytes):
+        """送出已序列化的 chat/completions 請求（更新請求相關指標）"""
+        metrics = self.metrics
+        if metrics is None:
+            return self.http.post(self.api_url, data=body, timeout=self.request_timeout)
+
+        metrics.requests_in_flight.inc()
+        metrics.request_bytes.inc(len(body))
+        started = time.perf_counter()
+        try:
+            return self.http.post(self.api_url, data=body, timeout=self.request_timeout)
+        finally:
+            metrics.request_seconds.observe(time.perf_counter() - started)
+            metrics.requests_in_flight.dec()
+
+    @traced_stage("analysis")
+    def analyze(self, image_files: List[Path]) -> List[AnalysisRecord]:
+        """
+        批量分析圖片（每批、暫停和取消時保存一次進度），完成後保存完整分析結果
+
+        若 session 中有 qwen_vision_analysis_sample.json，先沿用其中的結果；
+        上次執行中斷（取消、暫停後結束或當機）時，從 qwen_analysis_progress.json 繼續。
+        """
+        analysis_results: List[AnalysisRecord] = []
+
+        # 加載之前的結果（如果有）
+        previous_results_file = self.session_dir / "qwen_vision_analysis_sample.json"
+        if previous_results_file.exists():
+            self.log("📂 加載之前的樣本分析結果...")
+            analysis_results = [AnalysisRecord.from_dict(r) for r in iter_stored_records(previous_results_file)]
+            self.log(f"   已加載 {len(analysis_results)} 個結果")
+            processed_files = {r.filename for r in analysis_results}
+            remaining_files = [f for f in image_files
+                               if str(f.relative_to(self.target_dir)) not in processed_files]
+            self.log(f"   剩餘待分析：{len(remaining_files)} 張")
+            self.log()
+        else:
+            remaining_files = image_files
+
+        resumed = self.load_analysis_checkpoint(remaining_files)
+        if resumed:
+            self.log(f"📂 從上次中斷的位置繼續：沿用 {len(resumed)} 個分析結果")
+            analysis_results.extend(resumed.values())
+            remaining_files = [f for f in remaining_files
+                               if str(f.relative_to(self.target_dir)) not in resumed]
+            self.log(f"   剩餘待分析：{len(remaining_files)} 張")
+            self.log()
+
+        # 批量處理圖片
+        self.log("🚀 開始全量分析...")
+        self.log()
+        loaded = len(analysis_results)
+        stage_total = loaded + len(remaining_files)
+        self.progress.start_analysis(total=stage_total, already_done=loaded)
+
+        total_processed = loaded
+        token_usage = TokenUsageReport()
+        successful = sum(1 for r in analysis_results if r.succeeded)
+        failed = total_processed - successful
+
+        # 期限模式：延後的低優先檔案在第二輪處理（時間用完時列為未處理）
+        deadline = self.deadline
+        if deadline is not None:
+            deadline.start()
+
+        # 進度檢查點：每批、暫停和取消時保存，下次執行時從這裡繼續
+        def save_checkpoint(state: str):
+            self.save_analysis_checkpoint(analysis_results, state, {
+                "total_processed": total_processed,
+                "successful": successful,
+                "failed": failed,
+            })
+
+        # 分析佇列：依排程策略取檔，執行中可由 set_schedule() 調整（見 work_scheduler.py）
+        pending = remaining_files
+        first_pass = True
+        try:
+            while pending:
+                deferred = []
+                queue = self.work_queue = WorkQueue(pending, self.target_dir, self.schedule_policy,
+                                                    self.schedule_priorities)
+                batch_files = []
+                while True:
+                    img_file = queue.pop()
+                    if img_file is not None:
+                        tier = None
+                        if deadline is not None:
+                            rel_name = str(img_file.relative_to(self.target_dir))
+                            if first_pass and deadline.should_defer(rel_name):
+                                deferred.append(img_file)
+                                deadline.deferred.append(rel_name)
+                                continue
+                            if not first_pass and deadline.time_left() <= 0:
+                                deadline.unprocessed.append(rel_name)
+                                continue
+                            tier = deadline.tier
+
+                        self.checkpoint(lambda: save_checkpoint("paused"))
+                        if not batch_files:
+                            # 更新進度追蹤
+                            self.progress.update_analysis(total_processed // BATCH_SIZE + 1, BATCH_SIZE,
+                                                          total_processed)
+                        batch_files.append(img_file)
+                        self.log(f"   [{len(batch_files)}/{BATCH_SIZE}] {img_file.name[:45]}... ", end="")
+
+                        started = time.perf_counter()
+                        result = self.analyze_image(img_file, tier=tier)
+                        analysis_results.append(result)
+                        token_usage.add(result)
+                        total_processed += 1
+                        self.progress.item_done("analysis", result.filename, result.succeeded,
+                                                time.perf_counter() - started, processed=total_processed,
+                                                error=result.error)
+
+                        if result.succeeded:
+                            successful += 1
+                            self.log("✅")
+                        else:
+                            failed += 1
+                            self.log("❌")
+
+                        # 輸出進度
+                        self.report_progress("分析", total_processed, stage_total)
+
+                        # 稍作延遲
+                        time.sleep(self.request_delay)
+
+                        if deadline is not None:
+                            deadline.observe(result.filename, time.perf_counter() - started)
+                            self.adjust_tier(stage_total - total_processed)
+
+                        if len(batch_files) < BATCH_SIZE:
+                            continue
+                    elif not batch_files:
+                        break
+
+                    self.log()
+
+                    # 每批後保存一次（以防中斷）
+                    save_checkpoint("running")
+                    batch_files = []
+
+                if deferred:
+                    self.log(f"⏳ 處理延後的低優先檔案：{len(deferred)} 張")
+                pending = deferred
+                first_pass = False
+        except RunCancelled:
+            save_checkpoint("cancelled")
+            self.cancelled_at(total_processed, stage_total)
+            raise
+        finally:
+            self.work_queue = None
+        if deadline is not None and deadline.unprocessed:
+            self.log(f"⏰ 期限已到，{len(deadline.unprocessed)} 張延後的檔案未分析（下次執行時處理）")
+
+        self.log("=" * 80)
+        self.log(f"✨ 分析完成：{datetime.now().strftime('%H:%M:%S')}")
+        self.log("=" * 80)
+        self.log(f"總計：{total_processed} 張圖片")
+        self.log(f"成功：{successful} 張 ✅")
+        self.log(f"失敗：{failed} 張 ❌")
+        self.log()
+
+        # 更新進度：完成分析
+        self.last_analysis_rate = self.progress.get_rate_summary()
+        self.last_token_usage = token_usage.to_dict()
+        self.log_rate(self.last_analysis_rate)
+        self.log_token_usage(self.last_token_usage)
+        self.progress.complete_analysis(successful, failed)
+
+        # 保存完整分析結果
+        dump_records(self.session_dir / "qwen_vision_analysis_complete.json", analysis_results, {
+            "timestamp": datetime.now().isoformat(),
+            "total_analyzed": total_processed,
+            "successful": successful,
+            "failed": failed,
+            "api_endpoint": self.api_url,
+            "model": self.model
+        })
+
+        self.log("💾 完整分析結果已保存：")
+        self.log(f"   {self.session_dir / 'qwen_vision_analysis_complete.json'}")
+        self.log()
+        return analysis_results
+
+    # ------------------------------------------------------------------
+    # 暫停 / 繼續 / 取消
+    # ------------------------------------------------------------------
+
+    def checkpoint(self, on_pause: Optional[Callable[[], None]] = None):
+        """
+        安全點（見 run_control.py）：暫停時先保存進度再等待繼續
+
+        Args:
+            on_pause: 暫停時立即保存目前階段的狀態
+
+        Raises:
+            RunCancelled: 任務已取消
+        """
+        def paused():
+            if on_pause is not None:
+                on_pause()
+            self.progress.pause()
+            self.log()
+            self.log("⏸️  已暫停，進度已保存（模型閒置中），等待繼續...")
+
+        if self.control.checkpoint(paused):
+            self.progress.resume()
+            self.log("▶️  繼續執行")
+
+    def cancelled_at(self, processed: int, total: int):
+        """取消後的紀錄（各階段保存自己的狀態後呼叫）"""
+        self.progress.cancel()
+        self.log()
+        self.log(f"⏹️  已取消：{processed}/{total}，進度已保存，下次執行時從此處繼續")
+
+    def save_analysis_checkpoint(self, results: List[AnalysisRecord], state: str, counts: Dict,
+                                 rename_run: Optional[str] = None):
+        """
+        保存分析進度檢查點（qwen_analysis_progress.json，先寫暫存檔再替換）
+
+        Args:
+            state: running / paused / cancelled / renaming
+            counts: total_processed、successful、failed
+            rename_run: 重命名階段使用的日誌 run 編號（見 load_rename_checkpoint）
+        """
+        path = self.session_dir / "qwen_analysis_progress.json"
+        temp_path = path.with_suffix(".json.tmp")
+        metadata = {
+            "timestamp": datetime.now().isoformat(),
+            "target_dir": str(self.target_dir.resolve()),
+            "state": state,
+            **counts,
+        }
+        if rename_run is not None:
+            metadata["rename_run"] = rename_run
+        dump_records(temp_path, results, metadata, list_key="results")
+        os.replace(temp_path, path)
+
+    def _read_checkpoint(self) -> Optional[Dict]:
+        path = self.session_dir / "qwen_analysis_progress.json"
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) \
+                or data.get("metadata", {}).get("target_dir") != str(self.target_dir.resolve()):
+            return None
+        return data
+
+    def load_rename_checkpoint(self) -> Optional[str]:
+        """
+        上次在重命名階段中斷的執行所用的日誌 run 編號
+
+        恢復時沿用同一個 run 編號，apply() 依日誌略過已完成的項目
+        （複製模式的原檔案仍在，否則會再複製一次）
+
+        Returns:
+            run 編號（沒有檢查點、目標目錄不同或中斷於分析階段時為 None）
+        """
+        data = self._read_checkpoint()
+        if data is None:
+            return None
+        return data["metadata"].get("rename_run")
+
+    def load_analysis_checkpoint(self, image_files: List[Path]) -> Dict[str, AnalysisRecord]:
+        """
+        上次中斷的執行已成功分析的結果（只保留仍待分析的檔案）
+
+        Returns:
+            {相對路徑: AnalysisRecord}（沒有檢查點或目標目錄不同時為空）
+        """
+        data = self._read_checkpoint()
+        if data is None:
+            return {}
+        wanted = {str(f.relative_to(self.target_dir)) for f in image_files}
+        resumed = {}
+        for item in data.get("results", []):
+            record = AnalysisRecord.from_dict(item)
+            if record.succeeded and record.filename in wanted:
+                resumed[record.filename] = record
+        return resumed
+
+    def clear_analysis_checkpoint(self):
+        """執行完成後移除檢查點（已無可繼續的進度）"""
+        try:
+            (self.session_dir / "qwen_analysis_progress.json").unlink()
+        except OSError:
+            pass
+
+    def set_schedule(self, policy: Optional[str] = None, priorities: Optional[List[str]] = None):
+        """
+        變更分析順序（分析進行中也可呼叫，從下一張圖片開始生效）
+
+        Args:
+            policy: 排程策略（None：不變）
+            priorities: 優先處理的資料夾 glob（None：不變，空列表：取消）
+
+        Raises:
+            ValueError: 未知的排程策略
+        """
+        queue = self.work_queue
+        if queue is not None:
+            queue.request(policy, priorities)
+        elif policy is not None and policy not in policy_names():
+            raise ValueError(f"未知的排程策略：{policy}（可用：{', '.join(policy_names())}）")
+        if policy is not None:
+            self.schedule_policy = policy
+        if priorities is not None:
+            self.schedule_priorities = list(priorities)
+
+    def adjust_tier(self, remaining: int):
+        """期限模式：依剩餘張數切換品質等級並輸出切換原因"""
+        change = self.deadline.adjust(remaining)
+        if change is None:
+            return
+        fmt = self.progress._format_time
+        reason = "進度落後" if change["projected"] > change["time_left"] else "進度領先"
+        self.log(f"{'⏬' if reason == '進度落後' else '⏫'} {reason}：品質等級 {change['from']} → {change['to']}"
+                 f"（剩餘 {remaining} 張預估 {fmt(change['projected'])}，"
+                 f"{'可用 ' + fmt(change['time_left']) if change['time_left'] > 0 else '已超過期限'}）")
+        self.progress.emit("tier_change", "analysis", tier=change["to"], message=reason,
+                           processed=self.progress.processed_files, total=self.progress.stage_total)
+
+    def log_deadline(self, deadline: Dict):
+        """輸出期限模式的摘要"""
+        fmt = self.progress._format_time
+        status = "✅ 在期限內完成" if deadline["met"] else "⚠️ 超過期限"
+        self.log(f"⏰ {status}：{fmt(deadline['elapsed_seconds'])} / {fmt(deadline['budget_seconds'])}")
+        self.log("   各品質等級：" + "，".join(f"{name} {count} 張"
+                                          for name, count in deadline["images_by_tier"].items() if count))
+        self.log()
+
+    def log_rate(self, rate: Optional[Dict]):
+        """輸出階段吞吐量摘要"""
+        if not rate or not rate["inferences"]:
+            return
+        self.log(
+            f"⏱️  吞吐量：{rate['items_per_second']:.2f} 張/秒 | "
+            f"單張耗時 p50 {rate['latency_p50']:.2f}秒，p95 {rate['latency_p95']:.2f}秒 | "
+            f"推論 {rate['inferences']}，沿用 {rate['cache_hits'] + rate.get('resumed', 0)}"
+        )
+        self.log()
+
+    def log_token_usage(self, usage: Optional[Dict]):
+        """輸出 token 用量摘要"""
+        if not usage or not usage["images"]:
+            return
+        self.log(
+            f"🔢 Token：提示 {usage['prompt_tokens']:,}，輸出 {usage['completion_tokens']:,} | "
+            f"平均每張 提示 {usage['avg_prompt_tokens']:.0f}，輸出 {usage['avg_completion_tokens']:.0f}"
+        )
+        self.log()
+
+    # ------------------------------------------------------------------
+    # 階段 3：規劃
+    # ------------------------------------------------------------------
+
+    def build_plan(self, results: List[AnalysisRecord]) -> List[PlanEntry]:
+        """
+        根據分析結果生成重命名計畫（命名規則來自 config.yaml，含重複名稱的序號處理）
+
+        名稱配置以目錄為單位持久化，只有輸入結果所在的目錄會重新處理衝突。
+        """
+        rename_plan = self.planner.plan(results)
+        if self.planner.last_duplicate_groups:
+            self.log(f"⚠️  警告：檢測到 {self.planner.last_duplicate_groups} 個重複的新名稱")
+        return rename_plan
+
+    @traced_stage("plan")
+    def plan(self, results: List[AnalysisRecord]) -> List[PlanEntry]:
+        """生成並保存命名對照表"""
+        self.log("📋 生成重命名對照表...")
+        rename_plan = self.build_plan(results)
+        dump_records(self.session_dir / "qwen_rename_plan_complete.json", rename_plan)
+
+        self.log(f"✅ 已為 {len(rename_plan)} 個文件生成新名稱")
+        self.log(f"📊 對照表已保存：{self.session_dir / 'qwen_rename_plan_complete.json'}")
+        self.log()
+        return rename_plan
+
+    # ------------------------------------------------------------------
+    # 階段 4：套用
+    # ------------------------------------------------------------------
+
+    def find_free_path(self, path: Path) -> Path:
+        """為已存在的路徑依 duplicate_suffix 加上序號，直到找到未使用的名稱"""
+        candidate = path
+        counter = 1
+        while candidate.exists():
+            candidate = path.with_name(with_suffix(path.name, self.rules, counter))
+            counter += 1
+        return candidate
+
+    def apply_item(self, item: PlanEntry) -> Optional[Path]:
+        """
+        執行單一重命名項目（會就地更新 item.new_filename 以避免覆蓋）
+
+        Returns:
+            新檔案路徑；原檔案不存在時返回 None
+        """
+        old_path = self.target_dir / item.old_filename
+        new_path = self.target_dir / item.new_filename
+
+        if not old_path.exists():
+            return None
+
+        with self.tracer.span("move" if self.delete_original else "copy", cat="image",
+                              file=item.old_filename):
+            # ✅ 確保新檔案的父目錄存在
+            new_path.parent.mkdir(parents=True, exist_ok=True)
+
+            if new_path.exists() and new_path != old_path:
+                # 避免覆蓋現有檔案
+                new_path = self.find_free_path(new_path)
+                item.new_name = new_path.name
+                self.planner.reassign(item)
+
+            # ✅ 根據是否刪除原檔決定使用 copy 或 rename
+            if self.delete_original:
+                # ✅ 如果勾選刪除：使用 rename（move）
+                old_path.rename(new_path)
+            else:
+                # ✅ 如果未勾選刪除：使用 copy（複製）
+                shutil.copy2(old_path, new_path)
+
+            self.journal.record(old_path, new_path, moved=self.delete_original)
+        return new_path
+
+    @traced_stage("rename")
+    def apply(self, rename_plan: List[PlanEntry], plan_path: Optional[Path] = None,
+              run_id: Optional[str] = None) -> Dict:
+        """
+        執行重命名計畫
+
+        Args:
+            rename_plan: 命名計畫
+            plan_path: 結束（含取消）後以實際名稱重寫的命名對照表
+                （名稱衝突時 apply_item 會改用加上序號的名稱，replan 依此找到目前的檔案）
+            run_id: 沿用的日誌 run 編號；該 run 已完成的項目不再執行（取消後恢復）
+
+        Returns:
+            {"renamed": 成功數, "deleted": 刪除原檔數, "errors": 錯誤明細列表}
+        """
+        self.log("🔄 開始執行重命名...")
+        self.log()
+
+        renamed_count = 0
+        deleted_count = 0
+        rename_errors = []
+
+        # 檢查是否有需要重命名的檔案
+        if not rename_plan:
+            self.log("[完成] ℹ️ 沒有找到需要重命名的圖片")
+            self.log("[完成] ✅ 所有操作已完成！")
+            self.log()
+            return {"renamed": 0, "deleted": 0, "errors": []}
+
+        # 更新進度：開始重命名
+        self.progress.start_rename(total=len(rename_plan))
+        self.journal.begin(run_id)
+        done = {}
+        if run_id is not None:
+            done = {entry["old"]: Path(entry["new"]) for entry in self.journal.run_entries(run_id)
+                    if Path(entry["new"]).exists()}
+        if done:
+            self.log(f"📂 從上次中斷的位置繼續：略過已完成的 {len(done)} 項")
+
+        try:
+            for idx, item in enumerate(rename_plan, 1):
+                try:
+                    # 每個項目完成時已寫入重命名日誌，暫停和取消不需額外保存
+                    self.checkpoint()
+                except RunCancelled:
+                    self.cancelled_at(idx - 1, len(rename_plan))
+                    raise
+                started = time.perf_counter()
+                try:
+                    new_path = done.get(str((self.target_dir / item.old_filename).resolve()))
+                    if new_path is not None:
+                        if item.new_name != new_path.name:
+                            item.new_name = new_path.name
+                            self.planner.reassign(item)
+                    else:
+                        new_path = self.apply_item(item)
+                    if new_path is not None:
+                        if self.delete_original:
+                            deleted_count += 1
+
+                        renamed_count += 1
+                        self.log(f"✅ {item.old_filename[:40]:<40} → {new_path.name[:35]}")
+                        self.report_progress("重命名", renamed_count, len(rename_plan))
+
+                        # 更新進度
+                        self.progress.update_rename(idx)
+                        self.progress.item_done("rename", item.old_filename, True,
+                                                time.perf_counter() - started, total=len(rename_plan))
+
+                except Exception as e:
+                    rename_errors.append({
+                        "old": item.old_filename,
+                        "new": item.new_filename,
+                        "error": str(e)
+                    })
+                    self.log(f"❌ {item.old_filename[:40]:<40} (錯誤：{str(e)[:30]})")
+                    self.progress.item_done("rename", item.old_filename, False,
+                                            time.perf_counter() - started, total=len(rename_plan),
+                                            error=str(e))
+        finally:
+            if plan_path is not None:
+                dump_records(plan_path, rename_plan)
+
+        self.log()
+        self.log("=" * 80)
+        self.log("✨ 重命名完成")
+        self.log("=" * 80)
+
+        # 更新進度：完成重命名
+        self.progress.complete_rename(renamed_count, len(rename_errors))
+        self.log(f"成功重命名：{renamed_count} 張")
+        self.log(f"重命名失敗：{len(rename_errors)} 張")
+        if self.delete_original:
+            self.log(f"✅ 已刪除原檔案（重命名時自動刪除）：{deleted_count} 張")
+        self.log()
+
+        return {"renamed": renamed_count, "deleted": deleted_count, "errors": rename_errors}
+
+    # ------------------------------------------------------------------
+    # 完整流程
+    # ------------------------------------------------------------------
+
+    def run(self, image_files: Optional[List[Path]] = None) -> Dict:
+        """
+        執行完整流程：掃描 → 分析 → 規劃 → 套用 → 報告
+
+        Args:
+            image_files: 已掃描好的圖片清單（見 scan）
+        """
+        if self.deadline is not None:
+            self.deadline.start()
+        image_files = self.scan(image_files)
+        analysis_results = self.analyze(image_files)
+        rename_plan = self.plan(analysis_results)
+
+        # 重命名前在檢查點記下日誌 run 編號：取消後恢復時沿用，略過已完成的項目
+        successful = sum(1 for r in analysis_results if r.succeeded)
+        run_id = self.load_rename_checkpoint() or self.journal.begin()
+        self.save_analysis_checkpoint(analysis_results, "renaming", {
+            "total_processed": len(analysis_results),
+            "successful": successful,
+            "failed": len(analysis_results) - successful,
+        }, rename_run=run_id)
+        outcome = self.apply(rename_plan, self.session_dir / "qwen_rename_plan_complete.json", run_id)
+        self.clear_analysis_checkpoint()
+
+        # 輸出最終完成訊息（確保 GUI 能看到）
+        self.log("[完成] ✅ 所有操作已完成！")
+        self.log(f"[完成] 📊 統計：共處理 {len(analysis_results)} 張圖片")
+        self.log(f"[完成] ⏱️  總耗時：{self.progress._format_time(time.time() - self.progress.start_time)}")
+        self.log()
+
+        # 保存最終報告
+        final_report = {
+            "timestamp": datetime.now().isoformat(),
+            "total_images": len(image_files),
+            "analyzed": len(analysis_results),
+            "successful_analysis": successful,
+            "failed_analysis": len(analysis_results) - successful,
+            "renamed": outcome["renamed"],
+            "rename_errors": len(outcome["errors"]),
+            "deleted": outcome["deleted"] if self.delete_original else 0,
+            "errors": outcome["errors"],
+            "analysis_rate": self.last_analysis_rate,
+            "token_usage": self.last_token_usage,
+        }
+        if self.deadline is not None:
+            final_report["deadline"] = self.deadline.report()
+            self.log_deadline(final_report["deadline"])
+        self._save_final_report(final_report)
+        return final_report
+
+    def _save_final_report(self, final_report: Dict):
+        with open(self.session_dir / "qwen_rename_final_report.json", "w", encoding="utf-8") as f:
+            json.dump(final_report, f, ensure_ascii=False, indent=2)
+        self.log(f"📝 最終報告已保存：{self.session_dir / 'qwen_rename_final_report.json'}")
+
+    @traced_stage("stream")
+    def run_streaming(self, sink_kind: str = "jsonl") -> Dict:
+        """
+        串流模式：逐目錄分析 → 規劃 → 重命名
+
+        - 分析結果寫入 qwen_vision_analysis_stream.{jsonl,sqlite}
+        - 命名計畫寫入 qwen_rename_plan_stream.{jsonl,sqlite}
+        - 重命名只在同一目錄內進行，因此每個目錄的計畫可獨立生成
+        - sqlite 輸出槽會保留上次的內容，已完成的檔案直接跳過
+        """
+        report = RunningReport()
+        if self.deadline is not None:
+            self.deadline.start()
+        total = count_images(self.target_dir)
+        if self.limit:
+            total = min(total, self.limit)
+        self.log(f"📊 掃描結果：找到 {total} 個圖片檔案")
+        self.log()
+
+        self.progress.start_scan(total)
+        self.progress.complete_scan()
+        self.progress.start_analysis(total=total)
+
+        self.journal.begin()
+        results_sink = open_sink(sink_kind, self.session_dir / "qwen_vision_analysis_stream", "filename")
+        plan_sink = open_sink(sink_kind, self.session_dir / "qwen_rename_plan_stream", "old_filename")
+
+        seen = 0
+        done_before = 0
+        token_usage = TokenUsageReport()
+
+        def flush_sinks():
+            results_sink.flush()
+            plan_sink.flush()
+
+        try:
+            for directory, files in iter_image_directories(self.target_dir):
+                if self.limit:
+                    files = files[:max(0, self.limit - seen)]
+                    if not files:
+                        break
+                seen += len(files)
+                report.total_images += len(files)
+                report.directories += 1
+
+                if not self.force_rename:
+                    unnamed = [f for f in files if not is_already_renamed(f.stem)]
+                    report.skipped_renamed += len(files) - len(unnamed)
+                    files = unnamed
+                if not files:
+                    continue
+
+                relative_dir = directory.relative_to(self.target_dir) if directory != self.target_dir else '.'
+                self.log(f"📁 {relative_dir}（{len(files)} 張）")
+                dir_results = []
+                for img_file in files:
+                    rel_name = str(img_file.relative_to(self.target_dir))
+                    if rel_name in plan_sink:
+                        # 已完成重命名（上次中斷前），不重複處理
+                        done_before += 1
+                        continue
+
+                    stored = results_sink.get(rel_name)
+                    if stored is not None and stored['status'] == 'success':
+                        result = AnalysisRecord.from_dict(stored)
+                        report.add_analysis(True, resumed=True)
+                        self.progress.item_done("analysis", rel_name, True, 0.0,
+                                                processed=report.analyzed + report.skipped_renamed + done_before,
+                                                cached=True)
+                    else:
+                        self.checkpoint(flush_sinks)
+                        self.log(f"   {img_file.name[:45]}... ", end="")
+                        started = time.perf_counter()
+                        result = self.analyze_image(img_file, tier=self.deadline.tier if self.deadline else None)
+                        results_sink.write(result.to_dict())
+                        report.add_analysis(result.succeeded)
+                        token_usage.add(result)
+                        self.progress.item_done("analysis", rel_name, result.succeeded,
+                                                time.perf_counter() - started,
+                                                processed=report.analyzed + report.skipped_renamed + done_before,
+                                                error=result.error)
+                        self.log("✅" if result.succeeded else "❌")
+                        time.sleep(self.request_delay)
+                        if self.deadline is not None:
+                            self.deadline.observe(rel_name, time.perf_counter() - started)
+                            self.adjust_tier(total - (report.analyzed + report.skipped_renamed + done_before))
+                    dir_results.append(result)
+
+                    self.report_progress("分析", report.analyzed + report.skipped_renamed + done_before, total)
+
+                # 目錄內規劃並執行重命名
+                with self.tracer.span("plan", directory=str(relative_dir)):
+                    dir_plan = self.build_plan(dir_results)
+                for item in dir_plan:
+                    try:
+                        new_path = self.apply_item(item)
+                        if new_path is not None:
+                            report.add_rename(deleted=self.delete_original)
+                            self.log(f"✅ {item.old_filename[:40]:<40} → {new_path.name[:35]}")
+                        plan_sink.write(item.to_dict())
+                    except Exception as e:
+                        report.add_rename_error({
+                            "old": item.old_filename,
+                            "new": item.new_filename,
+                            "error": str(e)
+                        })
+                        self.log(f"❌ {item.old_filename[:40]:<40} (錯誤：{str(e)[:30]})")
+
+                results_sink.flush()
+                plan_sink.flush()
+                self.progress.update_analysis(report.directories, len(files),
+                                              report.analyzed + report.skipped_renamed + done_before)
+        except RunCancelled:
+            # 已分析的結果都已寫入輸出槽（sqlite 輸出槽在下次執行時沿用）
+            flush_sinks()
+            self.cancelled_at(report.analyzed + report.skipped_renamed + done_before, total)
+            raise
+        finally:
+            results_sink.close()
+            plan_sink.close()
+
+        self.last_analysis_rate = self.progress.get_rate_summary()
+        self.last_token_usage = token_usage.to_dict()
+        self.progress.complete_analysis(report.successful, report.failed)
+
+        final_report = {"timestamp": datetime.now().isoformat(), **report.to_dict(),
+                        "analysis_rate": self.last_analysis_rate,
+                        "token_usage": self.last_token_usage}
+        if self.deadline is not None:
+            final_report["deadline"] = self.deadline.report()
+
+        self.log()
+        self.log("=" * 80)
+        self.log("✨ 串流處理完成")
+        self.log("=" * 80)
+        self.log(f"目錄數：{report.directories}")
+        self.log(f"分析：{report.analyzed} 張（成功 {report.successful}，失敗 {report.failed}，沿用 {report.resumed}）")
+        self.log(f"成功重命名：{report.renamed} 張")
+        self.log(f"重命名失敗：{report.rename_error_count} 張")
+        self.log()
+        self.log_rate(self.last_analysis_rate)
+        self.log_token_usage(self.last_token_usage)
+        if self.deadline is not None:
+            self.log_deadline(final_report["deadline"])
+        self.log("[完成] ✅ 所有操作已完成！")
+        self.log(f"[完成] 📊 統計：共處理 {report.analyzed} 張圖片")
+        self.log(f"[完成] ⏱️  總耗時：{self.progress._format_time(time.time() - self.progress.start_time)}")
+        self.log()
+        self.log(f"💾 分析結果：{results_sink.path}")
+        self.log(f"📊 命名計畫：{plan_sink.path}")
+        self._save_final_report(final_report)
+        return final_report
+
+    @traced_stage("replan")
+    def replan(self, analysis_file: Optional[Path] = None,
+               stream: bool = False, sink_kind: str = "jsonl") -> Dict:
+        """
+        重新規劃模式：依新的命名規則重新生成計畫，只套用有變動的名稱
+
+        - 分析結果：analysis_file，或 session 中的完整分析結果（stream 為輸出槽）
+        - 目前位置：上次計畫的 new_filename 存在、且重命名日誌顯示它由該原檔案產生時視為已套用，
+          否則為原檔案（同名的無關檔案不會被移動）
+        - 已套用的檔案直接移動；尚未套用的原檔案依 delete_original 決定移動或複製
+        - 先移到暫存名稱再移到目標，避免名稱互換時互相覆蓋
+
+        Raises:
+            FileNotFoundError: 找不到分析結果
+        """
+        if analysis_file:
+            analysis_path = Path(analysis_file).expanduser()
+        elif stream:
+            analysis_path = self.session_dir / f"qwen_vision_analysis_stream.{sink_kind}"
+        else:
+            analysis_path = self.session_dir / "qwen_vision_analysis_complete.json"
+        if stream:
+            plan_path = self.session_dir / f"qwen_rename_plan_stream.{sink_kind}"
+        else:
+            plan_path = self.session_dir / "qwen_rename_plan_complete.json"
+
+        if not analysis_path.exists():
+            raise FileNotFoundError(f"找不到分析結果：{analysis_path}")
+
+        records = [AnalysisRecord.from_dict(r) for r in iter_stored_records(analysis_path)]
+        self.log(f"📂 已加載 {len(records)} 個分析結果：{analysis_path}")
+
+        previous = {}
+        if plan_path.exists():
+            for entry in iter_stored_records(plan_path):
+                previous[entry['old_filename']] = entry['new_filename']
+            self.log(f"📂 已加載上次的命名計畫：{len(previous)} 項")
+        self.log()
+
+        new_plan = self.build_plan(records)
+        origins = self.journal.origins()
+
+        def produced_from(path: Path, original: Path) -> bool:
+            # 沿日誌往回追溯（可能經過多次 replan），確認 path 由 original 產生
+            current = str(path.resolve())
+            for _ in range(REPLAN_TRACE_LIMIT):
+                current = origins.get(current)
+                if current is None:
+                    return False
+                if current == str(original.resolve()):
+                    return True
+            return False
+
+        # 決定每個檔案目前的位置
+        changes = []
+        unchanged = 0
+        missing = 0
+        for item in new_plan:
+            prev_name = previous.get(item.old_filename)
+            if prev_name and (self.target_dir / prev_name).exists() and \
+                    produced_from(self.target_dir / prev_name, self.target_dir / item.old_filename):
+                current, produced = prev_name, True
+            elif (self.target_dir / item.old_filename).exists():
+                current, produced = item.old_filename, False
+            else:
+                missing += 1
+                continue
+            if current == item.new_filename:
+                unchanged += 1
+                continue
+            changes.append((item, current, produced))
+
+        self.log(f"🔄 名稱變更：{len(changes)} 項（不變 {unchanged}，找不到 {missing}）")
+
+        # 第一階段：已套用的檔案先移到暫存名稱
+        self.journal.begin()
+        staged = []
+        errors = []
+        for idx, (item, current, produced) in enumerate(changes):
+            source = self.target_dir / current
+            if produced:
+                temp = source.with_name(f".replan_{os.getpid()}_{idx}{source.suffix}")
+                try:
+                    source.rename(temp)
+                    source = temp
+                except OSError as e:
+                    errors.append({"old": current, "new": item.new_filename, "error": str(e)})
+                    continue
+            staged.append((item, current, produced, source))
+
+        # 第二階段：移到最終名稱（避開計畫外的既有檔案）
+        renamed = 0
+        for item, current, produced, source in staged:
+            target = self.find_free_path(self.target_dir / item.new_filename)
+            try:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                moved = produced or self.delete_original
+                if moved:
+                    source.rename(target)
+                else:
+                    shutil.copy2(source, target)
+                self.journal.record(self.target_dir / current, target, moved)
+                if item.new_name != target.name:
+                    item.new_name = target.name
+                    self.planner.reassign(item)
+                renamed += 1
+                self.log(f"✅ {current[:40]:<40} → {target.name[:35]}")
+            except OSError as e:
+                errors.append({"old": current, "new": item.new_filename, "error": str(e)})
+                self.log(f"❌ {current[:40]:<40} (錯誤：{str(e)[:30]})")
+
+        # 保存新的計畫（格式與原計畫相同）
+        if stream:
+            if plan_path.exists():
+                plan_path.unlink()
+            with open_sink(sink_kind, plan_path.with_suffix(""), "old_filename") as plan_sink:
+                for item in new_plan:
+                    plan_sink.write(item.to_dict())
+        else:
+            dump_records(plan_path, new_plan)
+
+        replan_report = {
+            "timestamp": datetime.now().isoformat(),
+            "naming_rules": self.rules.to_dict(),
+            "analysis_file": str(analysis_path),
+            "total_planned": len(new_plan),
+            "unchanged": unchanged,
+            "renamed": renamed,
+            "missing": missing,
+            "errors": errors,
+        }
+        with open(self.session_dir / "qwen_replan_report.json", "w", encoding="utf-8") as f:
+            json.dump(replan_report, f, ensure_ascii=False, indent=2)
+
+        self.log()
+        self.log("[完成] ✅ 所有操作已完成！")
+        self.log(f"[完成] 📊 統計：重新命名 {renamed} 張，不變 {unchanged} 張，失敗 {len(errors)} 張")
+        self.log(f"📊 對照表已保存：{plan_path}")
+        self.log(f"📝 重新規劃報告：{self.session_dir / 'qwen_replan_report.json'}")
+        return replan_report
+
+    # ------------------------------------------------------------------
+    # 估算
+    # ------------------------------------------------------------------
+
+    def cached_filenames(self, stream: bool = False, sink_kind: str = "jsonl") -> set:
+        """
+        下次執行時會沿用既有結果（不重新分析）的檔案（相對路徑）
+
+        - 一般模式：qwen_vision_analysis_sample.json 中的結果（analyze 以檔名比對）
+        - 串流模式：sqlite 輸出槽中已重命名或已成功分析的檔案（jsonl 每次覆寫，沒有沿用）
+        """
+        cached = set()
+        if not stream:
+            sample_file = self.session_dir / "qwen_vision_analysis_sample.json"
+            if sample_file.exists():
+                cached.update(r["filename"] for r in iter_stored_records(sample_file))
+        elif sink_kind == "sqlite":
+            for stem, key, only_success in (("qwen_rename_plan_stream", "old_filename", False),
+                                            ("qwen_vision_analysis_stream", "filename", True)):
+                path = self.session_dir / f"{stem}.sqlite"
+                if path.exists():
+                    cached.update(r[key] for r in iter_stored_records(path)
+                                  if not only_success or r.get("status") == "success")
+        return cached
+
+    @traced_stage("estimate")
+    def estimate(self, sample_size: int = 50, seed: Optional[int] = None,
+                 stream: bool = False, sink_kind: str = "jsonl") -> Dict:
+        """
+        估算模式：分層抽樣分析少量圖片，推估整個圖庫的執行時間、傳輸量和 token 用量
+
+        樣本依（目錄, 副檔名, 大小區間）分層配置，結果只用於推估（不保存、不重命名），
+        報告寫入 qwen_run_estimate.json。
+
+        Args:
+            sample_size: 樣本數
+            seed: 抽樣的隨機種子
+            stream / sink_kind: 以哪種模式的既有結果計算沿用數
+        """
+        from run_estimate import RunEstimator
+
+        image_files = sorted(
+            f for f in self.target_dir.rglob("*")
+            if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS
+        )
+        pending = image_files
+        renamed = 0
+        if not self.force_rename:
+            pending = [f for f in image_files if not is_already_renamed(f.stem)]
+            renamed = len(image_files) - len(pending)
+
+        cached_names = self.cached_filenames(stream, sink_kind)
+        to_analyze = []
+        cached = 0
+        for f in pending:
+            relative = str(f.relative_to(self.target_dir))
+            if relative in cached_names or (not stream and f.name in cached_names):
+                cached += 1
+            else:
+                to_analyze.append((f, f.stat().st_size))
+
+        estimator = RunEstimator(to_analyze, self.target_dir)
+        sample = estimator.draw_sample(sample_size, seed)
+        self.log(f"📊 掃描結果：找到 {len(image_files)} 個圖片檔案")
+        self.log(f"   已命名（跳過）：{renamed} 個")
+        self.log(f"   沿用既有結果：{cached} 個")
+        self.log(f"   待分析：{len(to_analyze)} 個，分為 {len(estimator.strata)} 層")
+        self.log(f"🎯 分層抽樣：{len(sample)} 張")
+        self.log()
+
+        self.progress.start_scan(len(sample))
+        self.progress.complete_scan()
+        self.progress.start_analysis(total=len(sample))
+        successful = 0
+        for idx, (key, img_file) in enumerate(sample, 1):
+            self.log(f"   [{idx}/{len(sample)}] {img_file.name[:45]}... ", end="")
+            started = time.perf_counter()
+            result = self.analyze_image(img_file)
+            latency = time.perf_counter() - started
+            usage = result.extra.get("usage") if result.extra else None
+            estimator.add(key, latency, result.succeeded, usage.get("total_tokens") if usage else None)
+            successful += 1 if result.succeeded else 0
+            self.progress.item_done("analysis", result.filename, result.succeeded, latency,
+                                    processed=idx, error=result.error)
+            self.log("✅" if result.succeeded else "❌")
+            self.report_progress("估算", idx, len(sample))
+        self.progress.complete_analysis(successful, len(sample) - successful)
+
+        overhead = len(json.dumps(self.build_payload("image/png", "")).encode('utf-8'))
+        projection = estimator.project(self.request_delay, overhead)
+        estimate_report = {
+            "timestamp": datetime.now().isoformat(),
+            "target_dir": str(self.target_dir),
+            "mode": f"stream:{sink_kind}" if stream else "run",
+            "total_images": len(image_files),
+            "already_renamed": renamed,
+            "cache_hits": cached,
+            "request_delay": self.request_delay,
+            "api_endpoint": self.api_url,
+            "model": self.model,
+            **projection,
+        }
+        with open(self.session_dir / "qwen_run_estimate.json", "w", encoding="utf-8") as f:
+            json.dump(estimate_report, f, ensure_ascii=False, indent=2)
+
+        fmt = self.progress._format_time
+        self.log()
+        self.log("=" * 80)
+        self.log("🔮 完整執行推估")
+        self.log("=" * 80)
+        self.log(f"待分析：{projection['files']} 張（樣本 {projection['sampled']} 張，"
+                 f"失敗率 {projection['sample_failure_rate']:.1%}）")
+        self.log(f"預估耗時：{fmt(projection['seconds'])}"
+                 f"（95% 區間 {fmt(projection['seconds_low'])} ～ {fmt(projection['seconds_high'])}）")
+        self.log(f"預期失敗：{projection['expected_failures']:.0f} 張")
+        self.log(f"傳輸量：{projection['request_bytes'] / 1024 / 1024:.1f} MB"
+                 f"（圖片 {projection['image_bytes'] / 1024 / 1024:.1f} MB）")
+        if projection["tokens"] is not None:
+            self.log(f"Token：約 {projection['tokens']:,}")
+        self.log()
+        self.log("耗時最多的分層：")
+        for stratum in projection["strata"][:10]:
+            self.log(f"   {stratum['directory'][:30]:<30} {stratum['extension']:<6} {stratum['size_bucket']:<7} "
+                     f"{stratum['files']:>6} 張  {stratum['mean_latency']:.2f} 秒/張  "
+                     f"{fmt(stratum['projected_seconds'])}")
+        self.log()
+        self.log(f"📝 估算報告：{self.session_dir / 'qwen_run_estimate.json'}")
+        return estimate_report
+
+    # ------------------------------------------------------------------
+    # 多機分工模式
+    # ------------------------------------------------------------------
+
+    def run_shard(self, store, chunk_size: int = 50, finalize: bool = True,
+                  poll_interval: float = 5.0) -> Dict:
+        """
+        多機分工模式：多台機器以共享目錄的租約領取區塊分析，最後由一台執行規劃和重命名
+
+        - 區塊清單不存在時掃描目標目錄並發佈（其他機器沿用同一份清單）
+        - 領取區塊 → 分析（沿用該區塊已有的成功結果）→ 寫入完成標記；
+          租約由背景線程續約，被其他機器接手時放棄該區塊
+        - 沒有可領取的區塊時等待其他機器完成（當機的機器租約過期後由這裡接手）
+        - 全部完成後取得最終租約的機器合併結果、規劃並重命名，其他機器直接結束
+
+        Args:
+            store: 共享目錄（work_leases.ShardStore）
+            chunk_size: 區塊大小（只在發佈區塊清單時使用）
+            finalize: 是否參與最終的規劃和重命名
+            poll_interval: 等待其他機器時的檢查間隔（秒）
+
+        Returns:
+            {"worker", "chunks", "analyzed", "successful", "failed", "final"}（final 為最終報告或 None）
+        """
+        from work_leases import LeaseKeeper, split_chunks
+
+        manifest = store.load_manifest()
+        if manifest is None:
+            image_files = self.scan()
+            filenames = [str(f.relative_to(self.target_dir)) for f in image_files]
+            manifest = store.publish_manifest(split_chunks(filenames, chunk_size), {
+                "timestamp": datetime.now().isoformat(),
+                "force_rename": self.force_rename,
+            })
+            if manifest.get("created_by") != store.worker:
+                self.log(f"📋 沿用 {manifest.get('created_by')} 發佈的區塊清單")
+        total = sum(len(c) for c in manifest["chunks"])
+        self.log(f"🧩 多機分工：{store.chunk_count} 個區塊，共 {total} 張圖片，工作者 {store.worker}")
+        self.log(f"   共享目錄：{store.root}")
+        self.log()
+
+        summary = {"worker": store.worker, "chunks": 0, "analyzed": 0, "successful": 0, "failed": 0,
+                   "final": None}
+        token_usage = TokenUsageReport()
+        done_files = sum(len(store.chunk(i)) for i in range(store.chunk_count) if store.is_done(i))
+        self.progress.start_analysis(total=total, already_done=done_files)
+        processed = done_files
+        keeper = LeaseKeeper(store.leases)
+        keeper.start()
+        current = None
+        try:
+            while True:
+                self.checkpoint()
+                current = store.claim_next()
+                if current is None:
+                    waiting = store.pending_chunks()
+                    if not waiting:
+                        break
+                    self.log(f"⏳ 等待其他機器完成 {len(waiting)} 個區塊...")
+                    self.control.sleep(poll_interval)
+                    continue
+
+                lease = store.chunk_lease(current)
+                keeper.hold(lease)
+                chunk = store.chunk(current)
+                existing = store.chunk_results(current)
+                resumed = sum(1 for name in chunk if existing.get(name, {}).get("status") == "success")
+                self.log(f"📦 區塊 {current + 1}/{store.chunk_count}（{len(chunk)} 張"
+                         + (f"，沿用 {resumed} 個結果" if resumed else "") + "）")
+                counts = {"analyzed": 0, "successful": 0, "failed": 0}
+                lost = False
+                for rel_name in chunk:
+                    if existing.get(rel_name, {}).get("status") == "success":
+                        continue
+                    img_file = self.target_dir / rel_name
+                    if not img_file.exists():
+                        continue  # 已被移動或重命名
+                    if keeper.lost(lease):
+                        lost = True
+                        break
+                    self.checkpoint()
+                    self.log(f"   {img_file.name[:45]}... ", end="")
+                    started = time.perf_counter()
+                    result = self.analyze_image(img_file)
+                    store.append_result(current, result.to_dict())
+                    token_usage.add(result)
+                    counts["analyzed"] += 1
+                    counts["successful" if result.succeeded else "failed"] += 1
+                    processed += 1
+                    self.progress.item_done("analysis", rel_name, result.succeeded,
+                                            time.perf_counter() - started, processed=processed,
+                                            error=result.error)
+                    self.log("✅" if result.succeeded else "❌")
+                    self.report_progress("分析", processed, total)
+                    time.sleep(self.request_delay)
+                keeper.drop(lease)
+                if lost:
+                    self.log(f"⚠️  區塊 {current + 1} 的租約已被其他機器接手，改領取下一個區塊")
+                    store.abandon(current)
+                else:
+                    store.mark_done(current, counts)
+                    summary["chunks"] += 1
+                for key, value in counts.items():
+                    summary[key] += value
+                current = None
+        except RunCancelled:
+            self.cancelled_at(processed, total)
+            raise
+        finally:
+            keeper.stop()
+            if current is not None:
+                # 已寫入的結果保留，其他機器立即接手剩下的部分
+                store.abandon(current)
+            store.close()
+
+        self.last_analysis_rate = self.progress.get_rate_summary()
+        self.last_token_usage = token_usage.to_dict()
+        self.progress.complete_analysis(summary["successful"], summary["failed"])
+        self.log()
+        self.log(f"✨ 本機完成 {summary['chunks']} 個區塊，分析 {summary['analyzed']} 張"
+                 f"（成功 {summary['successful']}，失敗 {summary['failed']}）")
+        self.log_rate(self.last_analysis_rate)
+        self.log_token_usage(self.last_token_usage)
+
+        if not finalize:
+            return summary
+        if not store.try_finalize():
+            final = store.finalized()
+            if final is not None:
+                self.log(f"ℹ️  {final.get('worker')} 已完成最終的規劃和重命名")
+            else:
+                holder = store.leases.holder("final") or {}
+                self.log(f"ℹ️  由 {holder.get('worker')} 執行最終的規劃和重命名")
+            return summary
+
+        self.log("=" * 80)
+        self.log("🏁 全部區塊完成，由本機執行最終的規劃和重命名")
+        self.log("=" * 80)
+        keeper = LeaseKeeper(store.leases)
+        keeper.hold("final")
+        keeper.start()
+        try:
+            records = [AnalysisRecord.from_dict(r) for r in store.all_results().values()
+                       if (self.target_dir / r["filename"]).exists()]
+            successful = sum(1 for r in records if r.succeeded)
+            dump_records(self.session_dir / "qwen_vision_analysis_complete.json", records, {
+                "timestamp": datetime.now().isoformat(),
+                "total_analyzed": len(records),
+                "successful": successful,
+                "failed": len(records) - successful,
+                "api_endpoint": self.api_url,
+                "model": self.model,
+                "shard_dir": str(store.root),
+            })
+            rename_plan = self.plan(records)
+            outcome = self.apply(rename_plan, self.session_dir / "qwen_rename_plan_complete.json")
+        finally:
+            keeper.stop()
+
+        final_report = {
+            "timestamp": datetime.now().isoformat(),
+            "total_images": total,
+            "analyzed": len(records),
+            "successful_analysis": successful,
+            "failed_analysis": len(records) - successful,
+            "renamed": outcome["renamed"],
+            "rename_errors": len(outcome["errors"]),
+            "deleted": outcome["deleted"] if self.delete_original else 0,
+            "errors": outcome["errors"],
+        }
+        self._save_final_report(final_report)
+        store.finish(final_report)
+        summary["final"] = final_report
+        return summary
+
+    # ------------------------------------------------------------------
+    # 多目錄模式
+    # ------------------------------------------------------------------
+
+    def run_roots(self, target_dirs: List[Path], stream: bool = False, sink_kind: str = "jsonl",
+                  replan: bool = False) -> Dict:
+        """
+        多目錄模式：同一個引擎依序處理多個目標目錄
+
+        每個目錄使用 session 目錄下自己的命名空間（見 target_roots.py），分析結果、
+        命名計畫、報告和重命名日誌互不覆蓋；單一目錄出錯時記錄錯誤並繼續下一個目錄。
+        彙總報告寫入 qwen_multi_root_report.json。
+
+        Args:
+            target_dirs: 目標目錄（見 target_roots.check_roots）
+            stream / sink_kind: 以串流模式處理每個目錄
+            replan: 依目前的命名規則重新規劃每個目錄（不重新分析）
+        """
+        from target_roots import root_session_dir
+
+        base_session, original_target = self.session_dir, self.target_dir
+        entries = []
+        started = time.time()
+        try:
+            for idx, root in enumerate(target_dirs, 1):
+                session = root_session_dir(base_session, root)
+                self.log("=" * 80)
+                self.log(f"📁 目錄 {idx}/{len(target_dirs)}：{root}")
+                self.log(f"   session：{session}")
+                self.log("=" * 80)
+                entry = {"target_dir": str(root), "session_dir": str(session)}
+                root_started = time.time()
+                try:
+                    self.set_target_dir(root, session_dir=session)
+                    if replan:
+                        report = self.replan(stream=stream, sink_kind=sink_kind)
+                    elif stream:
+                        report = self.run_streaming(sink_kind)
+                    else:
+                        report = self.run()
+                    entry["status"] = "done"
+                    for key in ("analyzed", "successful_analysis", "renamed", "rename_errors"):
+                        if isinstance(report.get(key), int):
+                            entry[key] = report[key]
+                except RunCancelled:
+                    raise
+                except Exception as e:
+                    entry.update(status="failed", error=str(e))
+                    self.log(f"❌ {root} 處理失敗：{e}")
+                entry["seconds"] = round(time.time() - root_started, 1)
+                entries.append(entry)
+        finally:
+            self.set_target_dir(original_target, session_dir=base_session)
+
+        summary = {
+            "timestamp": datetime.now().isoformat(),
+            "mode": "replan" if replan else (f"stream:{sink_kind}" if stream else "run"),
+            "roots": entries,
+            "failed_roots": sum(1 for e in entries if e["status"] == "failed"),
+            "analyzed": sum(e.get("analyzed", 0) for e in entries),
+            "renamed": sum(e.get("renamed", 0) for e in entries),
+            "seconds": round(time.time() - started, 1),
+        }
+        with open(base_session / "qwen_multi_root_report.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        self.log("=" * 80)
+        self.log(f"✨ 多目錄處理完成：{len(entries)} 個目錄，"
+                 f"{self.progress._format_time(summary['seconds'])}")
+        self.log("=" * 80)
+        for entry in entries:
+            status = "✅" if entry["status"] == "done" else "❌"
+            self.log(f"{status} {entry['target_dir'][-50:]:<50} 分析 {entry.get('analyzed', 0):>5}  "
+                     f"重命名 {entry.get('renamed', 0):>5}  {self.progress._format_time(entry['seconds'])}")
+        self.log(f"📝 彙總報告：{base_session / 'qwen_multi_root_report.json'}")
+        return summary
+
+    # ------------------------------------------------------------------
+    # 監看模式
+    # ------------------------------------------------------------------
+
+    def warm_up(self) -> bool:
+        """送出只含文字、輸出 1 個 token 的請求，讓模型載入（或維持載入）"""
+        body = json.dumps({
+            "model": self.model,
+            "messages": [{"role": "user", "content": "ping"}],
+            "temperature": 0,
+            "max_tokens": 1
+        }).encode('utf-8')
+        try:
+            response = self.post_request(body)
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            self.log(f"⚠️  模型預熱失敗：{str(e)[:80]}")
+            return False
+
+    def watch(self, watcher, catch_up: bool = True, keep_warm: float = 0) -> Dict:
+        """
+        監看模式：新增或變更的圖片寫入完成後，以同一個引擎（連線、組態、命名配置皆保留）
+        立即分析、規劃、重命名，直到 watcher.stop() 或 Ctrl+C
+
+        已命名的檔案一律略過（包含重命名產生的新檔案），不受 force_rename 影響。
+
+        Args:
+            watcher: 監看 target_dir 的 folder_watcher.FolderWatcher
+            catch_up: 開始監看後先處理目錄中既有的未命名圖片
+            keep_warm: 閒置超過此秒數時送出預熱請求，避免模型被卸載（0：不送）
+
+        Returns:
+            累計 {"batches", "images", "successful_analysis", "renamed", "rename_errors"}
+        """
+        totals = {"batches": 0, "images": 0, "successful_analysis": 0, "renamed": 0, "rename_errors": 0}
+        force_rename, self.force_rename = self.force_rename, False
+        watcher.start()
+        try:
+            if catch_up:
+                self._watch_batch(None, totals)
+            self.warm_up()
+            self.log(f"👀 監看中：{self.target_dir}（{watcher.backend}，"
+                     f"檔案 {watcher.debounce:g} 秒不變視為寫入完成，Ctrl+C 結束）")
+            while not watcher.stopped:
+                files = watcher.wait_ready(timeout=keep_warm or None)
+                if not files:
+                    if keep_warm and not watcher.stopped:
+                        self.warm_up()
+                    continue
+                files = [f for f in files if not is_already_renamed(f.stem)]
+                if files:
+                    self.log(f"📥 {datetime.now().strftime('%H:%M:%S')} 新圖片 {len(files)} 張")
+                    self._watch_batch(files, totals)
+        except KeyboardInterrupt:
+            self.log()
+        finally:
+            watcher.stop()
+            self.force_rename = force_rename
+        self.log(f"⏹️  停止監看：共 {totals['batches']} 批，分析 {totals['images']} 張，"
+                 f"重命名 {totals['renamed']} 張")
+        return totals
+
+    def _watch_batch(self, image_files: Optional[List[Path]], totals: Dict):
+        """監看模式的一批：完整流程，結果累計到 totals"""
+        # 總耗時以這一批計算
+        self.progress.start_time = time.time()
+        report = self.run(image_files)
+        totals["batches"] += 1
+        totals["images"] += report["analyzed"]
+        totals["successful_analysis"] += report["successful_analysis"]
+        totals["renamed"] += report["renamed"]
+        totals["rename_errors"] += report["rename_errors"]
+        self.log(f"👀 累計：分析 {totals['images']} 張，重命名 {totals['renamed']} 張，等待新圖片...")
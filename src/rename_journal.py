@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+重命名日誌 - 記錄每次執行的檔案操作，支援復原（undo）
+
+功能：
+- 每個套用的重命名追加一行 JSON（JSON Lines），同一次執行共用 run 編號
+- undo_last_run()：依相反順序復原最近一次執行
+  - move：把新檔案移回原路徑
+  - copy：原檔案仍在時刪除複製出的新檔案
+
+設計原理：
+- 只追加、逐行寫入，中斷時已完成的操作仍有紀錄
+- 路徑以絕對路徑保存，復原不依賴當時的目標目錄參數
+- 復原時不覆蓋任何既有檔案（原路徑已被佔用時略過並回報）
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class RenameJournal:
+    """重命名日誌（JSON Lines，只追加）"""
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: 日誌檔案路徑（例如 data/session/rename_journal.jsonl）
+        """
+        self.path = Path(path)
+        self.run_id: Optional[str] = None
+        self._file = None
+
+    def begin(self, run_id: Optional[str] = None) -> str:
+        """
+        開始一次新的執行，返回 run 編號
+
+        Args:
+            run_id: 沿用既有的 run 編號（取消後恢復，undo 時視為同一次執行）
+        """
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return self.run_id
+
+    def record(self, old_path: Path, new_path: Path, moved: bool):
+        """
+        記錄一個已完成的操作
+
+        Args:
+            old_path: 原檔案路徑
+            new_path: 新檔案路徑
+            moved: True 為移動（原檔案已不存在），False 為複製
+        """
+        if self.run_id is None:
+            self.begin()
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps({
+            "run": self.run_id,
+            "old": str(Path(old_path).resolve()),
+            "new": str(Path(new_path).resolve()),
+            "mode": "move" if moved else "copy",
+        }, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        """關閉日誌檔案"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def last_run(self) -> List[Dict]:
+        """
+        讀取最近一次執行的所有操作（依寫入順序）
+
+        取消後恢復的執行沿用原本的 run 編號，中間可能夾著其他執行的紀錄，
+        因此收集所有同編號的操作，而不只是檔案末端連續的一段
+        """
+        entries = self._entries()
+        if not entries:
+            return []
+        run_id = entries[-1]["run"]
+        return [entry for entry in entries if entry["run"] == run_id]
+
+    def _entries(self) -> List[Dict]:
+        if not self.path.exists():
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def run_entries(self, run_id: str) -> List[Dict]:
+        """指定 run 的所有操作（依寫入順序）"""
+        return [entry for entry in self._entries() if entry["run"] == run_id]
+
+    def origins(self) -> Dict[str, str]:
+        """每個產生出的檔案來自哪個檔案 {新絕對路徑: 原絕對路徑}（同一路徑以最後一次為準）"""
+        return {entry["new"]: entry["old"] for entry in self._entries()}
+
+    def drop_last_run(self, run_id: str):
+        """從日誌中移除指定的 run（復原完成後呼叫）"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            kept = [line for line in f if line.strip() and json.loads(line)["run"] != run_id]
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(kept)
+
+
+def undo_last_run(journal: RenameJournal) -> Dict:
+    """
+    復原最近一次執行
+
+    Returns:
+        {"run": run 編號, "restored": 移回數, "removed": 刪除的複本數,
+         "reverted": 已復原的日誌項目, "skipped": 略過明細}
+    """
+    entries = journal.last_run()
+    if not entries:
+        return {"run": None, "restored": 0, "removed": 0, "reverted": [], "skipped": []}
+
+    restored = 0
+    removed = 0
+    reverted = []
+    skipped = []
+    for entry in reversed(entries):
+        old_path = Path(entry["old"])
+        new_path = Path(entry["new"])
+        if not new_path.exists():
+            skipped.append({**entry, "reason": "新檔案不存在"})
+            continue
+        if entry["mode"] == "move":
+            if old_path.exists():
+                skipped.append({**entry, "reason": "原路徑已被佔用"})
+                continue
+            new_path.rename(old_path)
+            restored += 1
+            reverted.append(entry)
+        else:
+            if not old_path.exists():
+                skipped.append({**entry, "reason": "原檔案不存在，保留複本"})
+                continue
+            new_path.unlink()
+            removed += 1
+            reverted.append(entry)
+
+    journal.drop_last_run(entries[0]["run"])
+    return {"run": entries[0]["run"], "restored": restored, "removed": removed,
+            "reverted": reverted, "skipped": skipped}
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+命名規劃器 - 依 config/config.yaml 的命名規則生成重命名計畫
+
+功能：
+- 讀取 naming 區段（priority_field、fallback_field、separator、duplicate_suffix）
+- 從分析記錄組出新檔名（清理非法字元、限制長度）
+- 同一目錄內的重複名稱以 duplicate_suffix 加上序號
+- 規劃只依賴已保存的分析記錄，更換命名規則時不必重新推論
+- 增量規劃器（IncrementalPlanner）：以目錄為單位持久化名稱配置，
+  新增或重新分析的檔案只觸發所在目錄的衝突處理
+
+設計原理：
+- 命名規則與分析結果分離：分析是最昂貴的步驟，只做一次
+- 預設規則與 config.yaml 一致（image_title 優先，recommended_name 備用）
+- 重命名只在同一目錄內進行，因此名稱衝突只需在目錄內檢查
+"""
+
+import os
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from records import AnalysisRecord, PlanEntry
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_CONFIG = PROJECT_ROOT / "config" / "config.yaml"
+
+# 檔名中不允許的字元（依規格：替換為分隔符）
+INVALID_FILENAME_CHARS = '/\\:*?"<>|'
+
+# 視為「無值」的分析欄位內容
+EMPTY_VALUES = {"", "N/A", "NA", "無", "UNKNOWN"}
+
+
+def load_config(config_path: Optional[Path] = None) -> Dict:
+    """
+    讀取 YAML 組態檔
+
+    Args:
+        config_path: 組態檔路徑（默認：config/config.yaml），不存在時返回空 dict
+    """
+    import yaml  # 只在讀取組態時載入（scan 等不需要組態的子命令不匯入）
+
+    path = Path(config_path) if config_path else DEFAULT_CONFIG
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+class NamingRules:
+    """命名規則"""
+
+    def __init__(self, priority_field: str = "image_title",
+                 fallback_field: str = "recommended_name",
+                 separator: str = "_",
+                 duplicate_suffix: str = "_{number:02d}",
+                 max_filename_length: int = 255):
+        self.priority_field = priority_field
+        self.fallback_field = fallback_field
+        self.separator = separator
+        self.duplicate_suffix = duplicate_suffix
+        self.max_filename_length = max_filename_length
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "NamingRules":
+        """從組態 dict（load_config 的結果）建立命名規則"""
+        naming = config.get("naming", {}) or {}
+        validation = config.get("validation", {}) or {}
+        defaults = cls()
+        return cls(
+            priority_field=naming.get("priority_field", defaults.priority_field),
+            fallback_field=naming.get("fallback_field", defaults.fallback_field),
+            separator=naming.get("separator", defaults.separator),
+            duplicate_suffix=naming.get("duplicate_suffix", defaults.duplicate_suffix),
+            max_filename_length=validation.get("max_filename_length", defaults.max_filename_length),
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "priority_field": self.priority_field,
+            "fallback_field": self.fallback_field,
+            "separator": self.separator,
+            "duplicate_suffix": self.duplicate_suffix,
+            "max_filename_length": self.max_filename_length,
+        }
+
+    def suffix(self, number: int) -> str:
+        """第 number 個重複名稱的後綴"""
+        return self.duplicate_suffix.format(number=number)
+
+
+def _usable(value) -> bool:
+    """欄位值是否可用於命名"""
+    return isinstance(value, str) and value.strip() not in EMPTY_VALUES
+
+
+def _truncate_utf8(text: str, max_bytes: int) -> str:
+    """以 UTF-8 位元組數截斷（檔案系統的長度限制以位元組計）"""
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode('utf-8', errors='ignore')
+
+
+def compose_name(record: AnalysisRecord, rules: NamingRules) -> str:
+    """
+    依命名規則組出新檔名（不含副檔名和重複後綴）
+
+    優先級：priority_field → fallback_field → 主題_子主題_內容 → UNKNOWN
+    """
+    candidate = None
+    for field in (rules.priority_field, rules.fallback_field):
+        value = record.get(field)
+        if _usable(value):
+            candidate = value
+            break
+    if candidate is None:
+        parts = [record.get(f) for f in ("main_theme", "sub_theme", "core_content")]
+        parts = [p for p in parts if _usable(p)]
+        candidate = "_".join(parts) if parts else "UNKNOWN"
+
+    # 非法字元和原有分隔（底線、空白）統一改為設定的分隔符
+    for ch in INVALID_FILENAME_CHARS:
+        candidate = candidate.replace(ch, " ")
+    tokens = candidate.replace("_", " ").split()
+    return rules.separator.join(tokens) or "UNKNOWN"
+
+
+def plan_filename(record: AnalysisRecord, rules: NamingRules) -> str:
+    """組出含副檔名的新檔名（預留重複後綴的長度）"""
+    ext = Path(record.name).suffix
+    base = compose_name(record, rules)
+    if ext and base.lower().endswith(ext.lower()):
+        base = base[:-len(ext)] or "UNKNOWN"
+    reserve = len(ext.encode('utf-8')) + len(rules.suffix(99).encode('utf-8'))
+    base = _truncate_utf8(base, rules.max_filename_length - reserve)
+    return base + ext
+
+
+def with_suffix(filename: str, rules: NamingRules, number: int) -> str:
+    """在副檔名前加上第 number 個重複後綴"""
+    path = Path(filename)
+    return f"{path.stem}{rules.suffix(number)}{path.suffix}"
+
+
+def _free_suffixed_names(base: str, count: int, taken: set, rules: NamingRules) -> List[str]:
+    """從序號 1 開始，找出 count 個未被佔用的帶後綴名稱"""
+    names = []
+    number = 1
+    while len(names) < count:
+        candidate = with_suffix(base, rules, number)
+        if candidate not in taken:
+            names.append(candidate)
+        number += 1
+    return names
+
+
+class IncrementalPlanner:
+    """
+    增量命名規劃器
+
+    每個目錄的名稱配置（原檔名 → 新檔名，以及未加後綴的基礎名稱）保存在
+    SQLite 中。規劃時只讀取和更新輸入記錄所在的目錄：
+    - 基礎名稱沒有變動的檔案沿用已配置的名稱
+    - 新檔案或基礎名稱改變的檔案才重新配置，並避開目錄中已佔用的名稱
+    - 原檔案和新檔案都已不在目錄中的配置（刪除、移走、undo 的複本）視為過期並釋放
+
+    線程安全：GUI 在工作線程中建立引擎和規劃，在主線程關閉
+    """
+
+    def __init__(self, rules: NamingRules, store_path: Path, root: Path):
+        """
+        Args:
+            rules: 命名規則
+            store_path: 名稱配置資料庫路徑
+            root: 目標目錄（記錄中的相對路徑以此為基準）
+        """
+        self.rules = rules
+        self.root = Path(root).resolve()
+        self.store_path = Path(store_path)
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.store_path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS allocations ("
+            " directory TEXT NOT NULL,"
+            " old_name TEXT NOT NULL,"
+            " new_name TEXT NOT NULL,"
+            " base_name TEXT NOT NULL,"
+            " PRIMARY KEY (directory, old_name))"
+        )
+        self._conn.commit()
+        # 最近一次 plan() 中需要加序號的重複名稱組數
+        self.last_duplicate_groups = 0
+
+    def _key(self, directory: str) -> str:
+        """目錄的持久化鍵（絕對路徑，避免不同目標目錄互相干擾）"""
+        return str(self.root / directory) if directory else str(self.root)
+
+    def plan(self, records: Iterable[AnalysisRecord]) -> List[PlanEntry]:
+        """
+        為成功的分析記錄配置新名稱（保持輸入順序）
+
+        只有輸入記錄所在的目錄會被讀取和更新。
+        """
+        by_directory: Dict[str, List[AnalysisRecord]] = {}
+        for record in records:
+            if record.succeeded:
+                by_directory.setdefault(record.directory, []).append(record)
+
+        duplicate_groups = 0
+        rename_plan = []
+        with self._lock:
+            for directory, dir_records in by_directory.items():
+                names, duplicates = self._plan_directory(directory, dir_records)
+                duplicate_groups += duplicates
+                rename_plan.extend(PlanEntry(record, names[record.name]) for record in dir_records)
+            self._conn.commit()
+
+        self.last_duplicate_groups = duplicate_groups
+        return rename_plan
+
+    def _plan_directory(self, directory: str, records: List[AnalysisRecord]):
+        """配置單一目錄內的名稱，返回（原檔名 → 新檔名, 重複名稱組數）"""
+        key = self._key(directory)
+        rows = self._conn.execute(
+            "SELECT old_name, new_name, base_name FROM allocations WHERE directory = ?", (key,)
+        ).fetchall()
+        rows = self._reconcile(key, rows)
+        allocated = {old: (new, base) for old, new, base in rows}
+        taken = {new for _, new, _ in rows}
+        base_counts = Counter(base for _, _, base in rows)
+
+        names = {}
+        pending: Dict[str, List[AnalysisRecord]] = {}
+        for record in records:
+            base = plan_filename(record, self.rules)
+            previous = allocated.get(record.name)
+            if previous and previous[1] == base:
+                names[record.name] = previous[0]
+                continue
+            if previous:
+                # 重新分析後基礎名稱改變：釋放舊名稱
+                taken.discard(previous[0])
+                base_counts[previous[1]] -= 1
+            pending.setdefault(base, []).append(record)
+
+        duplicates = 0
+        for base, group in pending.items():
+            if len(group) == 1 and base_counts[base] == 0 and base not in taken:
+                new_names = [base]
+            else:
+                duplicates += 1
+                new_names = _free_suffixed_names(base, len(group), taken, self.rules)
+            for record, new_name in zip(group, new_names):
+                taken.add(new_name)
+                base_counts[base] += 1
+                names[record.name] = new_name
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO allocations (directory, old_name, new_name, base_name)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, record.name, new_name, base)
+                )
+        return names, duplicates
+
+    def _reconcile(self, key: str, rows: List) -> List:
+        """釋放原檔案和新檔案都已不存在的配置，返回仍有效的配置"""
+        try:
+            present = set(os.listdir(key))
+        except OSError:
+            present = set()
+        stale = [old for old, new, _ in rows if old not in present and new not in present]
+        if not stale:
+            return rows
+        self._conn.executemany(
+            "DELETE FROM allocations WHERE directory = ? AND old_name = ?",
+            [(key, old) for old in stale]
+        )
+        stale = set(stale)
+        return [row for row in rows if row[0] not in stale]
+
+    def reassign(self, entry: PlanEntry):
+        """套用時因目錄中已有同名檔案而改名，同步更新配置"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE allocations SET new_name = ? WHERE directory = ? AND old_name = ?",
+                (entry.new_name, self._key(entry.directory), entry.record.name)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+def release_allocations(store_path: Path, entries: Iterable[Dict]):
+    """
+    釋放已復原的重命名所佔用的名稱配置（undo 後呼叫）
+
+    Args:
+        store_path: 名稱配置資料庫路徑
+        entries: 重命名日誌的項目（old / new 為絕對路徑）
+    """
+    store_path = Path(store_path)
+    if not store_path.exists():
+        return
+    conn = sqlite3.connect(str(store_path))
+    try:
+        conn.executemany(
+            "DELETE FROM allocations WHERE directory = ? AND old_name = ? AND new_name = ?",
+            [(str(Path(e["old"]).parent), Path(e["old"]).name, Path(e["new"]).name) for e in entries]
+        )
+        conn.commit()
+    finally:
+        conn.close()
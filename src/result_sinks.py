@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+結果輸出槽（Sink）- 用於串流模式的常數記憶體輸出
+
+功能：
+- JSON Lines 輸出槽：每筆結果一行，邊產生邊寫入，可用 head/tail/jq 逐行檢視
+- SQLite 輸出槽：以鍵值索引保存結果，支援中斷後依鍵查詢恢復
+- 運行中彙總（RunningReport）：報告以累加計數產生，不保存完整結果列表
+
+設計原理：
+- 記憶體用量與圖庫大小無關（只保留單一目錄的暫存資料）
+- 批次提交（flush）以減少 I/O 次數
+- 輸出格式與既有 JSON 報告的欄位一致，方便轉換和比對
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+# 報告中最多保留的錯誤明細數（其餘只計數）
+MAX_REPORTED_ERRORS = 100
+
+
+class JsonLinesSink:
+    """JSON Lines 輸出槽（只追加，不支援依鍵查詢）"""
+
+    suffix = ".jsonl"
+    supports_lookup = False
+
+    def __init__(self, path: Path, key_field: str = "filename"):
+        """
+        初始化 JSON Lines 輸出槽
+
+        Args:
+            path: 輸出檔案路徑（會被覆寫）
+            key_field: 記錄的主鍵欄位（保留介面一致，JSONL 不建索引）
+        """
+        self.path = Path(path)
+        self.key_field = key_field
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self.count = 0
+
+    def write(self, record: Dict):
+        """寫入一筆記錄"""
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """JSONL 不支援查詢"""
+        return None
+
+    def __contains__(self, key: str) -> bool:
+        return False
+
+    def flush(self):
+        """將緩衝區寫入磁碟"""
+        self._file.flush()
+
+    def close(self):
+        """關閉檔案"""
+        if not self._file.closed:
+            self._file.close()
+
+    def iter_records(self) -> Iterator[Dict]:
+        """逐行讀回記錄（不一次載入整個檔案）"""
+        self.flush()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SqliteSink:
+    """SQLite 輸出槽（以主鍵索引，支援中斷恢復）"""
+
+    suffix = ".sqlite"
+    supports_lookup = True
+
+    def __init__(self, path: Path, key_field: str = "filename"):
+        """
+        初始化 SQLite 輸出槽
+
+        Args:
+            path: 資料庫檔案路徑（已存在時保留內容以支援恢復）
+            key_field: 記錄的主鍵欄位
+        """
+        self.path = Path(path)
+        self.key_field = key_field
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " key TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self.count = 0
+
+    def write(self, record: Dict):
+        """寫入（或覆寫）一筆記錄，提交延後到 flush"""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO records (key, data) VALUES (?, ?)",
+            (record[self.key_field], json.dumps(record, ensure_ascii=False))
+        )
+        self.count += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """依主鍵查詢記錄"""
+        row = self._conn.execute(
+            "SELECT data FROM records WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __contains__(self, key: str) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM records WHERE key = ?", (key,)
+        ).fetchone() is not None
+
+    def flush(self):
+        """提交交易"""
+        self._conn.commit()
+
+    def close(self):
+        """提交並關閉連線"""
+        self._conn.commit()
+        self._conn.close()
+
+    def iter_records(self) -> Iterator[Dict]:
+        """依寫入順序逐筆讀回記錄"""
+        self.flush()
+        for (data,) in self._conn.execute("SELECT data FROM records ORDER BY rowid"):
+            yield json.loads(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+SINK_TYPES = {
+    "jsonl": JsonLinesSink,
+    "sqlite": SqliteSink,
+}
+
+
+def open_sink(kind: str, stem: Path, key_field: str = "filename"):
+    """
+    依類型開啟輸出槽
+
+    Args:
+        kind: "jsonl" 或 "sqlite"
+        stem: 不含副檔名的輸出路徑
+        key_field: 記錄的主鍵欄位
+    """
+    sink_cls = SINK_TYPES[kind]
+    stem = Path(stem)
+    return sink_cls(stem.with_name(stem.name + sink_cls.suffix), key_field)
+
+
+def iter_stored_records(path: Path) -> Iterator[Dict]:
+    """
+    逐筆讀取已保存的記錄（依副檔名判斷格式）
+
+    - .jsonl：每行一筆
+    - .sqlite：SqliteSink 的資料表
+    - .json：列表，或含 detailed_results / results 列表的文件
+    """
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    elif path.suffix == ".sqlite":
+        conn = sqlite3.connect(str(path))
+        try:
+            for (data,) in conn.execute("SELECT data FROM records ORDER BY rowid"):
+                yield json.loads(data)
+        finally:
+            conn.close()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("detailed_results", data.get("results", []))
+        yield from data
+
+
+class RunningReport:
+    """運行中彙總：以計數器累加，取代保存完整結果列表後再統計"""
+
+    def __init__(self):
+        self.total_images = 0
+        self.skipped_renamed = 0
+        self.analyzed = 0
+        self.resumed = 0
+        self.successful = 0
+        self.failed = 0
+        self.renamed = 0
+        self.deleted = 0
+        self.directories = 0
+        self.errors: List[Dict] = []
+        self.errors_truncated = 0
+        self.rename_error_count = 0
+
+    def add_analysis(self, succeeded: bool, resumed: bool = False):
+        """累加一筆分析結果"""
+        self.analyzed += 1
+        if resumed:
+            self.resumed += 1
+        if succeeded:
+            self.successful += 1
+        else:
+            self.failed += 1
+
+    def add_rename(self, deleted: bool = False):
+        """累加一筆成功的重命名"""
+        self.renamed += 1
+        if deleted:
+            self.deleted += 1
+
+    def add_rename_error(self, error: Dict):
+        """累加一筆重命名錯誤（明細最多保留 MAX_REPORTED_ERRORS 筆）"""
+        self.rename_error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+        else:
+            self.errors_truncated += 1
+
+    def to_dict(self) -> Dict:
+        """輸出與 qwen_rename_final_report.json 相同欄位的報告"""
+        return {
+            "total_images": self.total_images,
+            "analyzed": self.analyzed,
+            "successful_analysis": self.successful,
+            "failed_analysis": self.failed,
+            "renamed": self.renamed,
+            "rename_errors": self.rename_error_count,
+            "deleted": self.deleted,
+            "errors": self.errors,
+            "errors_truncated": self.errors_truncated,
+            "skipped_renamed": self.skipped_renamed,
+            "resumed": self.resumed,
+            "directories": self.directories,
+        }
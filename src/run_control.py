@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+執行控制 - 暫停、繼續、取消進行中的引擎任務
+
+功能：
+- RunControl：其他線程（或訊號處理函式）呼叫 pause() / resume() / cancel()，
+  引擎在安全點（每張圖片分析前、每個重命名項目前）呼叫 checkpoint()
+  - 暫停中：checkpoint() 先執行 on_pause（引擎立即保存進度），再阻塞到繼續或取消
+  - 已取消：checkpoint() 拋出 RunCancelled
+- 進行中的請求：
+  - 暫停和一般取消（drain）等目前的請求完成，結果照常保存
+  - 立即取消（cancel(abandon=True)）不再等待：call() 立即拋出 RunCancelled，
+    該圖片不記錄結果，恢復時重新分析；重試前的等待（sleep()）也會立即中止
+- RunCancelled：取消時拋出，呼叫端（CLI、job_server、GUI）捕捉
+
+設計原理：
+- 協作式：圖片之間才停下，已寫入的結果和日誌保持一致
+- 放棄的請求留在背景線程中完成後丟棄（HTTP 連線無法安全地從其他線程中斷），
+  模型端最多再生成一次回應（max_tokens）
+- 未暫停、未取消時 checkpoint() 只檢查兩個 Event，不影響吞吐量
+"""
+
+import threading
+from typing import Callable, Optional
+
+
+class RunCancelled(Exception):
+    """任務已取消"""
+
+
+class RunControl:
+    """任務的暫停 / 繼續 / 取消狀態（線程安全）"""
+
+    def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+        self._abandon = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self, abandon: bool = False):
+        """
+        取消（暫停中的任務也會立即從 checkpoint() 返回）
+
+        Args:
+            abandon: 放棄進行中的請求，不等待回應
+        """
+        self._cancelled.set()
+        if abandon:
+            with self._changed:
+                self._abandon.set()
+                self._changed.notify_all()
+        self._running.set()
+
+    def checkpoint(self, on_pause: Optional[Callable[[], None]] = None) -> bool:
+        """
+        安全點：暫停時等待繼續
+
+        Args:
+            on_pause: 開始等待前呼叫（保存進度、發出事件）
+
+        Returns:
+            是否曾暫停
+
+        Raises:
+            RunCancelled: 任務已取消
+        """
+        paused = not self._running.is_set()
+        if paused:
+            if on_pause is not None:
+                on_pause()
+            self._running.wait()
+        if self._cancelled.is_set():
+            raise RunCancelled()
+        return paused
+
+    def sleep(self, seconds: float):
+        """
+        可被取消中斷的等待（重試前的等待）
+
+        Raises:
+            RunCancelled: 等待期間任務已取消
+        """
+        if self._cancelled.wait(seconds):
+            raise RunCancelled()
+
+    def call(self, func: Callable, *args, **kwargs):
+        """
+        執行可被放棄的呼叫（進行中的請求）
+
+        Raises:
+            RunCancelled: 已要求立即取消（呼叫留在背景線程完成，結果丟棄）
+        """
+        if self._abandon.is_set():
+            raise RunCancelled()
+        outcome = {}
+
+        def target():
+            try:
+                outcome["value"] = func(*args, **kwargs)
+            except BaseException as e:
+                outcome["error"] = e
+            with self._changed:
+                outcome["done"] = True
+                self._changed.notify_all()
+
+        threading.Thread(target=target, name="run-control-call", daemon=True).start()
+        with self._changed:
+            while "done" not in outcome and not self._abandon.is_set():
+                self._changed.wait()
+        if "done" not in outcome:
+            raise RunCancelled()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["value"]
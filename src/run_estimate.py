@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分層抽樣估算 - 以少量實際分析推估整個圖庫的執行時間、傳輸量和 token 用量
+
+功能：
+- stratum_key()：依（目錄, 副檔名, 檔案大小區間）分層
+- RunEstimator：
+  - draw_sample()：依各層檔案數比例配置樣本（最大餘數法），層內隨機抽樣
+  - add()：記錄樣本的耗時、成功與否、token 用量
+  - project()：推估全部待分析檔案的總耗時（附 95% 信賴區間）、預期失敗數、token 總量
+- 沒有抽到樣本的層，依序以同（副檔名, 大小區間）的合併層、全部樣本的統計代替
+
+設計原理：
+- --limit 只取排序後的前 N 張，通常集中在同一個目錄、同一種格式；分層抽樣讓每種
+  組合都有代表，推估結果才接近完整執行
+- 傳輸量不需要抽樣：請求大小由檔案大小決定（base64 + 固定的請求內容），直接加總
+- 總耗時的變異數為 Σ N²·s²/n·(1 - n/N)（分層抽樣的總量估計）；
+  層內樣本少於 2 個時，s² 借用合併層的變異數
+"""
+
+import math
+import random
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# 檔案大小區間上界（位元組）
+SIZE_BUCKETS = ((256 * 1024, "≤256KB"), (1024 * 1024, "≤1MB"), (4 * 1024 * 1024, "≤4MB"))
+# 95% 信賴區間的 z 值
+Z_95 = 1.96
+
+StratumKey = Tuple[str, str, str]
+
+
+def size_bucket(size: int) -> str:
+    """檔案大小區間（例如 "≤1MB"、">4MB"）"""
+    for bound, label in SIZE_BUCKETS:
+        if size <= bound:
+            return label
+    return ">4MB"
+
+
+def stratum_key(path: Path, root: Path, size: int) -> StratumKey:
+    """（相對目錄, 副檔名, 大小區間）"""
+    parent = path.parent
+    directory = parent.relative_to(root).as_posix() if parent != root else "."
+    return directory, path.suffix.lower(), size_bucket(size)
+
+
+def base64_length(size: int) -> int:
+    """size 位元組以 base64 編碼後的長度"""
+    return (size + 2) // 3 * 4
+
+
+class _Stats:
+    """單一層（或合併層）的樣本統計"""
+
+    __slots__ = ("samples", "failures", "latency_sum", "latency_sq", "tokens", "token_samples")
+
+    def __init__(self):
+        self.samples = 0
+        self.failures = 0
+        self.latency_sum = 0.0
+        self.latency_sq = 0.0
+        self.tokens = 0
+        self.token_samples = 0
+
+    def add(self, latency: float, succeeded: bool, tokens: Optional[int]):
+        self.samples += 1
+        self.failures += 0 if succeeded else 1
+        self.latency_sum += latency
+        self.latency_sq += latency * latency
+        if tokens is not None:
+            self.tokens += tokens
+            self.token_samples += 1
+
+    @property
+    def mean(self) -> float:
+        return self.latency_sum / self.samples if self.samples else 0.0
+
+    @property
+    def variance(self) -> float:
+        """樣本變異數（少於 2 個樣本時為 0）"""
+        if self.samples < 2:
+            return 0.0
+        return max(0.0, (self.latency_sq - self.samples * self.mean ** 2) / (self.samples - 1))
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.samples if self.samples else 0.0
+
+    @property
+    def mean_tokens(self) -> Optional[float]:
+        return self.tokens / self.token_samples if self.token_samples else None
+
+
+class RunEstimator:
+    """分層抽樣和推估"""
+
+    def __init__(self, files: List[Tuple[Path, int]], root: Path):
+        """
+        Args:
+            files: 待分析的（路徑, 檔案大小）列表
+            root: 目標目錄
+        """
+        self.root = Path(root)
+        self.strata: Dict[StratumKey, List[Tuple[Path, int]]] = {}
+        for path, size in files:
+            self.strata.setdefault(stratum_key(path, self.root, size), []).append((path, size))
+        self.total_files = len(files)
+        self.total_bytes = sum(size for _, size in files)
+        self.stats: Dict[StratumKey, _Stats] = {}
+
+    def allocate(self, sample_size: int) -> Dict[StratumKey, int]:
+        """
+        依各層檔案數比例配置樣本數（最大餘數法）
+
+        樣本數不少於層數時每層至少 1 個；否則只有比例最大的層會被抽到。
+        """
+        sample_size = min(sample_size, self.total_files)
+        if sample_size <= 0:
+            return {}
+        keys = sorted(self.strata, key=lambda k: (-len(self.strata[k]), k))
+        allocation = {key: 0 for key in keys}
+        remaining = sample_size
+        if sample_size >= len(keys):
+            for key in keys:
+                allocation[key] = 1
+            remaining -= len(keys)
+
+        shares = {key: remaining * len(self.strata[key]) / self.total_files for key in keys}
+        for key in keys:
+            allocation[key] += int(shares[key])
+        leftover = sample_size - sum(allocation.values())
+        for key in sorted(keys, key=lambda k: -(shares[k] - int(shares[k])))[:leftover]:
+            allocation[key] += 1
+        # 樣本數不能超過層內檔案數，多出的依序給其他還有餘裕的層
+        overflow = 0
+        for key in keys:
+            excess = allocation[key] - len(self.strata[key])
+            if excess > 0:
+                allocation[key] -= excess
+                overflow += excess
+        for key in keys:
+            if overflow <= 0:
+                break
+            room = min(overflow, len(self.strata[key]) - allocation[key])
+            allocation[key] += room
+            overflow -= room
+        return {key: count for key, count in allocation.items() if count}
+
+    def draw_sample(self, sample_size: int, seed: Optional[int] = None) -> List[Tuple[StratumKey, Path]]:
+        """依配置的樣本數在各層內隨機抽樣（打亂順序，避免依目錄連續處理）"""
+        rng = random.Random(seed)
+        sample = []
+        for key, count in self.allocate(sample_size).items():
+            for path, _ in rng.sample(self.strata[key], count):
+                sample.append((key, path))
+        rng.shuffle(sample)
+        return sample
+
+    def add(self, key: StratumKey, latency: float, succeeded: bool, tokens: Optional[int] = None):
+        """記錄一個樣本的結果"""
+        self.stats.setdefault(key, _Stats()).add(latency, succeeded, tokens)
+
+    def _fallbacks(self) -> Tuple[Dict[Tuple[str, str], _Stats], _Stats]:
+        by_kind: Dict[Tuple[str, str], _Stats] = {}
+        overall = _Stats()
+        for (directory, extension, bucket), stats in self.stats.items():
+            for target in (by_kind.setdefault((extension, bucket), _Stats()), overall):
+                target.samples += stats.samples
+                target.failures += stats.failures
+                target.latency_sum += stats.latency_sum
+                target.latency_sq += stats.latency_sq
+                target.tokens += stats.tokens
+                target.token_samples += stats.token_samples
+        return by_kind, overall
+
+    def project(self, request_delay: float = 0.0, request_overhead: int = 0) -> Dict:
+        """
+        推估全部待分析檔案
+
+        Args:
+            request_delay: 每張圖片之後的固定延遲（秒）
+            request_overhead: 每個請求除 base64 圖片外的位元組數
+
+        Returns:
+            {"files", "sampled", "seconds", "seconds_low", "seconds_high", "expected_failures",
+             "request_bytes", "image_bytes", "tokens", "strata": [...]}
+        """
+        by_kind, overall = self._fallbacks()
+        seconds = variance = failures = 0.0
+        tokens = 0.0
+        tokens_known = False
+        request_bytes = 0
+        strata = []
+        for key, files in self.strata.items():
+            count = len(files)
+            stats = self.stats.get(key)
+            source = "stratum"
+            if stats is None or not stats.samples:
+                stats = by_kind.get(key[1:])
+                source = "extension_size"
+                if stats is None or not stats.samples:
+                    stats, source = overall, "overall"
+            stratum_seconds = count * (stats.mean + request_delay)
+            seconds += stratum_seconds
+            if stats.samples:
+                # 少於 2 個樣本無法估計層內變異數，借用合併層的變異數
+                spread = stats
+                for candidate in (by_kind.get(key[1:]), overall):
+                    if spread.samples >= 2 or candidate is None:
+                        break
+                    spread = candidate
+                fpc = max(0.0, 1 - stats.samples / count) if source == "stratum" else 1.0
+                variance += count * count * spread.variance / stats.samples * fpc
+            failures += count * stats.failure_rate
+            if stats.mean_tokens is not None:
+                tokens += count * stats.mean_tokens
+                tokens_known = True
+            stratum_bytes = sum(base64_length(size) for _, size in files) + count * request_overhead
+            request_bytes += stratum_bytes
+            directory, extension, bucket = key
+            strata.append({
+                "directory": directory,
+                "extension": extension,
+                "size_bucket": bucket,
+                "files": count,
+                "sampled": self.stats[key].samples if key in self.stats else 0,
+                "estimate_from": source,
+                "mean_latency": round(stats.mean, 3),
+                "failure_rate": round(stats.failure_rate, 3),
+                "projected_seconds": round(stratum_seconds, 1),
+                "request_bytes": stratum_bytes,
+            })
+
+        margin = Z_95 * math.sqrt(variance)
+        strata.sort(key=lambda s: -s["projected_seconds"])
+        return {
+            "files": self.total_files,
+            "sampled": overall.samples,
+            "strata_count": len(self.strata),
+            "seconds": round(seconds, 1),
+            "seconds_low": round(max(0.0, seconds - margin), 1),
+            "seconds_high": round(seconds + margin, 1),
+            "expected_failures": round(failures, 1),
+            "sample_failure_rate": round(overall.failure_rate, 3),
+            "image_bytes": self.total_bytes,
+            "request_bytes": request_bytes,
+            "tokens": round(tokens) if tokens_known else None,
+            "strata": strata,
+        }
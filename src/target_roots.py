@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多目錄模式 - 目標目錄清單、清單檔（manifest）和各目錄的 session 命名空間
+
+功能：
+- read_manifest()：讀取清單檔（每行一個目錄，# 開頭為註解，相對路徑以清單檔所在目錄為準）
+- check_roots()：展開、去除重複，拒絕不存在或互相包含的目錄
+- root_session_dir()：每個目標目錄在 session 目錄下的獨立命名空間
+  （session/roots/<目錄名稱>-<路徑雜湊>/），分析結果、命名計畫、報告和重命名日誌互不覆蓋
+
+使用方式：
+    roots = check_roots(read_manifest("clients.txt"))
+    for root in roots:
+        engine.set_target_dir(root, session_dir=root_session_dir(base, root))
+
+設計原理：
+- 命名空間以絕對路徑的雜湊區分，同名的不同目錄不會衝突；
+  目錄名稱保留在前綴，方便手動查看（undo / status 以 --target-dir 指定目錄）
+- 互相包含的目錄會被處理兩次（外層目錄的掃描也包含內層），直接拒絕
+"""
+
+import hashlib
+import re
+from pathlib import Path
+from typing import Iterable, List
+
+# 命名空間前綴中保留的目錄名稱長度
+NAME_LENGTH = 40
+
+_UNSAFE = re.compile(r'[^\w.-]+')
+
+
+def read_manifest(path: Path) -> List[Path]:
+    """
+    讀取清單檔
+
+    Raises:
+        OSError: 無法讀取清單檔
+    """
+    path = Path(path).expanduser()
+    roots = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            entry = line.strip()
+            if not entry or entry.startswith("#"):
+                continue
+            root = Path(entry).expanduser()
+            roots.append(root if root.is_absolute() else path.parent / root)
+    return roots
+
+
+def check_roots(roots: Iterable[Path]) -> List[Path]:
+    """
+    展開為絕對路徑並去除重複（保持順序）
+
+    Raises:
+        ValueError: 目錄不存在、沒有任何目錄，或兩個目錄互相包含
+    """
+    unique: List[Path] = []
+    for root in roots:
+        resolved = Path(root).expanduser().resolve()
+        if not resolved.is_dir():
+            raise ValueError(f"目錄不存在：{root}")
+        if resolved not in unique:
+            unique.append(resolved)
+    if not unique:
+        raise ValueError("沒有任何目標目錄")
+    for i, outer in enumerate(unique):
+        for inner in unique[i + 1:]:
+            if outer in inner.parents or inner in outer.parents:
+                raise ValueError(f"目標目錄互相包含：{outer} 和 {inner}")
+    return unique
+
+
+def root_namespace(root: Path) -> str:
+    """目錄的命名空間名稱（<目錄名稱>-<絕對路徑雜湊 8 碼>）"""
+    resolved = Path(root).expanduser().resolve()
+    digest = hashlib.sha1(str(resolved).encode('utf-8')).hexdigest()[:8]
+    name = _UNSAFE.sub("_", resolved.name)[:NAME_LENGTH] or "root"
+    return f"{name}-{digest}"
+
+
+def root_session_dir(session_dir: Path, root: Path) -> Path:
+    """目錄在 session 目錄下的命名空間"""
+    return Path(session_dir) / "roots" / root_namespace(root)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Token 用量統計 - 記錄每張圖片的 prompt / completion token 和伺服器計時
+
+功能：
+- extract_usage()：從 chat/completions 回應取出 usage 區段和伺服器計時
+  （LM Studio 的 stats、llama.cpp 的 timings，存在時一併保存）
+- image_dimensions()：從已讀入的檔頭解析寬高（PNG / JPEG / GIF / BMP / WebP，不需 Pillow）
+- TokenUsageReport：依副檔名、尺寸區間、目錄彙總，寫入最終報告的 token_usage
+
+每張圖片的用量保存在分析結果的 usage 欄位：
+    {"prompt_tokens": 812, "completion_tokens": 96, "total_tokens": 908,
+     "request_seconds": 3.42, "image_bytes": 184320, "width": 1920, "height": 1080}
+
+設計原理：
+- 只解析已在記憶體中的圖片位元組，不增加磁碟讀取
+- 圖片 token 數主要取決於解析度，因此以長邊分區間比較前處理的效果
+- 伺服器沒有返回 usage 時不產生欄位，報告中以 images_without_usage 計數
+"""
+
+import struct
+from typing import Dict, Optional, Tuple
+
+# 尺寸區間的長邊上界（像素）
+DIMENSION_BUCKETS = (512, 1024, 2048, 4096)
+# 用量中要彙總的數值欄位
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+# 伺服器計時欄位（依伺服器實作不同）
+SERVER_TIMING_KEYS = ("stats", "timings")
+
+
+def extract_usage(response: Dict) -> Optional[Dict]:
+    """
+    取出回應中的 token 用量和伺服器計時
+
+    Returns:
+        {"prompt_tokens", "completion_tokens", "total_tokens", ["server_timing"]}；
+        回應沒有 usage 時返回 None
+    """
+    usage = response.get("usage")
+    if not isinstance(usage, dict):
+        return None
+    result = {field: usage[field] for field in TOKEN_FIELDS if isinstance(usage.get(field), int)}
+    if "total_tokens" not in result and "prompt_tokens" in result and "completion_tokens" in result:
+        result["total_tokens"] = result["prompt_tokens"] + result["completion_tokens"]
+    for key in SERVER_TIMING_KEYS:
+        if isinstance(response.get(key), dict):
+            result["server_timing"] = response[key]
+            break
+    return result or None
+
+
+def image_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """從圖片位元組的檔頭解析（寬, 高）；無法辨識時返回 None"""
+    try:
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            return struct.unpack(">II", data[16:24])
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", data[6:10])
+        if data[:2] == b"BM":
+            width, height = struct.unpack("<ii", data[18:26])
+            return width, abs(height)
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _webp_dimensions(data)
+        if data[:2] == b"\xff\xd8":
+            return _jpeg_dimensions(data)
+    except struct.error:
+        return None
+    return None
+
+
+def _webp_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = struct.unpack("<I", data[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    offset = 2
+    while offset + 9 < len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # 填充位元組
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+        # SOF0～SOF15（不含 DHT、JPG、DAC）
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def dimension_bucket(width: Optional[int], height: Optional[int]) -> str:
+    """依長邊分區間（例如 "≤1024"、">4096"、"unknown"）"""
+    if not width or not height:
+        return "unknown"
+    long_edge = max(width, height)
+    for bound in DIMENSION_BUCKETS:
+        if long_edge <= bound:
+            return f"≤{bound}"
+    return f">{DIMENSION_BUCKETS[-1]}"
+
+
+def _bucket_order(item) -> int:
+    """尺寸區間由小到大排列（unknown 在最後）"""
+    order = [f"≤{bound}" for bound in DIMENSION_BUCKETS] + [f">{DIMENSION_BUCKETS[-1]}"]
+    return order.index(item[0]) if item[0] in order else len(order)
+
+
+class _UsageTotals:
+    __slots__ = ("images", "prompt_tokens", "completion_tokens", "total_tokens", "request_seconds")
+
+    def __init__(self):
+        self.images = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.request_seconds = 0.0
+
+    def add(self, usage: Dict):
+        self.images += 1
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        self.total_tokens += usage.get("total_tokens", 0)
+        self.request_seconds += usage.get("request_seconds", 0.0)
+
+    def to_dict(self) -> Dict:
+        images = self.images or 1
+        return {
+            "images": self.images,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / images, 1),
+            "avg_completion_tokens": round(self.completion_tokens / images, 1),
+            "avg_request_seconds": round(self.request_seconds / images, 3),
+        }
+
+
+class TokenUsageReport:
+    """token 用量的運行中彙總（依副檔名、尺寸區間、目錄）"""
+
+    def __init__(self):
+        self.totals = _UsageTotals()
+        self.by_extension: Dict[str, _UsageTotals] = {}
+        self.by_dimension: Dict[str, _UsageTotals] = {}
+        self.by_directory: Dict[str, _UsageTotals] = {}
+        self.images_without_usage = 0
+
+    def add(self, record):
+        """累加一筆分析記錄（AnalysisRecord）的 usage 欄位（失敗的記錄不計）"""
+        if not record.succeeded:
+            return
+        usage = record.extra.get("usage") if record.extra else None
+        if not usage:
+            self.images_without_usage += 1
+            return
+        extension = record.name.rpartition(".")[2].lower() if "." in record.name else ""
+        bucket = dimension_bucket(usage.get("width"), usage.get("height"))
+        directory = record.directory or "."
+        self.totals.add(usage)
+        for groups, key in ((self.by_extension, extension),
+                            (self.by_dimension, bucket),
+                            (self.by_directory, directory)):
+            totals = groups.get(key)
+            if totals is None:
+                totals = groups[key] = _UsageTotals()
+            totals.add(usage)
+
+    def to_dict(self) -> Dict:
+        """最終報告的 token_usage 區段"""
+        return {
+            **self.totals.to_dict(),
+            "images_without_usage": self.images_without_usage,
+            "by_extension": {k: v.to_dict() for k, v in sorted(self.by_extension.items())},
+            "by_dimension": {k: v.to_dict() for k, v in sorted(self.by_dimension.items(), key=_bucket_order)},
+            "by_directory": {k: v.to_dict() for k, v in sorted(self.by_directory.items())},
+        }
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+執行追蹤 - 每張圖片的各步驟耗時，輸出 Chrome trace / Perfetto 格式
+
+功能：
+- TraceRecorder：以 span() 包住要量測的區塊，寫出 Trace Event Format 的 "X"（完整事件）
+- 同一執行緒內的 span 依時間自動巢狀（image → read / encode / request / parse）
+- NULL_TRACER：未啟用追蹤時使用，span() 返回共用的空 context manager
+- traced_stage()：方法裝飾器，把整個階段（scan / analysis / plan / rename）記錄為一個 span
+
+檢視方式：
+    在 https://ui.perfetto.dev 或 chrome://tracing 開啟輸出的 .json 檔案
+
+設計原理：
+- 逐事件串流寫入 JSON 陣列（格式允許省略結尾的 ]），中斷時已寫入的 span 仍可檢視
+- 時間戳使用 perf_counter_ns，相對於追蹤開始時間（微秒）
+- 未啟用時不讀時鐘、不建立物件，呼叫端不必另外判斷
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+class _NullSpan:
+    """不記錄任何內容的 span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTracer:
+    """未啟用追蹤時的追蹤器（所有操作皆為空操作）"""
+
+    enabled = False
+
+    def span(self, name: str, cat: str = "step", **args) -> _NullSpan:
+        return _NULL_SPAN
+
+    def instant(self, name: str, cat: str = "step", **args):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class _Span:
+    """一段量測區間（離開時寫出事件）"""
+
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer: "TraceRecorder", name: str, cat: str, args: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._complete(self.name, self.cat, self.start, end, self.args)
+        return False
+
+    def set(self, **args):
+        """補充 span 的參數（例如回應大小、狀態碼）"""
+        self.args.update(args)
+
+
+class TraceRecorder:
+    """Chrome trace（Trace Event Format）記錄器"""
+
+    enabled = True
+
+    def __init__(self, path: Path, process_name: str = "image-rename"):
+        """
+        Args:
+            path: 輸出檔案路徑（.json）
+            process_name: 在檢視器中顯示的行程名稱
+        """
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.pid = os.getpid()
+        self.origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._threads = set()
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write('[\n')
+        self._write({
+            "name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+            "args": {"name": process_name},
+        })
+
+    def span(self, name: str, cat: str = "step", **args) -> _Span:
+        """
+        建立一個 span（以 with 使用）
+
+        Args:
+            name: 步驟名稱（例如 read、encode、request）
+            cat: 分類（stage 為階段、image 為單張圖片、step 為步驟）
+            **args: 顯示在檢視器中的參數
+        """
+        return _Span(self, name, cat, args)
+
+    def instant(self, name: str, cat: str = "step", **args):
+        """記錄一個瞬間事件（例如重試）"""
+        tid = self._thread_id()
+        self._write({
+            "name": name, "cat": cat, "ph": "i", "s": "t", "pid": self.pid, "tid": tid,
+            "ts": (time.perf_counter_ns() - self.origin) / 1000, "args": args,
+        })
+
+    def _thread_id(self) -> int:
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads.add(tid)
+            self._write({
+                "name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                "args": {"name": threading.current_thread().name},
+            })
+        return tid
+
+    def _complete(self, name: str, cat: str, start: int, end: int, args: Dict):
+        self._write({
+            "name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": self._thread_id(),
+            "ts": (start - self.origin) / 1000, "dur": (end - start) / 1000, "args": args,
+        })
+
+    def _write(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + ',\n')
+
+    def close(self):
+        """寫入結尾並關閉檔案"""
+        with self._lock:
+            if self._file is None:
+                return
+            # 以結束標記取代最後一個逗號，讓嚴格的 JSON 解析器也能讀取
+            self._file.write(json.dumps({
+                "name": "trace_end", "ph": "i", "s": "g", "pid": self.pid, "tid": 0,
+                "ts": (time.perf_counter_ns() - self.origin) / 1000,
+            }) + '\n]\n')
+            self._file.close()
+            self._file = None
+
+
+def traced_stage(name: str) -> Callable:
+    """以 self.tracer 把方法的執行期間記錄為一個階段 span"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(name, cat="stage"):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def open_tracer(path: Optional[str]):
+    """依命令行參數建立追蹤器（未指定路徑時返回 NULL_TRACER）"""
+    if not path:
+        return NULL_TRACER
+    return TraceRecorder(Path(path))
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多機分工 - 以共享目錄（NAS）上的租約檔案分配圖庫的分析區塊
+
+共享目錄結構（默認為目標目錄下的 .rename_shard/）：
+    manifest.json               區塊清單（第一個啟動的機器掃描後發佈，之後不變）
+    leases/chunk-00012.lease    區塊租約 {"worker", "acquired", "expires"}
+    leases/final.lease          最終規劃和重命名的租約
+    results/00012-<worker>.jsonl  區塊的分析結果（每台機器各自的檔案，逐筆追加）
+    done/00012.json             區塊完成標記
+    final.json                  最終報告（存在時表示已完成規劃和重命名）
+
+功能：
+- LeaseDir：租約的取得、續約、釋放；過期的租約（機器當機或斷線）可被其他機器接手
+- LeaseKeeper：背景線程定期續約，續約失敗（租約已被接手）時標記為遺失
+- ShardStore：發佈 / 讀取區塊清單、領取下一個區塊、寫入和合併結果、完成標記、進度統計
+
+設計原理：
+- 只依賴共享檔案系統的原子操作，不需要額外的協調服務：
+  - 建立：先寫暫存檔再 os.link 到目標名稱（目標已存在時失敗，NFS 上也是原子的），
+    讀取端看不到寫到一半的內容；檔案系統不支援硬連結時改用 O_EXCL
+  - 接手過期租約：os.rename 移到唯一的暫存名稱，同時嘗試的機器只有一台成功
+- 每台機器只寫自己的結果檔，不同機器不會同時追加同一個檔案（NFS 的 O_APPEND 不可靠）
+- 租約只保證區塊不會長期被重複處理：網路延遲或時鐘誤差可能讓兩台機器短暫處理同一區塊，
+  結果以檔名去重（成功的優先），重複分析只浪費時間，不影響正確性
+- 過期時間以寫入端的時鐘記錄，各機器的時鐘需大致同步（NTP）；默認租約 120 秒，
+  每 1/3 租約時間續約一次
+"""
+
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+# 區塊大小（張）和租約時間（秒）
+CHUNK_SIZE = 50
+LEASE_SECONDS = 120.0
+
+_UNSAFE = re.compile(r'[^\w.-]+')
+
+
+def default_worker_name() -> str:
+    """默認的工作者名稱（主機名稱-行程編號）"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def split_chunks(filenames: Sequence[str], chunk_size: int = CHUNK_SIZE) -> List[List[str]]:
+    """依排序後的相對路徑切成區塊（同一目錄的檔案大多落在同一區塊）"""
+    ordered = sorted(filenames)
+    return [ordered[i:i + chunk_size] for i in range(0, len(ordered), chunk_size)]
+
+
+def _publish(path: Path, data: Dict) -> bool:
+    """
+    原子地建立檔案（已存在時返回 False）
+
+    先寫完暫存檔再硬連結到目標名稱，其他機器不會讀到寫到一半的內容。
+    """
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.link(temp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    except OSError:
+        # 不支援硬連結的檔案系統（部分 SMB 掛載）：改用 O_EXCL 建立
+        try:
+            fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return True
+    finally:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+def _replace(path: Path, data: Dict):
+    """原子地覆寫檔案（暫存檔 + os.replace）"""
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def _load(path: Path) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class LeaseDir:
+    """一個目錄中的租約檔案"""
+
+    def __init__(self, directory: Path, worker: str, lease_seconds: float = LEASE_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            directory: 租約目錄（共享檔案系統）
+            worker: 本機的工作者名稱
+            lease_seconds: 租約時間（超過未續約即視為過期）
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f"{name}.lease"
+
+    def holder(self, name: str) -> Optional[Dict]:
+        """
+        目前的租約（沒有租約時返回 None）
+
+        內容無法解析時（O_EXCL 建立中）以檔案修改時間推算過期時間。
+        """
+        path = self._path(name)
+        info = _load(path)
+        if info is not None:
+            return info
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return None
+        return {"worker": None, "acquired": mtime, "expires": mtime + self.lease_seconds}
+
+    def _new_lease(self) -> Dict:
+        now = self.clock()
+        return {"worker": self.worker, "acquired": now, "expires": now + self.lease_seconds}
+
+    def try_acquire(self, name: str) -> bool:
+        """
+        取得租約（自己持有時視為續約；他人持有且未過期時返回 False）
+        """
+        path = self._path(name)
+        current = self.holder(name)
+        if current is not None:
+            if current.get("worker") == self.worker:
+                return self.renew(name)
+            if current["expires"] > self.clock():
+                return False
+            # 過期：移到唯一的名稱，同時接手的機器只有一台成功
+            stale = path.with_name(f".{path.name}.{uuid.uuid4().hex}.stale")
+            try:
+                os.rename(path, stale)
+            except OSError:
+                return False
+            moved = _load(stale)
+            try:
+                if moved is not None and moved.get("worker") != self.worker \
+                        and moved["expires"] > self.clock():
+                    # 讀取和移動之間原持有者剛好續約：歸還（已被他人建立時放棄）
+                    try:
+                        os.link(stale, path)
+                    except OSError:
+                        pass
+                    return False
+            finally:
+                try:
+                    os.unlink(stale)
+                except OSError:
+                    pass
+        return _publish(path, self._new_lease())
+
+    def renew(self, name: str) -> bool:
+        """續約（租約已被他人接手或已不存在時返回 False）"""
+        current = self.holder(name)
+        if current is None or current.get("worker") != self.worker:
+            return False
+        lease = self._new_lease()
+        lease["acquired"] = current.get("acquired", lease["acquired"])
+        _replace(self._path(name), lease)
+        return True
+
+    def release(self, name: str):
+        """釋放自己持有的租約"""
+        current = self.holder(name)
+        if current is not None and current.get("worker") == self.worker:
+            try:
+                self._path(name).unlink()
+            except OSError:
+                pass
+
+    def list(self) -> Dict[str, Dict]:
+        """目前所有的租約 {名稱: 租約}"""
+        leases = {}
+        for path in self.directory.glob("*.lease"):
+            info = self.holder(path.stem)
+            if info is not None:
+                leases[path.stem] = info
+        return leases
+
+
+class LeaseKeeper:
+    """背景續約線程"""
+
+    def __init__(self, leases: LeaseDir, interval: Optional[float] = None):
+        self.leases = leases
+        self.interval = interval or max(0.5, leases.lease_seconds / 3)
+        self._held = set()
+        self._lost = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def hold(self, name: str):
+        with self._lock:
+            self._held.add(name)
+            self._lost.discard(name)
+
+    def drop(self, name: str):
+        with self._lock:
+            self._held.discard(name)
+
+    def lost(self, name: str) -> bool:
+        """租約是否已被他人接手（應停止處理該區塊）"""
+        with self._lock:
+            return name in self._lost
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                held = list(self._held)
+            for name in held:
+                try:
+                    renewed = self.leases.renew(name)
+                except OSError:
+                    # 共享目錄暫時無法存取：下次再試，租約過期前恢復即可
+                    continue
+                if not renewed:
+                    with self._lock:
+                        self._held.discard(name)
+                        self._lost.add(name)
+
+
+class ShardStore:
+    """共享目錄中的區塊清單、租約、結果和完成標記"""
+
+    def __init__(self, root: Path, worker: Optional[str] = None, lease_seconds: float = LEASE_SECONDS):
+        """
+        Args:
+            root: 共享目錄（所有機器看到的同一個目錄）
+            worker: 本機的工作者名稱（默認：主機名稱-行程編號）
+            lease_seconds: 租約時間
+        """
+        self.root = Path(root)
+        self.worker = worker or default_worker_name()
+        self.results_dir = self.root / "results"
+        self.done_dir = self.root / "done"
+        for directory in (self.root, self.results_dir, self.done_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        self.leases = LeaseDir(self.root / "leases", self.worker, lease_seconds)
+        self.manifest_path = self.root / "manifest.json"
+        self.final_path = self.root / "final.json"
+        self._manifest: Optional[Dict] = None
+        self._writers: Dict[int, object] = {}
+
+    @staticmethod
+    def chunk_lease(chunk_id: int) -> str:
+        return f"chunk-{chunk_id:05d}"
+
+    # ------------------------------------------------------------------
+    # 區塊清單
+    # ------------------------------------------------------------------
+
+    def load_manifest(self) -> Optional[Dict]:
+        if self._manifest is None:
+            self._manifest = _load(self.manifest_path)
+        return self._manifest
+
+    def publish_manifest(self, chunks: List[List[str]], metadata: Dict) -> Dict:
+        """
+        發佈區塊清單（已由其他機器發佈時沿用既有的清單）
+
+        Returns:
+            實際生效的清單
+        """
+        manifest = {**metadata, "created_by": self.worker, "chunks": chunks}
+        if _publish(self.manifest_path, manifest):
+            self._manifest = manifest
+            return manifest
+        self._manifest = None
+        return self.load_manifest()
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.load_manifest()["chunks"])
+
+    def chunk(self, chunk_id: int) -> List[str]:
+        return self.load_manifest()["chunks"][chunk_id]
+
+    # ------------------------------------------------------------------
+    # 領取和完成
+    # ------------------------------------------------------------------
+
+    def is_done(self, chunk_id: int) -> bool:
+        return (self.done_dir / f"{chunk_id:05d}.json").exists()
+
+    def pending_chunks(self) -> List[int]:
+        return [i for i in range(self.chunk_count) if not self.is_done(i)]
+
+    def claim_next(self) -> Optional[int]:
+        """領取下一個尚未完成、沒有有效租約的區塊（沒有時返回 None）"""
+        for chunk_id in self.pending_chunks():
+            if self.leases.try_acquire(self.chunk_lease(chunk_id)):
+                # 取得租約前剛好被完成的區塊
+                if self.is_done(chunk_id):
+                    self.leases.release(self.chunk_lease(chunk_id))
+                    continue
+                return chunk_id
+        return None
+
+    def mark_done(self, chunk_id: int, counts: Dict):
+        """寫入完成標記並釋放租約（結果檔先關閉並同步到磁碟）"""
+        writer = self._writers.pop(chunk_id, None)
+        if writer is not None:
+            writer.flush()
+            os.fsync(writer.fileno())
+            writer.close()
+        _publish(self.done_dir / f"{chunk_id:05d}.json",
+                 {"worker": self.worker, "finished": time.time(), **counts})
+        self.leases.release(self.chunk_lease(chunk_id))
+
+    def abandon(self, chunk_id: int):
+        """放棄區塊（租約遺失或取消）：關閉結果檔，已寫入的結果由下一個接手者沿用"""
+        writer = self._writers.pop(chunk_id, None)
+        if writer is not None:
+            writer.close()
+        self.leases.release(self.chunk_lease(chunk_id))
+
+    # ------------------------------------------------------------------
+    # 結果
+    # ------------------------------------------------------------------
+
+    def append_result(self, chunk_id: int, record: Dict):
+        """追加一筆結果到本機的結果檔（逐筆 flush）"""
+        writer = self._writers.get(chunk_id)
+        if writer is None:
+            name = _UNSAFE.sub("_", self.worker)
+            writer = open(self.results_dir / f"{chunk_id:05d}-{name}.jsonl", 'a', encoding='utf-8')
+            self._writers[chunk_id] = writer
+        writer.write(json.dumps(record, ensure_ascii=False) + "\n")
+        writer.flush()
+
+    def _iter_results(self, pattern: str) -> Iterator[Dict]:
+        for path in sorted(self.results_dir.glob(pattern)):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue  # 當機時寫到一半的最後一行
+            except OSError:
+                continue
+
+    @staticmethod
+    def _merge(records: Iterator[Dict]) -> Dict[str, Dict]:
+        merged: Dict[str, Dict] = {}
+        for record in records:
+            previous = merged.get(record["filename"])
+            if previous is None or (previous.get("status") != "success" and record.get("status") == "success"):
+                merged[record["filename"]] = record
+        return merged
+
+    def chunk_results(self, chunk_id: int) -> Dict[str, Dict]:
+        """區塊已有的結果（所有機器寫入的，成功的優先）"""
+        return self._merge(self._iter_results(f"{chunk_id:05d}-*.jsonl"))
+
+    def all_results(self) -> Dict[str, Dict]:
+        """所有區塊的結果（以檔名去重，成功的優先）"""
+        return self._merge(self._iter_results("*.jsonl"))
+
+    def close(self):
+        for chunk_id in list(self._writers):
+            self.abandon(chunk_id)
+
+    # ------------------------------------------------------------------
+    # 最終規劃和重命名
+    # ------------------------------------------------------------------
+
+    def finalized(self) -> Optional[Dict]:
+        return _load(self.final_path)
+
+    def try_finalize(self) -> bool:
+        """取得最終規劃和重命名的租約（已完成或由他人執行中時返回 False）"""
+        if self.finalized() is not None:
+            return False
+        if not self.leases.try_acquire("final"):
+            return False
+        if self.finalized() is not None:
+            self.leases.release("final")
+            return False
+        return True
+
+    def finish(self, report: Dict):
+        """寫入最終報告並釋放租約"""
+        _publish(self.final_path, {"worker": self.worker, **report})
+        self.leases.release("final")
+
+    # ------------------------------------------------------------------
+    # 進度
+    # ------------------------------------------------------------------
+
+    def status(self) -> Dict:
+        """區塊的完成、處理中、過期統計"""
+        manifest = self.load_manifest()
+        if manifest is None:
+            return {"chunks": 0, "files": 0, "done": 0, "active": [], "expired": [], "final": None}
+        now = time.time()
+        active, expired = [], []
+        for name, lease in sorted(self.leases.list().items()):
+            entry = {"lease": name, "worker": lease.get("worker"),
+                     "seconds_left": round(lease["expires"] - now, 1)}
+            (active if lease["expires"] > now else expired).append(entry)
+        chunks = manifest["chunks"]
+        return {
+            "chunks": len(chunks),
+            "files": sum(len(c) for c in chunks),
+            "done": sum(1 for i in range(len(chunks)) if self.is_done(i)),
+            "active": active,
+            "expired": expired,
+            "final": self.finalized(),
+        }
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分析佇列排程 - 決定待分析圖片的處理順序，執行中可隨時調整
+
+排程策略（policy）：
+    path        路徑順序（默認，與先前的 sorted() 相同）
+    newest      修改時間由新到舊
+    smallest    檔案由小到大（最快看到前期進度，大檔案不會集中在一起）
+    interleave  依目錄輪流取檔（每個目錄都能較早看到結果）
+
+資料夾優先順序（priorities）：glob 列表（相對於目標目錄，比對目錄或檔案路徑），
+先符合前面樣式的檔案先處理；優先順序相同的檔案再依排程策略排列。
+
+使用方式：
+    queue = WorkQueue(files, root, policy="newest", priorities=["inbox*"])
+    while True:
+        path = queue.pop()
+        if path is None:
+            break
+        ...
+    # 其他線程（例如 GUI）：
+    queue.request(policy="smallest")
+
+設計原理：
+- 其他線程只登記排序要求（request），由取檔的線程在下一次 pop() 時重新排序，
+  需要 stat 大量檔案的策略不會卡住 GUI 的主線程
+- 重新排序只影響尚未取出的檔案
+- 需要檔案資訊的策略（newest、smallest）第一次使用時才 stat，結果快取
+- register_policy() 可加入自訂策略：order(paths, stat) → 排序後的 paths
+"""
+
+import fnmatch
+import os
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+OrderFunction = Callable[[List[Path], Callable[[Path], os.stat_result]], List[Path]]
+
+POLICY_LABELS = OrderedDict([
+    ("path", "路徑順序"),
+    ("newest", "最新優先"),
+    ("smallest", "小檔優先"),
+    ("interleave", "目錄輪流"),
+])
+
+
+def _order_path(paths, stat):
+    return sorted(paths)
+
+
+def _order_newest(paths, stat):
+    return sorted(paths, key=lambda p: (-stat(p).st_mtime, p))
+
+
+def _order_smallest(paths, stat):
+    return sorted(paths, key=lambda p: (stat(p).st_size, p))
+
+
+def _order_interleave(paths, stat):
+    by_directory: Dict[Path, deque] = OrderedDict()
+    for path in sorted(paths):
+        by_directory.setdefault(path.parent, deque()).append(path)
+    ordered = []
+    queues = list(by_directory.values())
+    while queues:
+        for q in queues:
+            ordered.append(q.popleft())
+        queues = [q for q in queues if q]
+    return ordered
+
+
+_POLICIES: Dict[str, OrderFunction] = {
+    "path": _order_path,
+    "newest": _order_newest,
+    "smallest": _order_smallest,
+    "interleave": _order_interleave,
+}
+
+
+def register_policy(name: str, order: OrderFunction, label: Optional[str] = None):
+    """加入自訂排程策略"""
+    _POLICIES[name] = order
+    POLICY_LABELS[name] = label or name
+
+
+def policy_names() -> List[str]:
+    return list(_POLICIES)
+
+
+def _check_policy(policy: Optional[str]):
+    if policy is not None and policy not in _POLICIES:
+        raise ValueError(f"未知的排程策略：{policy}（可用：{', '.join(_POLICIES)}）")
+
+
+class WorkQueue:
+    """可在執行中重新排序的分析佇列"""
+
+    def __init__(self, files: Sequence[Path], root: Path, policy: str = "path",
+                 priorities: Sequence[str] = ()):
+        """
+        Args:
+            files: 待分析的圖片路徑
+            root: 目標目錄（priorities 以相對路徑比對）
+            policy: 排程策略（見 POLICY_LABELS）
+            priorities: 資料夾優先順序（glob 列表）
+
+        Raises:
+            ValueError: 未知的排程策略
+        """
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._stats: Dict[Path, os.stat_result] = {}
+        self._pending: deque = deque()
+        self.policy = "path"
+        self.priorities: List[str] = []
+        self.taken = 0
+        self._request = None
+        self._files = list(files)
+        self.reorder(policy, priorities)
+
+    def _stat(self, path: Path) -> os.stat_result:
+        result = self._stats.get(path)
+        if result is None:
+            try:
+                result = path.stat()
+            except OSError:
+                # 已被移除的檔案排在最後，取出後由分析步驟回報錯誤
+                result = os.stat_result((0,) * 10)
+            self._stats[path] = result
+        return result
+
+    def _rank(self, path: Path) -> int:
+        relative = path.relative_to(self.root).as_posix()
+        directory = relative.rpartition("/")[0] or "."
+        for rank, pattern in enumerate(self.priorities):
+            if fnmatch.fnmatch(directory, pattern) or fnmatch.fnmatch(relative, pattern):
+                return rank
+        return len(self.priorities)
+
+    def reorder(self, policy: Optional[str] = None, priorities: Optional[Sequence[str]] = None):
+        """
+        變更排程策略或資料夾優先順序（只影響尚未取出的檔案）
+
+        Args:
+            policy: 新的排程策略（None：不變）
+            priorities: 新的資料夾優先順序（None：不變，空列表：取消）
+
+        Raises:
+            ValueError: 未知的排程策略
+        """
+        _check_policy(policy)
+        with self._lock:
+            if policy is not None:
+                self.policy = policy
+            if priorities is not None:
+                self.priorities = list(priorities)
+            pending = self._files if self._files is not None else list(self._pending)
+            self._files = None
+            ordered = _POLICIES[self.policy](pending, self._stat)
+            if self.priorities:
+                ranks = {path: self._rank(path) for path in ordered}
+                # sorted 是穩定排序：同一優先順序內保持策略的順序
+                ordered = sorted(ordered, key=ranks.__getitem__)
+            self._pending = deque(ordered)
+
+    def request(self, policy: Optional[str] = None, priorities: Optional[Sequence[str]] = None):
+        """
+        登記排序要求（任何線程皆可呼叫，下一次 pop() 時生效）
+
+        Raises:
+            ValueError: 未知的排程策略
+        """
+        _check_policy(policy)
+        with self._lock:
+            previous = self._request or (None, None)
+            self._request = (policy if policy is not None else previous[0],
+                             priorities if priorities is not None else previous[1])
+
+    def pop(self) -> Optional[Path]:
+        """取出下一個檔案（佇列為空時返回 None）"""
+        with self._lock:
+            request, self._request = self._request, None
+        if request is not None:
+            self.reorder(*request)
+        with self._lock:
+            if not self._pending:
+                return None
+            self.taken += 1
+            return self._pending.popleft()
+
+    def peek(self, count: int = 10) -> List[Path]:
+        """接下來的 count 個檔案（不取出）"""
+        with self._lock:
+            return [self._pending[i] for i in range(min(count, len(self._pending)))]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""測試共用設定：src/ 為平面模組目錄（與 benchmarks/ 相同的匯入方式）"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""階段吞吐量估計：EWMA 間隔、快取命中混合、信賴區間、百分位數"""
+
+import math
+
+import pytest
+
+import rate_estimator
+from rate_estimator import StageRateEstimator, _Ewma, _percentile
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_estimator.time, "monotonic", fake)
+    return fake
+
+
+def _complete(estimator, clock, interval, cached=False, latency=None):
+    clock.advance(interval)
+    estimator.record(interval if latency is None else latency, cached=cached)
+
+
+def test_ewma_constant_series_has_no_variance():
+    ewma = _Ewma(0.2)
+    for _ in range(10):
+        ewma.add(2.0)
+    assert ewma.mean == pytest.approx(2.0)
+    assert ewma.var == pytest.approx(0.0)
+
+
+def test_ewma_tracks_recent_values():
+    ewma = _Ewma(0.5)
+    ewma.add(1.0)
+    ewma.add(3.0)
+    assert ewma.mean == pytest.approx(2.0)
+    assert ewma.var == pytest.approx(1.0)
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert _percentile(values, 0.50) == 50
+    assert _percentile(values, 0.95) == 95
+    assert _percentile([7.0], 0.95) == 7.0
+    assert _percentile([], 0.5) == 0.0
+
+
+def test_no_data_gives_zero_eta(clock):
+    estimator = StageRateEstimator()
+    assert estimator.eta(10) == (0.0, 0.0, 0.0)
+    assert estimator.items_per_second() == 0.0
+
+
+def test_steady_rate_eta(clock):
+    estimator = StageRateEstimator()
+    for _ in range(20):
+        _complete(estimator, clock, 2.0)
+
+    eta, low, high = estimator.eta(30)
+    assert eta == pytest.approx(60.0)
+    assert low == pytest.approx(60.0) and high == pytest.approx(60.0)
+    assert estimator.items_per_second() == pytest.approx(0.5)
+    assert estimator.eta(0) == (0.0, 0.0, 0.0)
+
+
+def test_confidence_band_grows_with_sqrt_of_remaining(clock):
+    estimator = StageRateEstimator()
+    for i in range(40):
+        _complete(estimator, clock, 1.0 if i % 2 else 3.0)
+
+    eta_small, low_small, high_small = estimator.eta(4)
+    eta_large, low_large, high_large = estimator.eta(16)
+    assert eta_large == pytest.approx(eta_small * 4)
+    assert (high_large - eta_large) == pytest.approx((high_small - eta_small) * 2)
+    assert low_small < eta_small < high_small
+
+
+def test_cache_hits_are_mixed_by_hit_rate(clock):
+    estimator = StageRateEstimator()
+    for i in range(100):
+        if i % 4 == 0:
+            _complete(estimator, clock, 4.0)
+        else:
+            _complete(estimator, clock, 0.0, cached=True)
+
+    assert estimator.inferences == 25
+    assert estimator.cache_hits == 75
+    assert estimator.hit_rate() == pytest.approx(0.75)
+    eta, _, _ = estimator.eta(100)
+    assert eta == pytest.approx(100 * 0.25 * 4.0)
+
+
+def test_latency_percentiles_ignore_cache_hits(clock):
+    estimator = StageRateEstimator()
+    for latency in (1.0, 2.0, 3.0, 4.0):
+        _complete(estimator, clock, 1.0, latency=latency)
+    _complete(estimator, clock, 0.0, cached=True, latency=99.0)
+
+    assert estimator.latency_percentiles() == (2.0, 4.0)
+
+
+def test_excluded_pause_does_not_count_as_an_interval(clock):
+    estimator = StageRateEstimator()
+    for _ in range(5):
+        _complete(estimator, clock, 1.0)
+
+    clock.advance(600)
+    estimator.exclude(600)
+    _complete(estimator, clock, 1.0)
+
+    assert estimator.items_per_second() == pytest.approx(1.0)
+
+
+def test_summary_fields(clock):
+    estimator = StageRateEstimator()
+    for _ in range(3):
+        _complete(estimator, clock, 0.5)
+    summary = estimator.summary(remaining=10)
+    assert summary["inferences"] == 3
+    assert summary["cache_hits"] == 0
+    assert summary["items_per_second"] == pytest.approx(2.0)
+    assert summary["eta_seconds"] == pytest.approx(5.0)
+    assert not math.isnan(summary["eta_high"])
+
+
+def test_tracker_summary_reports_results_loaded_before_the_stage(tmp_path, clock):
+    from progress_tracker import ProgressTracker
+
+    tracker = ProgressTracker(tmp_path, console=False)
+    try:
+        tracker.start_analysis(total=10, already_done=4)
+        for i in range(3):
+            clock.advance(1.0)
+            tracker.item_done("analysis", f"{i}.png", True, 1.0, processed=4 + i + 1)
+        summary = tracker.get_rate_summary()
+    finally:
+        tracker.close()
+
+    assert summary["resumed"] == 4
+    assert summary["inferences"] == 3
+    assert summary["cache_hits"] == 0
+    # 載入的結果不在剩餘項目中：剩餘 3 項仍以推論速率估計
+    assert summary["eta_seconds"] == pytest.approx(3.0)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""分析記錄、計畫項目與 JSON 格式的無損互轉"""
+
+import json
+
+import pytest
+
+from records import AnalysisRecord, PlanEntry, dump_records
+from result_sinks import iter_stored_records, open_sink
+
+SUCCESS = {
+    "filename": "B/子資料夾/001.png",
+    "status": "success",
+    "analysis": {
+        "image_title": "系統架構圖",
+        "main_theme": "技術",
+        "sub_theme": "AI系統",
+        "core_content": "微服務與模型推論流程",
+        "recommended_name": "技術-AI系統-系統架構圖",
+        "keywords": ["架構", "推論"],
+    },
+    "model": "qwen/qwen3-vl-30b",
+}
+
+FAILURE = {"filename": "002.png", "status": "error", "error": "逾時"}
+
+
+def test_analysis_record_round_trip():
+    for data in (SUCCESS, FAILURE):
+        assert AnalysisRecord.from_dict(data).to_dict() == data
+
+
+def test_analysis_record_fields():
+    record = AnalysisRecord.from_dict(SUCCESS)
+    assert record.directory == "B/子資料夾"
+    assert record.name == "001.png"
+    assert record.filename == SUCCESS["filename"]
+    assert record.succeeded
+    assert record.get("image_title") == "系統架構圖"
+    assert record.get("keywords") == ["架構", "推論"]
+    assert record.get("missing", "N/A") == "N/A"
+    assert not AnalysisRecord.from_dict(FAILURE).succeeded
+
+
+def test_themes_are_shared_between_records():
+    first = AnalysisRecord.from_dict(SUCCESS)
+    second = AnalysisRecord.from_dict(json.loads(json.dumps(SUCCESS)))
+    assert first.main_theme is second.main_theme
+    assert first.directory is second.directory
+
+
+def test_plan_entry_round_trip_and_rename():
+    record = AnalysisRecord.from_dict(SUCCESS)
+    entry = PlanEntry(record, "技術-AI系統-系統架構圖.png")
+    data = entry.to_dict()
+    assert data["old_filename"] == "B/子資料夾/001.png"
+    assert data["new_filename"] == "B/子資料夾/技術-AI系統-系統架構圖.png"
+
+    restored = PlanEntry.from_dict(data)
+    assert restored.to_dict() == data
+
+    restored.new_filename = "B/子資料夾/技術-AI系統-系統架構圖_01.png"
+    assert restored.new_name == "技術-AI系統-系統架構圖_01.png"
+    assert restored.old_filename == data["old_filename"]
+
+
+@pytest.mark.parametrize("metadata", [None, {"timestamp": "2026-01-01T00:00:00", "total": 2}])
+@pytest.mark.parametrize("count", [0, 1, 2])
+def test_dump_records_matches_json_dump(tmp_path, metadata, count):
+    records = [AnalysisRecord.from_dict(d) for d in (SUCCESS, FAILURE)][:count]
+    path = tmp_path / "out.json"
+    dump_records(path, records, metadata)
+
+    dicts = [r.to_dict() for r in records]
+    expected = dicts if metadata is None else {"metadata": metadata, "detailed_results": dicts}
+    assert path.read_text(encoding="utf-8") == json.dumps(expected, ensure_ascii=False, indent=2)
+    assert list(iter_stored_records(path)) == dicts
+
+
+@pytest.mark.parametrize("kind", ["jsonl", "sqlite"])
+def test_sinks_store_and_reload_records(tmp_path, kind):
+    sink = open_sink(kind, tmp_path / "results")
+    with sink:
+        sink.write(SUCCESS)
+        sink.write(FAILURE)
+        sink.flush()
+        if sink.supports_lookup:
+            assert SUCCESS["filename"] in sink
+            assert sink.get(FAILURE["filename"]) == FAILURE
+    assert list(iter_stored_records(sink.path)) == [SUCCESS, FAILURE]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""重命名日誌：記錄、復原、取消後恢復的 run"""
+
+from rename_journal import RenameJournal, undo_last_run
+
+
+def _touch(path, text="x"):
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def _copy(journal, old, new):
+    _touch(new, old.read_text(encoding="utf-8"))
+    journal.record(old, new, moved=False)
+
+
+def test_undo_restores_moves_and_removes_copies(tmp_path):
+    journal = RenameJournal(tmp_path / "rename_journal.jsonl")
+    moved_src = _touch(tmp_path / "a.png")
+    copied_src = _touch(tmp_path / "b.png")
+
+    journal.begin()
+    moved_dst = tmp_path / "報告-一.png"
+    moved_src.rename(moved_dst)
+    journal.record(moved_src, moved_dst, moved=True)
+    _copy(journal, copied_src, tmp_path / "報告-二.png")
+    journal.close()
+
+    result = undo_last_run(journal)
+
+    assert result["restored"] == 1
+    assert result["removed"] == 1
+    assert result["skipped"] == []
+    assert moved_src.exists() and not moved_dst.exists()
+    assert copied_src.exists() and not (tmp_path / "報告-二.png").exists()
+    assert journal.last_run() == []
+
+
+def test_undo_never_overwrites_an_occupied_original(tmp_path):
+    journal = RenameJournal(tmp_path / "rename_journal.jsonl")
+    src = _touch(tmp_path / "a.png", "original")
+    dst = tmp_path / "新名稱.png"
+    journal.begin()
+    src.rename(dst)
+    journal.record(src, dst, moved=True)
+    journal.close()
+    _touch(src, "someone else")
+
+    result = undo_last_run(journal)
+
+    assert result["restored"] == 0
+    assert len(result["skipped"]) == 1
+    assert src.read_text(encoding="utf-8") == "someone else"
+    assert dst.read_text(encoding="utf-8") == "original"
+
+
+def test_undo_only_touches_the_last_run(tmp_path):
+    journal = RenameJournal(tmp_path / "rename_journal.jsonl")
+    first = _touch(tmp_path / "a.png")
+    second = _touch(tmp_path / "b.png")
+
+    journal.begin()
+    _copy(journal, first, tmp_path / "一.png")
+    journal.begin()
+    _copy(journal, second, tmp_path / "二.png")
+    journal.close()
+
+    result = undo_last_run(journal)
+
+    assert result["removed"] == 1
+    assert (tmp_path / "一.png").exists()
+    assert not (tmp_path / "二.png").exists()
+    assert [e["new"] for e in journal.last_run()] == [str((tmp_path / "一.png").resolve())]
+
+
+def test_resumed_run_is_undone_as_a_whole(tmp_path):
+    """取消的執行在另一次執行之後以原 run 編號恢復：undo 還原兩段，且不影響中間的執行"""
+    journal = RenameJournal(tmp_path / "rename_journal.jsonl")
+    originals = [_touch(tmp_path / f"p{i}.png") for i in range(3)]
+
+    cancelled = journal.begin()
+    _copy(journal, originals[0], tmp_path / "前半.png")
+    journal.begin()
+    _copy(journal, originals[1], tmp_path / "其他執行.png")
+    assert journal.begin(cancelled) == cancelled
+    _copy(journal, originals[2], tmp_path / "後半.png")
+    journal.close()
+
+    assert len(journal.last_run()) == 2
+
+    result = undo_last_run(journal)
+
+    assert result["run"] == cancelled
+    assert result["removed"] == 2
+    assert not (tmp_path / "前半.png").exists()
+    assert not (tmp_path / "後半.png").exists()
+    assert (tmp_path / "其他執行.png").exists()
+
+    # 中間那次執行仍可復原
+    result = undo_last_run(journal)
+    assert result["removed"] == 1
+    assert not (tmp_path / "其他執行.png").exists()
+    assert undo_last_run(journal)["run"] is None
+
+
+def test_run_entries_and_origins(tmp_path):
+    journal = RenameJournal(tmp_path / "rename_journal.jsonl")
+    src = _touch(tmp_path / "a.png")
+    run_id = journal.begin()
+    _copy(journal, src, tmp_path / "一.png")
+    journal.close()
+
+    entries = journal.run_entries(run_id)
+    assert [e["mode"] for e in entries] == ["copy"]
+    assert journal.origins() == {str((tmp_path / "一.png").resolve()): str(src.resolve())}
+    assert journal.run_entries("missing") == []
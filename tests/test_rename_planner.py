@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""命名規則與增量規劃器（名稱配置的持久化和衝突處理）"""
+
+import threading
+
+from records import AnalysisRecord
+from rename_journal import RenameJournal, undo_last_run
+from rename_planner import (IncrementalPlanner, NamingRules, compose_name, plan_filename,
+                            release_allocations)
+
+
+def _record(filename, title=None, recommended=None, **themes):
+    analysis = dict(themes)
+    if title is not None:
+        analysis["image_title"] = title
+    if recommended is not None:
+        analysis["recommended_name"] = recommended
+    return AnalysisRecord(filename, "success", analysis=analysis)
+
+
+def _names(plan):
+    return {entry.old_filename: entry.new_filename for entry in plan}
+
+
+def _planner(tmp_path, rules=None):
+    root = tmp_path / "images"
+    root.mkdir(exist_ok=True)
+    return IncrementalPlanner(rules or NamingRules(), tmp_path / "rename_allocations.sqlite", root)
+
+
+def _images(tmp_path, *filenames):
+    """在目標目錄中建立原檔案（名稱配置會依目錄內容釋放過期項目）"""
+    for filename in filenames:
+        path = tmp_path / "images" / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"png")
+
+
+def test_compose_name_field_priority():
+    rules = NamingRules()
+    assert compose_name(_record("a.png", title="架構圖", recommended="技術-架構"), rules) == "架構圖"
+    assert compose_name(_record("a.png", title="N/A", recommended="技術 架構"), rules) == "技術_架構"
+    assert compose_name(_record("a.png", main_theme="技術", sub_theme="AI"), rules) == "技術_AI"
+    assert compose_name(_record("a.png"), rules) == "UNKNOWN"
+
+
+def test_compose_name_replaces_invalid_characters():
+    rules = NamingRules(separator="-")
+    assert compose_name(_record("a.png", title='報告: 2026/Q1 "草稿"'), rules) == "報告-2026-Q1-草稿"
+
+
+def test_plan_filename_keeps_extension_and_limits_bytes():
+    rules = NamingRules(max_filename_length=40)
+    name = plan_filename(_record("x.PNG", title="很長的標題" * 10), rules)
+    assert name.endswith(".PNG")
+    assert len(name.encode("utf-8")) + len(rules.suffix(99)) <= 40
+    assert plan_filename(_record("x.png", title="圖表.png"), NamingRules()) == "圖表.png"
+
+
+def test_duplicates_within_a_directory_get_suffixes(tmp_path):
+    planner = _planner(tmp_path)
+    records = [_record(f"{i}.png", title="架構圖") for i in range(3)] + [_record("sub/9.png", title="架構圖")]
+
+    names = _names(planner.plan(records))
+
+    assert [names[f"{i}.png"] for i in range(3)] == ["架構圖_01.png", "架構圖_02.png", "架構圖_03.png"]
+    assert names["sub/9.png"] == "sub/架構圖.png"
+    assert planner.last_duplicate_groups == 1
+    planner.close()
+
+
+def test_replanning_keeps_existing_allocations(tmp_path):
+    planner = _planner(tmp_path)
+    _images(tmp_path, "a.png", "b.png", "c.png")
+    first = _names(planner.plan([_record("a.png", title="圖"), _record("b.png", title="表")]))
+
+    # 新檔案與已配置的名稱相同：沿用既有名稱，新檔案加序號
+    second = _names(planner.plan([_record("a.png", title="圖"), _record("c.png", title="圖")]))
+
+    assert second["a.png"] == first["a.png"] == "圖.png"
+    assert second["c.png"] == "圖_01.png"
+    planner.close()
+
+
+def test_allocations_persist_across_instances(tmp_path):
+    planner = _planner(tmp_path)
+    _images(tmp_path, "a.png", "b.png")
+    planner.plan([_record("a.png", title="圖")])
+    planner.close()
+
+    reopened = _planner(tmp_path)
+    assert _names(reopened.plan([_record("b.png", title="圖")])) == {"b.png": "圖_01.png"}
+    reopened.close()
+
+
+def test_changed_base_name_releases_the_old_name(tmp_path):
+    planner = _planner(tmp_path)
+    planner.plan([_record("a.png", title="圖")])
+
+    assert _names(planner.plan([_record("a.png", title="新圖")])) == {"a.png": "新圖.png"}
+    assert _names(planner.plan([_record("b.png", title="圖")])) == {"b.png": "圖.png"}
+    planner.close()
+
+
+def test_reassign_updates_the_stored_name(tmp_path):
+    planner = _planner(tmp_path)
+    _images(tmp_path, "a.png")
+    entry = planner.plan([_record("a.png", title="圖")])[0]
+    entry.new_name = "圖 (1).png"
+    planner.reassign(entry)
+
+    assert _names(planner.plan([_record("a.png", title="圖")])) == {"a.png": "圖 (1).png"}
+    planner.close()
+
+
+def test_allocations_of_vanished_files_are_released(tmp_path):
+    planner = _planner(tmp_path)
+    _images(tmp_path, "a.png", "b.png", "c.png")
+    assert _names(planner.plan([_record("a.png", title="圖"), _record("b.png", title="圖")])) == {
+        "a.png": "圖_01.png", "b.png": "圖_02.png"}
+
+    # a.png 已套用（新檔案存在），b.png 和其新名稱都已不在目錄中
+    (tmp_path / "images" / "a.png").rename(tmp_path / "images" / "圖_01.png")
+    (tmp_path / "images" / "b.png").unlink()
+
+    assert _names(planner.plan([_record("c.png", title="圖")])) == {"c.png": "圖_02.png"}
+    planner.close()
+
+
+def test_undo_releases_the_reverted_names(tmp_path):
+    planner = _planner(tmp_path)
+    _images(tmp_path, "a.png", "b.png")
+    journal = RenameJournal(tmp_path / "rename_journal.jsonl")
+    journal.begin()
+    for entry in planner.plan([_record("a.png", title="圖")]):
+        source = tmp_path / "images" / entry.old_filename
+        target = tmp_path / "images" / entry.new_filename
+        target.write_bytes(source.read_bytes())
+        journal.record(source, target, moved=False)
+    journal.close()
+    planner.close()
+
+    result = undo_last_run(journal)
+    release_allocations(tmp_path / "rename_allocations.sqlite", result["reverted"])
+
+    reopened = _planner(tmp_path)
+    assert _names(reopened.plan([_record("b.png", title="圖")])) == {"b.png": "圖.png"}
+    reopened.close()
+
+
+def test_planner_can_be_closed_from_another_thread(tmp_path):
+    planner = _planner(tmp_path)
+    worker = threading.Thread(target=planner.plan, args=([_record("a.png", title="圖")],))
+    worker.start()
+    worker.join()
+    planner.close()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""多機分工：租約的互斥、過期接手、續約，以及區塊的領取、結果合併和最終規劃"""
+
+import threading
+import time
+
+from work_leases import LeaseDir, LeaseKeeper, ShardStore, split_chunks
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _leases(tmp_path, worker, clock, seconds=60.0):
+    return LeaseDir(tmp_path / "leases", worker, lease_seconds=seconds, clock=clock)
+
+
+def test_split_chunks_sorts_and_slices():
+    chunks = split_chunks(["b/2.png", "a/1.png", "b/1.png", "a/2.png", "c.png"], chunk_size=2)
+    assert chunks == [["a/1.png", "a/2.png"], ["b/1.png", "b/2.png"], ["c.png"]]
+
+
+def test_lease_is_exclusive_until_it_expires(tmp_path):
+    clock = FakeClock()
+    first = _leases(tmp_path, "first", clock)
+    second = _leases(tmp_path, "second", clock)
+
+    assert first.try_acquire("chunk-00000")
+    assert first.try_acquire("chunk-00000")  # 自己持有：續約
+    assert not second.try_acquire("chunk-00000")
+
+    clock.now += 61
+    assert second.try_acquire("chunk-00000")
+    assert second.holder("chunk-00000")["worker"] == "second"
+    # 原持有者已失去租約
+    assert not first.renew("chunk-00000")
+
+
+def test_renew_extends_the_lease(tmp_path):
+    clock = FakeClock()
+    first = _leases(tmp_path, "first", clock)
+    second = _leases(tmp_path, "second", clock)
+    assert first.try_acquire("final")
+    acquired = first.holder("final")["acquired"]
+
+    clock.now += 50
+    assert first.renew("final")
+    clock.now += 50
+    assert not second.try_acquire("final")
+    assert first.holder("final")["acquired"] == acquired
+
+
+def test_release_only_removes_own_lease(tmp_path):
+    clock = FakeClock()
+    first = _leases(tmp_path, "first", clock)
+    second = _leases(tmp_path, "second", clock)
+    assert first.try_acquire("chunk-00001")
+
+    second.release("chunk-00001")
+    assert first.holder("chunk-00001")["worker"] == "first"
+
+    first.release("chunk-00001")
+    assert first.holder("chunk-00001") is None
+    assert second.try_acquire("chunk-00001")
+
+
+def test_only_one_worker_takes_over_an_expired_lease(tmp_path):
+    clock = FakeClock()
+    _leases(tmp_path, "crashed", clock).try_acquire("chunk-00000")
+    clock.now += 120
+
+    workers = [_leases(tmp_path, f"w{i}", clock) for i in range(8)]
+    barrier = threading.Barrier(len(workers))
+    won = []
+
+    def race(leases):
+        barrier.wait()
+        if leases.try_acquire("chunk-00000"):
+            won.append(leases.worker)
+
+    threads = [threading.Thread(target=race, args=(leases,)) for leases in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(won) == 1
+    assert workers[0].holder("chunk-00000")["worker"] == won[0]
+
+
+def test_keeper_reports_a_lease_taken_over_by_another_worker(tmp_path):
+    clock = FakeClock()
+    mine = _leases(tmp_path, "mine", clock)
+    other = _leases(tmp_path, "other", clock)
+    assert mine.try_acquire("chunk-00000")
+
+    keeper = LeaseKeeper(mine, interval=0.01)
+    keeper.hold("chunk-00000")
+    keeper.start()
+    try:
+        clock.now += 61
+        assert other.try_acquire("chunk-00000")
+        deadline = time.time() + 2
+        while not keeper.lost("chunk-00000") and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        keeper.stop()
+    assert keeper.lost("chunk-00000")
+
+
+def test_workers_share_one_manifest_and_claim_distinct_chunks(tmp_path):
+    first = ShardStore(tmp_path / "shard", worker="first")
+    second = ShardStore(tmp_path / "shard", worker="second")
+    chunks = split_chunks([f"{i:03d}.png" for i in range(5)], chunk_size=2)
+
+    first.publish_manifest(chunks, {"target_dir": "/images"})
+    manifest = second.publish_manifest([["other.png"]], {"target_dir": "/elsewhere"})
+    assert manifest["chunks"] == chunks
+    assert manifest["created_by"] == "first"
+
+    assert first.claim_next() == 0
+    assert second.claim_next() == 1
+    first.mark_done(0, {"analyzed": 2})
+    assert first.claim_next() == 2
+    assert second.claim_next() == 1  # 自己仍持有的區塊
+
+    second.mark_done(1, {"analyzed": 2})
+    assert second.claim_next() is None
+    first.mark_done(2, {"analyzed": 1})
+    status = first.status()
+    assert status["done"] == 3
+    assert status["files"] == 5
+    assert status["active"] == []
+
+
+def test_results_prefer_success_and_tolerate_a_torn_line(tmp_path):
+    first = ShardStore(tmp_path / "shard", worker="first")
+    second = ShardStore(tmp_path / "shard", worker="second")
+    first.publish_manifest([["a.png", "b.png"]], {})
+
+    first.append_result(0, {"filename": "a.png", "status": "success", "analysis": {}})
+    first.append_result(0, {"filename": "b.png", "status": "error", "error": "逾時"})
+    first.abandon(0)
+    second.append_result(0, {"filename": "b.png", "status": "success", "analysis": {}})
+    second.abandon(0)
+    with open(tmp_path / "shard" / "results" / "00000-second.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"filename": "c.png", "sta')
+
+    results = first.chunk_results(0)
+    assert sorted(results) == ["a.png", "b.png"]
+    assert all(r["status"] == "success" for r in results.values())
+    assert first.all_results() == results
+
+
+def test_only_one_worker_finalizes(tmp_path):
+    first = ShardStore(tmp_path / "shard", worker="first")
+    second = ShardStore(tmp_path / "shard", worker="second")
+
+    assert first.try_finalize()
+    assert not second.try_finalize()
+    first.finish({"renamed": 3})
+
+    assert second.finalized()["renamed"] == 3
+    assert not second.try_finalize()